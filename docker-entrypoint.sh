@@ -12,6 +12,15 @@ echo "Running database migrations..."
 python manage.py makemigrations
 python manage.py migrate
 
-# 启动开发服务器
+# 大模型密钥需通过环境变量 LLM_API_KEY 传入
+if [ -z "$LLM_API_KEY" ] && [ "${LLM_PROVIDER:-siliconflow}" != "fake" ]; then
+  echo "Warning: LLM_API_KEY is not set, AI recommendation endpoints will fail"
+fi
+
+# 进程内缓存快照，重启后缓存保持预热
+export CACHE_SNAPSHOT_PATH="${CACHE_SNAPSHOT_PATH:-/app/var/cache_snapshot.bin}"
+
+# 启动开发服务器：exec 让服务进程直接收到 SIGTERM，--noreload 让 WSGI 应用在主线程加载，
+# 这样退出时才能保存缓存快照
 echo "Starting development server..."
-python manage.py runserver 0.0.0.0:8000 
\ No newline at end of file
+exec python manage.py runserver --noreload 0.0.0.0:8000
@@ -71,6 +71,9 @@ class PlaylistSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'user', 'user_nickname', 'cover_url', 'is_public', 'song_count', 'created_at']
     
     def get_song_count(self, obj):
+        # PlaylistViewSet 的查询集已经用 annotate 算好
+        if hasattr(obj, 'num_songs'):
+            return obj.num_songs
         return obj.playlist_songs.count()
 
 class PlaylistDetailSerializer(PlaylistSerializer):
@@ -80,7 +83,8 @@ class PlaylistDetailSerializer(PlaylistSerializer):
         fields = PlaylistSerializer.Meta.fields + ['songs']
     
     def get_songs(self, obj):
-        playlist_songs = obj.playlist_songs.all().order_by('order')
+        # 不用 order_by()，以便复用 PlaylistViewSet 预取的结果
+        playlist_songs = sorted(obj.playlist_songs.all(), key=lambda ps: ps.order)
         return SongSerializer([ps.song for ps in playlist_songs], many=True, context=self.context).data
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,3 @@
+"""
+音乐模块的测试包
+"""
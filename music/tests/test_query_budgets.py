@@ -0,0 +1,97 @@
+from rest_framework.test import APIClient
+from django.test import TestCase
+
+from music.models import Artist, Album, Song, Playlist, PlaylistSong, Comment, Rating, PlayHistory, Favorite
+from search.queries import QueryBudgetMixin
+from search.test.test_views import reset_search_state
+from user.models import User
+
+# 每行数据的数量，远大于 N+1 阈值，逐行查询一定会被发现
+ROWS = 8
+
+# 各接口的查询数预算：(名称, 方法, 路径, 是否登录, 预算)
+# 路径中的 {song}、{artist}、{album}、{playlist} 在运行时替换
+BUDGETS = [
+    ('artists.list', 'get', '/api/music/artists/', False, 1),
+    ('artists.retrieve', 'get', '/api/music/artists/{artist}/', False, 1),
+    ('artists.songs', 'get', '/api/music/artists/{artist}/songs/', True, 4),
+    ('artists.albums', 'get', '/api/music/artists/{artist}/albums/', True, 2),
+    ('albums.list', 'get', '/api/music/albums/', False, 1),
+    ('albums.retrieve', 'get', '/api/music/albums/{album}/', False, 1),
+    ('albums.songs', 'get', '/api/music/albums/{album}/songs/', True, 4),
+    ('songs.recommended', 'get', '/api/music/songs/recommended/', True, 3),
+    ('songs.trending', 'get', '/api/music/songs/trending/', True, 3),
+    ('songs.comments', 'get', '/api/music/songs/{song}/comments/', False, 2),
+    ('songs.play', 'post', '/api/music/songs/{song}/play/', True, 3),
+    ('songs.rate', 'post', '/api/music/songs/{song}/rate/', True, 7),
+    ('tags.list', 'get', '/api/music/tags/', False, 1),
+    ('playlists.list', 'get', '/api/music/playlists/', False, 1),
+    ('playlists.retrieve', 'get', '/api/music/playlists/{playlist}/', False, 4),
+    ('favorites.list', 'get', '/api/music/favorites/', True, 1),
+    ('favorites.check', 'get', '/api/music/favorites/check/', True, 1),
+    ('history.list', 'get', '/api/music/history/', True, 3),
+]
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """music 各接口的查询数预算，超出预算或出现 N+1 时失败"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='budget@example.com', password='Test123456', nickname='budget', username='budget'
+        )
+        cls.artist = Artist.objects.create(name='周杰伦')
+        cls.album = Album.objects.create(title='范特西', artist=cls.artist)
+        cls.playlist = Playlist.objects.create(title='歌单', user=cls.user)
+        raters = [
+            User.objects.create_user(
+                email=f'rater{i}@example.com', password='Test123456', nickname=f'rater{i}', username=f'rater{i}'
+            )
+            for i in range(ROWS)
+        ]
+        for i in range(ROWS):
+            song = Song.objects.create(
+                title=f'歌曲{i}', artist=cls.artist, album=cls.album,
+                audio_url=f'https://example.com/{i}.mp3', play_count=i,
+            )
+            PlaylistSong.objects.create(playlist=cls.playlist, song=song, order=i)
+            PlayHistory.objects.create(user=cls.user, song=song)
+            Comment.objects.create(user=raters[i], song=song, content='好听')
+            for rater in raters[:2]:
+                Rating.objects.create(user=rater, song=song, score=i % 5 + 1)
+            Favorite.objects.create(user=cls.user, song_id=i, song_name=f'歌曲{i}')
+            Playlist.objects.create(title=f'歌单{i}', user=raters[i])
+        cls.song = song
+
+    def setUp(self):
+        reset_search_state()
+        self.client = APIClient()
+        self.member = APIClient()
+        self.member.force_authenticate(self.user)
+
+    def request(self, method, path, authenticated):
+        client = self.member if authenticated else self.client
+        path = path.format(song=self.song.pk, artist=self.artist.pk, album=self.album.pk, playlist=self.playlist.pk)
+        data = {'score': 4} if path.endswith('/rate/') else {'song_id': self.song.pk}
+        if method == 'get':
+            return client.get(path, data if path.endswith('/check/') else None)
+        return client.post(path, data, format='json')
+
+    def test_budgets(self):
+        for name, method, path, authenticated, budget in BUDGETS:
+            with self.subTest(name):
+                with self.assertQueryBudget(budget, name):
+                    response = self.request(method, path, authenticated)
+                self.assertEqual(response.status_code, 200, f'{name}: {response.content[:200]}')
+
+    def test_cached_responses_skip_database(self):
+        """目录命中缓存后不再查库，歌单详情只查一次可见性"""
+        for client, path, budget in (
+            (self.member, '/api/music/songs/recommended/', 0),
+            (self.client, f'/api/music/playlists/{self.playlist.pk}/', 1),
+        ):
+            self.assertEqual(client.get(path).status_code, 200)
+            with self.assertQueryBudget(budget, path):
+                response = client.get(path)
+            self.assertEqual(response.status_code, 200)
@@ -3,9 +3,11 @@ from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, Count, Avg, Max
+from django.db.models import Q, Count, Avg, Max, Prefetch, prefetch_related_objects
 from django.utils import timezone
 
+from search import entities
+from search.cache import TwoTierCache
 from .models import Artist, Album, Song, Tag, Playlist, Favorite, Comment, Rating, PlayHistory, PlaylistSong
 from .serializers import (
     ArtistSerializer, AlbumSerializer, SongSerializer, SongDetailSerializer,
@@ -14,6 +16,25 @@ from .serializers import (
     FavoriteCreateSerializer
 )
 
+# 目录类数据（推荐、热门）、收藏列表、歌单详情的缓存，TTL 见 settings.SEARCH_CACHE
+catalog_cache = TwoTierCache("catalog")
+favorites_cache = TwoTierCache("favorites")
+playlist_cache = TwoTierCache("playlist")
+
+
+def with_song_relations(songs, prefix=''):
+    """预取 SongSerializer 用到的关联，避免逐行查询；prefix 用于从其他模型关联到歌曲，如 'song__'"""
+    return songs.select_related(f'{prefix}artist', f'{prefix}album').prefetch_related(
+        f'{prefix}ratings', f'{prefix}tags'
+    )
+
+
+def cached_data(cache, key, loader):
+    """读取缓存的序列化结果"""
+    value, _ = cache.fetch(key, loader)
+    return value
+
+
 class ArtistViewSet(viewsets.ModelViewSet):
     queryset = Artist.objects.all()
     serializer_class = ArtistSerializer
@@ -28,19 +49,19 @@ class ArtistViewSet(viewsets.ModelViewSet):
     @action(detail=True)
     def songs(self, request, pk=None):
         artist = self.get_object()
-        songs = Song.objects.filter(artist=artist)
+        songs = with_song_relations(Song.objects.filter(artist=artist))
         serializer = SongSerializer(songs, many=True, context={'request': request})
         return Response(serializer.data)
     
     @action(detail=True)
     def albums(self, request, pk=None):
         artist = self.get_object()
-        albums = Album.objects.filter(artist=artist)
+        albums = Album.objects.filter(artist=artist).select_related('artist')
         serializer = AlbumSerializer(albums, many=True, context={'request': request})
         return Response(serializer.data)
 
 class AlbumViewSet(viewsets.ModelViewSet):
-    queryset = Album.objects.all()
+    queryset = Album.objects.select_related('artist')
     serializer_class = AlbumSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'artist__name']
@@ -53,7 +74,7 @@ class AlbumViewSet(viewsets.ModelViewSet):
     @action(detail=True)
     def songs(self, request, pk=None):
         album = self.get_object()
-        songs = Song.objects.filter(album=album)
+        songs = with_song_relations(Song.objects.filter(album=album))
         serializer = SongSerializer(songs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -62,6 +83,12 @@ class SongViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'artist__name', 'album__title']
     
+    def get_queryset(self):
+        # 只有返回歌曲数据的接口需要预取关联，播放、评分等操作只取歌曲本身
+        if self.action in ['list', 'retrieve']:
+            return with_song_relations(super().get_queryset())
+        return super().get_queryset()
+    
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return SongDetailSerializer
@@ -88,7 +115,7 @@ class SongViewSet(viewsets.ModelViewSet):
     @action(detail=True)
     def comments(self, request, pk=None):
         song = self.get_object()
-        comments = Comment.objects.filter(song=song).order_by('-created_at')
+        comments = Comment.objects.filter(song=song).select_related('user').order_by('-created_at')
         serializer = CommentSerializer(comments, many=True)
         return Response(serializer.data)
     
@@ -97,6 +124,7 @@ class SongViewSet(viewsets.ModelViewSet):
         song = self.get_object()
         favorite, created = Favorite.objects.get_or_create(user=request.user, song=song)
         if created:
+            favorites_cache.delete(request.user.pk)
             return Response({'status': 'added to favorites'})
         return Response({'status': 'already in favorites'})
     
@@ -106,6 +134,7 @@ class SongViewSet(viewsets.ModelViewSet):
         try:
             favorite = Favorite.objects.get(user=request.user, song=song)
             favorite.delete()
+            favorites_cache.delete(request.user.pk)
             return Response({'status': 'removed from favorites'})
         except Favorite.DoesNotExist:
             return Response({'status': 'not in favorites'})
@@ -149,22 +178,23 @@ class SongViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=False, permission_classes=[AllowAny])
     def recommended(self, request):
         # 简单推荐：返回播放次数最多的歌曲
-        songs = Song.objects.all().order_by('-play_count')[:10]
-        serializer = SongSerializer(songs, many=True, context={'request': request})
-        return Response(serializer.data)
+        def load():
+            songs = with_song_relations(Song.objects.all()).order_by('-play_count')[:10]
+            return list(SongSerializer(songs, many=True, context={'request': request}).data)
+        return Response(cached_data(catalog_cache, 'recommended', load))
     
     @action(methods=['get'], detail=False, permission_classes=[AllowAny])
     def trending(self, request):
         # 获取最近一周内被播放最多的歌曲
-        one_week_ago = timezone.now() - timezone.timedelta(days=7)
-        songs = Song.objects.filter(
-            play_history__played_at__gte=one_week_ago
-        ).annotate(
-            play_count_recent=Count('play_history')
-        ).order_by('-play_count_recent')[:10]
-        
-        serializer = SongSerializer(songs, many=True, context={'request': request})
-        return Response(serializer.data)
+        def load():
+            one_week_ago = timezone.now() - timezone.timedelta(days=7)
+            songs = with_song_relations(Song.objects.filter(
+                play_history__played_at__gte=one_week_ago
+            )).annotate(
+                play_count_recent=Count('play_history')
+            ).order_by('-play_count_recent')[:10]
+            return list(SongSerializer(songs, many=True, context={'request': request}).data)
+        return Response(cached_data(catalog_cache, 'trending', load))
     
     @action(methods=['get'], detail=False, permission_classes=[IsAuthenticated])
     def personalized(self, request):
@@ -196,7 +226,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True)
     def songs(self, request, pk=None):
         tag = self.get_object()
-        songs = Song.objects.filter(tags__tag=tag)
+        songs = with_song_relations(Song.objects.filter(tags__tag=tag))
         serializer = SongSerializer(songs, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -208,11 +238,13 @@ class PlaylistViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.request.user.is_authenticated:
             # 返回用户自己的所有播放列表和其他公开的播放列表
-            return Playlist.objects.filter(
+            playlists = Playlist.objects.filter(
                 Q(user=self.request.user) | Q(is_public=True)
             )
-        # 未登录用户只能看到公开播放列表
-        return Playlist.objects.filter(is_public=True)
+        else:
+            # 未登录用户只能看到公开播放列表
+            playlists = Playlist.objects.filter(is_public=True)
+        return playlists.select_related('user').annotate(num_songs=Count('playlist_songs'))
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -222,6 +254,23 @@ class PlaylistViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def retrieve(self, request, *args, **kwargs):
+        # 先查一次确认可见，歌曲列表只在缓存未命中时才预取
+        playlist = self.get_object()
+        def load():
+            playlist_songs = with_song_relations(PlaylistSong.objects.order_by('order'), prefix='song__')
+            prefetch_related_objects([playlist], Prefetch('playlist_songs', queryset=playlist_songs))
+            return dict(self.get_serializer(playlist).data)
+        return Response(cached_data(playlist_cache, playlist.pk, load))
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        playlist_cache.delete(serializer.instance.pk)
+    
+    def perform_destroy(self, instance):
+        playlist_cache.delete(instance.pk)
+        instance.delete()
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_song(self, request, pk=None):
         playlist = self.get_object()
@@ -253,6 +302,7 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         )
         
         if created:
+            playlist_cache.delete(playlist.pk)
             return Response({'status': 'added to playlist'})
         return Response({'status': 'already in playlist'})
     
@@ -274,6 +324,7 @@ class PlaylistViewSet(viewsets.ModelViewSet):
         try:
             playlist_song = PlaylistSong.objects.get(playlist=playlist, song_id=song_id)
             playlist_song.delete()
+            playlist_cache.delete(playlist.pk)
             return Response({'status': 'removed from playlist'})
         except PlaylistSong.DoesNotExist:
             return Response({'status': 'not in playlist'}, status=status.HTTP_404_NOT_FOUND)
@@ -291,7 +342,27 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         return FavoriteSerializer
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # 客户端没有带上的封面、歌手、专辑信息从已知的上游实体中补全
+        serializer.save(user=self.request.user, **entities.favorite_fields(serializer.validated_data))
+        favorites_cache.delete(self.request.user.pk)
+    
+    def perform_update(self, serializer):
+        serializer.save()
+        favorites_cache.delete(self.request.user.pk)
+    
+    def perform_destroy(self, instance):
+        instance.delete()
+        favorites_cache.delete(self.request.user.pk)
+    
+    def get_cached_favorites(self):
+        """当前用户的收藏列表（序列化结果）"""
+        def load():
+            favorites = FavoriteSerializer(self.get_queryset(), many=True).data
+            return entities.favorite_fields_many(favorites)
+        return cached_data(favorites_cache, self.request.user.pk, load)
+    
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_cached_favorites())
     
     @action(detail=False, methods=['post'])
     def toggle(self, request):
@@ -303,12 +374,14 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         try:
             favorite = Favorite.objects.get(user=request.user, song_id=song_id)
             favorite.delete()
+            favorites_cache.delete(request.user.pk)
             return Response({'message': '取消收藏成功', 'is_favorite': False})
         except Favorite.DoesNotExist:
             # 创建收藏
             serializer = FavoriteCreateSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save(user=request.user)
+                serializer.save(user=request.user, **entities.favorite_fields(serializer.validated_data))
+                favorites_cache.delete(request.user.pk)
                 return Response({'message': '收藏成功', 'is_favorite': True})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -319,7 +392,9 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         if not song_id:
             return Response({'error': '缺少song_id参数'}, status=status.HTTP_400_BAD_REQUEST)
         
-        is_favorite = Favorite.objects.filter(user=request.user, song_id=song_id).exists()
+        is_favorite = any(
+            str(favorite['song_id']) == str(song_id) for favorite in self.get_cached_favorites()
+        )
         return Response({'is_favorite': is_favorite})
 
 class PlayHistoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -327,4 +402,4 @@ class PlayHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return PlayHistory.objects.filter(user=self.request.user)
+        return with_song_relations(PlayHistory.objects.filter(user=self.request.user), prefix='song__')
@@ -52,6 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "search.tracing.TracingMiddleware",
+    "search.profiling.ProfilingMiddleware",
+    "search.timing.ServerTimingMiddleware",
+    "search.queries.QueryInspectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -101,6 +105,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# 默认使用进程内缓存；多进程部署时通过环境变量配置为 memcached/redis 等共享后端
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "music-recommendation"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -146,6 +162,12 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
+    # 按 throttle_scope 限流的接口（ScopedRateThrottle）
+    "DEFAULT_THROTTLE_RATES": {
+        "warm_queue": "60/min",
+        # 封面代理只统计需要下载生成的请求
+        "cover": "120/min",
+    },
 }
 
 SIMPLE_JWT = {
@@ -190,3 +212,181 @@ CORS_ALLOW_HEADERS = [
 #     "http://localhost:3000",
 #     "http://127.0.0.1:3000",
 # ]
+
+# 猜你喜欢预计算（python manage.py precompute_guess）
+# 超过该时长的预计算结果视为过期，接口会回退到实时计算
+GUESS_RESULT_MAX_AGE = timedelta(hours=36)
+
+# 大模型客户端（search/llm.py），密钥通过 LLM_API_KEY 配置；PROVIDER 设为 fake 可离线压测
+LLM_CLIENT = {
+    "PROVIDER": os.getenv("LLM_PROVIDER", "siliconflow"),
+    "API_URL": os.getenv("LLM_API_URL", "https://api.siliconflow.cn/v1/chat/completions"),
+    "API_KEY": os.getenv("LLM_API_KEY", ""),
+    "MODEL": os.getenv("LLM_MODEL", "deepseek-ai/DeepSeek-V3"),
+    "TIMEOUT": 30,  # 单次请求超时（秒）
+    "MAX_IN_FLIGHT": int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),  # 进程内同时进行的调用上限
+    "MAX_RETRIES": 2,
+}
+
+# AI 接口限流（search/throttling.py），RATE 为每秒补充的令牌数
+AI_THROTTLE = {
+    "CACHE_ALIAS": "default",
+    "USER_BURST": 5,
+    "USER_RATE": 10 / 60,
+    "ANON_BURST": 2,
+    "ANON_RATE": 3 / 60,
+    "GLOBAL_BURST": int(os.getenv("LLM_GLOBAL_BURST", "30")),
+    "GLOBAL_RATE": float(os.getenv("LLM_GLOBAL_RATE", "1.0")),
+}
+
+# 上游音乐接口（search/upstream.py），按上游主机配置
+# MIRRORS 为可互相替代的镜像地址（逗号分隔的环境变量可覆盖），按延迟自动选择，失败时切换
+# 舱壁：CRITICAL_RESERVE 为只留给播放相关请求（歌曲 URL、歌词）的名额
+UPSTREAM_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Origin": "https://music.163.com",
+    "Referer": "https://music.163.com/",
+}
+UPSTREAMS = {
+    "netstart": {
+        "MIRRORS": os.getenv("NETSTART_MIRRORS", "https://apis.netstart.cn/music").split(","),
+        "HEADERS": UPSTREAM_HEADERS,
+        "MAX_IN_FLIGHT": 32,
+        "MAX_QUEUE": 64,
+        "QUEUE_TIMEOUT": 2,
+        "CRITICAL_RESERVE": 8,
+    },
+    "alger": {
+        "MIRRORS": os.getenv("ALGER_MIRRORS", "http://music.alger.fun/music_proxy").split(","),
+        "HEADERS": UPSTREAM_HEADERS,
+        "MAX_IN_FLIGHT": 16,
+        "MAX_QUEUE": 32,
+        "QUEUE_TIMEOUT": 2,
+        "CRITICAL_RESERVE": 16,
+    },
+}
+
+# 指标导出（/metrics，Prometheus 文本格式），见 search/metrics.py
+# TOKEN 非空时抓取需要带 Authorization: Bearer <TOKEN>
+METRICS = {
+    "TOKEN": os.getenv("METRICS_TOKEN", ""),
+}
+
+# Server-Timing 响应头（db、upstream、llm、serialize、render 耗时），见 search/timing.py
+# 按 LOG_SAMPLE_RATE 抽样、或总耗时超过 LOG_SLOW_MS 时写一条 JSON 日志（logger: search.timing）
+SERVER_TIMING = {
+    "ENABLED": True,
+    "LOG_SAMPLE_RATE": float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "0")),
+    "LOG_SLOW_MS": int(os.getenv("SERVER_TIMING_SLOW_MS", "0")),
+}
+
+# 开发时的 SQL 检查，见 search/queries.py；同一形状的查询在一个请求里重复 N_PLUS_ONE_THRESHOLD 次以上
+# 视为 N+1，记警告日志，RAISE 为真时直接报错
+QUERY_INSPECTOR = {
+    "ENABLED": os.getenv("QUERY_INSPECTOR", "true" if DEBUG else "false").lower() == "true",
+    "N_PLUS_ONE_THRESHOLD": 5,
+    "RAISE": os.getenv("QUERY_INSPECTOR_RAISE", "false").lower() == "true",
+}
+
+# 请求追踪，见 search/tracing.py；EXPORTER 为 json 时每个 trace 写一个 Chrome trace 文件，
+# 为 otlp 时发给本地 collector（OTLP/HTTP）
+TRACING = {
+    "ENABLED": os.getenv("TRACING_ENABLED", "false").lower() == "true",
+    "SAMPLE_RATE": float(os.getenv("TRACING_SAMPLE_RATE", "0.01")),
+    "EXPORTER": os.getenv("TRACING_EXPORTER", "json"),
+    "JSON_DIR": os.getenv("TRACING_JSON_DIR", os.path.join(BASE_DIR, "traces")),
+    "JSON_MAX_FILES": int(os.getenv("TRACING_JSON_MAX_FILES", "1000")),
+    "OTLP_ENDPOINT": os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+}
+
+# 采样分析器，见 search/profiling.py；开启后管理员可以通过 /api/search/profile/ 对单个 worker 采样
+PROFILING = {
+    "ENABLED": os.getenv("PROFILING_ENABLED", "false").lower() == "true",
+    "INTERVAL": 0.01,
+    "MAX_SECONDS": 120,
+    "MAX_OVERHEAD": float(os.getenv("PROFILING_MAX_OVERHEAD", "0.02")),
+    "OUTPUT_DIR": os.getenv("PROFILING_OUTPUT_DIR", ""),
+}
+
+# 内存检查，见 search/memory.py；开启后管理员可以通过 /api/search/memory/ 查看缓存大小、对比 tracemalloc 快照
+MEMORY = {
+    "ENABLED": os.getenv("MEMORY_DEBUG_ENABLED", "false").lower() == "true",
+    "TRACEMALLOC_FRAMES": 10,
+    "MAX_SNAPSHOTS": 10,
+}
+
+# 封面缩略图代理，见 search/covers.py；缩略图缓存在 MEDIA_ROOT/covers 下
+COVER_PROXY = {
+    "ALLOWED_HOSTS": os.getenv("COVER_PROXY_HOSTS", ".music.126.net").split(","),
+    "SIZES": (64, 128, 300),
+    "FORMATS": ("webp", "jpeg"),
+    "MAX_CACHE_BYTES": int(os.getenv("COVER_CACHE_MB", "512")) * 1024 * 1024,
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "search.timing": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "search.queries": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
+# 上游应答录制，见 search/replay.py；非空时把上游和大模型的应答写入该目录，
+# 之后用 python manage.py replay_upstream --fixtures <目录> 离线回放
+UPSTREAM_REPLAY = {
+    "RECORD_DIR": os.getenv("UPSTREAM_RECORD_DIR", ""),
+}
+
+# 两级缓存（search/cache.py）：进程内 LRU + ALIAS 指定的共享后端，搜索与 music 目录数据共用
+# 过期后再保留 STALE_TTL，上游出错或熔断时返回旧数据；空结果只缓存 NEGATIVE_TTL
+SEARCH_CACHE = {
+    "ALIAS": "default",
+    "LOCAL_MAX_ENTRIES": 1024,  # 每个命名空间的进程内 LRU 条目上限
+    "EARLY_EXPIRY_BETA": 1.0,  # 临近过期时概率性提前刷新，0 表示关闭
+    "PREFIX_REUSE": True,  # 输入过程中的增量搜索复用较短前缀的完整结果
+    "PREFIX_REFRESH": False,  # 复用前缀结果后在后台回源刷新；开启后每个按键都会调用一次上游
+    "INVALIDATION_POLL_INTERVAL": 1.0,  # 其他进程的写入最多延迟多久在本进程生效（秒）
+    "INVALIDATION_LOG_TTL": 600,
+    # 进程内缓存快照，重启后从该文件恢复；为空时不启用
+    "SNAPSHOT_PATH": os.getenv("CACHE_SNAPSHOT_PATH", ""),
+    "SNAPSHOT_INTERVAL": 300,
+    "STALE_TTL": 24 * 3600,
+    "NEGATIVE_TTL": 60,
+    "TTL": {
+        "search_song": 600,
+        "search_artist": 600,
+        "search_album": 600,
+        "artist": 3600,
+        "artist_detail": 3600,
+        "artist_album": 3600,
+        "album": 3600,
+        "newsong": 600,
+        "song_url": 600,  # 歌曲直链会失效，不宜缓存太久
+        "lyric": 24 * 3600,
+        "catalog": 60,
+        "favorites": 300,
+        "playlist": 300,
+    },
+}
+
+# 后台预取，见 search/prefetch.py
+PREFETCH = {
+    "ENABLED": os.getenv("PREFETCH_ENABLED", "false").lower() == "true",
+    "ARTIST_ALBUMS": 3,  # 歌手页之后预取的专辑数
+    "QUEUE_AHEAD": 3,  # 播放时预热队列中后面的歌曲数
+    "MAX_WORKERS": 2,
+    "MAX_PENDING": 64,
+}
+
+# 上游歌曲实体存储，用于补全收藏信息，见 search/entities.py
+ENTITY_STORE = {
+    "ALIAS": "default",
+    "TTL": 7 * 24 * 3600,
+    "LOCAL_MAX_ENTRIES": 20000,
+}
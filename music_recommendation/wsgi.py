@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music_recommendation.settings')
 
 application = get_wsgi_application()
+
+# 恢复进程内缓存快照（未配置 CACHE_SNAPSHOT_PATH 时不做任何事）
+from search import snapshot  # noqa: E402
+
+snapshot.start()
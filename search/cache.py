@@ -0,0 +1,372 @@
+"""
+两级缓存：进程内 LRU + 共享缓存后端（settings.SEARCH_CACHE["ALIAS"]）
+
+- 读取先查本进程 LRU，未命中再查共享后端并回填 LRU。
+- 条目过期（TTL）后不会立即删除，而是再保留 STALE_TTL：刷新失败（包括上游繁忙、熔断）时返回旧数据，
+  并在响应中标记 stale。结果为空时也会缓存，但只保留 NEGATIVE_TTL。
+- 防击穿：同一进程内同一个 key 只有一个线程在刷新；另外按 XFetch 算法在临近过期时
+  以一定概率提前刷新，刷新越慢的条目越早开始，避免大量请求在 TTL 边界同时回源。
+- 跨进程失效：delete() 除了删除共享后端的条目，还会在共享后端的失效日志里追加一条记录
+  （cache:{namespace}:inval:{序号}）。各进程读取时最多每 INVALIDATION_POLL_INTERVAL 秒检查一次日志，
+  丢弃本进程 LRU 中对应的 key；日志缺失（过期、后端重启）时才清空该命名空间的 LRU。
+- 列表、字典类的值用 search/codec.py 编码后再存入两级缓存（PACK_VALUES），读取时还原为新对象。
+- 按命名空间统计命中率等指标，见 stats()。
+"""
+
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import codec, tracing
+
+DEFAULTS = {
+    "ALIAS": "default",
+    "STALE_TTL": 24 * 3600,
+    "NEGATIVE_TTL": 60,
+    "TTL": {},
+    "DEFAULT_TTL": 600,
+    "LOCAL_MAX_ENTRIES": 1024,
+    # XFetch 的 beta，越大越倾向提前刷新，0 表示关闭
+    "EARLY_EXPIRY_BETA": 1.0,
+    # 搜索时复用较短前缀的完整结果；PREFIX_REFRESH 为 True 时再在后台按精确关键词回源，
+    # 输入过程中每个按键都会产生一次上游调用，默认关闭
+    "PREFIX_REUSE": True,
+    "PREFIX_REFRESH": False,
+    # 列表、字典类的值紧凑编码后存储，编码结果超过 COMPRESS_MIN_BYTES 时再压缩
+    "PACK_VALUES": True,
+    "COMPRESS_MIN_BYTES": 4096,
+    # 其他进程的写入最多延迟多久在本进程生效（秒）
+    "INVALIDATION_POLL_INTERVAL": 1.0,
+    # 失效日志条目的保留时间（秒），进程落后超过该时间时清空本地 LRU
+    "INVALIDATION_LOG_TTL": 600,
+    # 一次最多追赶的日志条数，落后更多时直接清空本地 LRU
+    "INVALIDATION_MAX_BACKLOG": 500,
+    # 进程内 LRU 快照（见 search/snapshot.py），路径为空时不启用
+    "SNAPSHOT_PATH": "",
+    "SNAPSHOT_NAMESPACES": (
+        "search_song", "search_artist", "search_album", "artist", "artist_detail",
+        "artist_album", "album", "song_url", "lyric",
+    ),
+    "SNAPSHOT_INTERVAL": 300,
+}
+
+STAT_FIELDS = (
+    "local_hits", "shared_hits", "misses", "early_refreshes",
+    "loads", "load_errors", "stale_served", "invalidations", "local_flushes",
+)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SEARCH_CACHE", {}))
+    return config
+
+
+def is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def make_entry(value, expires_at, delta=0):
+    """构造缓存条目，按配置编码 value"""
+    config = get_config()
+    if config["PACK_VALUES"] and isinstance(value, (list, dict)) and not is_empty(value):
+        packed = codec.pack(value, config["COMPRESS_MIN_BYTES"])
+        return {"packed": packed, "expires_at": expires_at, "delta": delta}
+    return {"value": value, "expires_at": expires_at, "delta": delta}
+
+
+def entry_value(entry):
+    """取出缓存条目的值（每次返回新对象）"""
+    if "packed" in entry:
+        return codec.unpack(entry["packed"])
+    return entry["value"]
+
+
+class LocalLRU:
+    """线程安全的进程内 LRU"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self):
+        """按从旧到新的顺序返回所有条目的副本"""
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.local = LocalLRU(get_config()["LOCAL_MAX_ENTRIES"])
+        self._stats = dict.fromkeys(STAT_FIELDS, 0)
+        self._stats_lock = threading.Lock()
+        # 正在刷新的 key -> [锁, 引用计数]，没有线程使用时移除
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+        # 已处理到的失效日志序号，None 表示尚未同步
+        self._seen_seq = None
+        self._next_poll = 0
+        self._sync_lock = threading.Lock()
+        with _registry_lock:
+            _registry[namespace] = self
+
+    @property
+    def backend(self):
+        return caches[get_config()["ALIAS"]]
+
+    def _count(self, field):
+        with self._stats_lock:
+            self._stats[field] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data["local_entries"] = len(self.local)
+        return data
+
+    def make_key(self, key):
+        digest = hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+        return f"cache:{self.namespace}:{digest}"
+
+    def _acquire(self, cache_key, blocking=True):
+        with self._key_locks_lock:
+            item = self._key_locks.get(cache_key)
+            if item is None:
+                item = self._key_locks[cache_key] = [threading.Lock(), 0]
+            item[1] += 1
+        if item[0].acquire(blocking):
+            return item
+        self._unref(cache_key, item)
+        return None
+
+    def _release(self, cache_key, item):
+        item[0].release()
+        self._unref(cache_key, item)
+
+    def _unref(self, cache_key, item):
+        with self._key_locks_lock:
+            item[1] -= 1
+            if item[1] == 0:
+                self._key_locks.pop(cache_key, None)
+
+    @property
+    def seq_key(self):
+        return f"cache:{self.namespace}:inval:seq"
+
+    def event_key(self, seq):
+        return f"cache:{self.namespace}:inval:{seq}"
+
+    def publish_invalidation(self, cache_key):
+        """在共享后端的失效日志中追加一条记录，通知其他进程"""
+        backend = self.backend
+        backend.add(self.seq_key, 0, timeout=None)
+        try:
+            seq = backend.incr(self.seq_key)
+        except ValueError:
+            # 序号在 add 和 incr 之间被淘汰
+            backend.add(self.seq_key, 1, timeout=None)
+            seq = 1
+        backend.set(self.event_key(seq), cache_key, timeout=get_config()["INVALIDATION_LOG_TTL"])
+
+    def sync(self, force=False):
+        """处理其他进程发布的失效记录，最多每 INVALIDATION_POLL_INTERVAL 秒检查一次"""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            # 其他线程正在同步
+            return
+        try:
+            config = get_config()
+            self._next_poll = now + config["INVALIDATION_POLL_INTERVAL"]
+            seq = self.backend.get(self.seq_key, 0)
+            seen = self._seen_seq
+            self._seen_seq = seq
+            if seen is None or seq == seen:
+                return
+            if seq < seen or seq - seen > config["INVALIDATION_MAX_BACKLOG"]:
+                # 共享后端被清空，或落后太多
+                self._flush_local()
+                return
+            events = self.backend.get_many([self.event_key(n) for n in range(seen + 1, seq + 1)])
+            if len(events) < seq - seen:
+                # 部分日志已过期，无法确定哪些 key 失效
+                self._flush_local()
+                return
+            for cache_key in events.values():
+                self.local.delete(cache_key)
+                self._count("invalidations")
+        finally:
+            self._sync_lock.release()
+
+    def _flush_local(self):
+        self.local.clear()
+        self._count("local_flushes")
+
+    def get_entry(self, cache_key):
+        self.sync()
+        now = time.time()
+        entry = self.local.get(cache_key)
+        if entry is not None and now < entry["expires_at"]:
+            self._count("local_hits")
+            return entry
+        shared = self.backend.get(cache_key)
+        if shared is not None:
+            # 其他进程可能已经刷新过，或本进程 LRU 里的条目已被淘汰
+            self.local.set(cache_key, shared)
+            if now < shared["expires_at"]:
+                self._count("shared_hits")
+            return shared
+        if entry is not None and now < entry["expires_at"] + get_config()["STALE_TTL"]:
+            return entry
+        return None
+
+    def ttl(self):
+        """非空值的有效期（秒）"""
+        config = get_config()
+        return config["TTL"].get(self.namespace, config["DEFAULT_TTL"])
+
+    def set(self, key, value, delta=0):
+        config = get_config()
+        ttl = config["NEGATIVE_TTL"] if is_empty(value) else self.ttl()
+        entry = make_entry(value, time.time() + ttl, delta)
+        cache_key = self.make_key(key)
+        self.local.set(cache_key, entry)
+        self.backend.set(cache_key, entry, timeout=ttl + config["STALE_TTL"])
+
+    def delete(self, key):
+        """删除条目，并通知其他进程丢弃各自 LRU 中的副本"""
+        cache_key = self.make_key(key)
+        self.local.delete(cache_key)
+        self.backend.delete(cache_key)
+        self.publish_invalidation(cache_key)
+
+    def peek(self, key):
+        """只读取未过期的缓存值，不回源；没有时返回 None"""
+        entry = self.get_entry(self.make_key(key))
+        if entry is not None and time.time() < entry["expires_at"]:
+            return entry_value(entry)
+        return None
+
+    def should_refresh_early(self, entry):
+        beta = get_config()["EARLY_EXPIRY_BETA"]
+        if not beta or not entry.get("delta"):
+            return False
+        # XFetch：now - delta * beta * ln(rand) >= expires_at
+        return time.time() - entry["delta"] * beta * math.log(random.random() or 1e-12) >= entry["expires_at"]
+
+    def _fallback(self, entry):
+        """刷新失败时返回已有条目；提前刷新时条目尚未过期，不算旧数据"""
+        if time.time() < entry["expires_at"]:
+            return entry_value(entry), False
+        self._count("stale_served")
+        return entry_value(entry), True
+
+    def _load(self, key, loader, entry):
+        started = time.monotonic()
+        self._count("loads")
+        try:
+            value = loader()
+        except Exception:
+            self._count("load_errors")
+            if entry is not None:
+                return self._fallback(entry)
+            raise
+        if value is None:
+            if entry is not None:
+                return self._fallback(entry)
+            return None, False
+        self.set(key, value, delta=time.monotonic() - started)
+        return value, False
+
+    def fetch(self, key, loader):
+        """
+        读取缓存，未命中或已过期时调用 loader 刷新。
+
+        loader 返回 None 表示上游应答失败（非 200），不写缓存。
+        返回 (值, 是否为旧数据)；刷新失败且没有旧数据时抛出原异常或返回 (None, False)。
+        """
+        cache_key = self.make_key(key)
+        entry = self.get_entry(cache_key)
+        fresh = entry is not None and time.time() < entry["expires_at"]
+        if fresh and not self.should_refresh_early(entry):
+            return entry_value(entry), False
+
+        if fresh:
+            # 提前刷新：已有其他线程在刷新时直接返回当前值
+            lock = self._acquire(cache_key, blocking=False)
+            if lock is None:
+                return entry_value(entry), False
+            self._count("early_refreshes")
+        else:
+            self._count("misses")
+            lock = self._acquire(cache_key)
+            # 等锁期间可能已被其他线程刷新
+            entry = self.get_entry(cache_key)
+            if entry is not None and time.time() < entry["expires_at"]:
+                self._release(cache_key, lock)
+                return entry_value(entry), False
+        try:
+            with tracing.span("cache.load", namespace=self.namespace, stale=entry is not None):
+                return self._load(key, loader, entry)
+        finally:
+            self._release(cache_key, lock)
+
+
+def registered():
+    """命名空间 -> TwoTierCache"""
+    with _registry_lock:
+        return dict(_registry)
+
+
+def stats():
+    """各命名空间的缓存统计"""
+    return {name: cache.stats() for name, cache in registered().items()}
+
+
+def reset():
+    """清空所有进程内缓存和统计（测试时使用），不影响共享后端"""
+    with _registry_lock:
+        namespaces = list(_registry.values())
+    for cache in namespaces:
+        cache.local.clear()
+        cache._seen_seq = None
+        cache._next_poll = 0
+        with cache._stats_lock:
+            cache._stats = dict.fromkeys(STAT_FIELDS, 0)
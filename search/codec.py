@@ -0,0 +1,149 @@
+"""
+缓存数据的紧凑编码
+
+搜索结果等缓存数据是大量结构相同的字典，"ar"、"al"、"picUrl"、"tns" 这些键在每个元素里重复一遍，
+占用进程内内存，也让共享后端里的 pickle 变大。这里把结构相同的字典列表转成按列存储
+（每个键一列），字符串统一放进字符串表、列中只存下标，结果 pickle 成 bytes，超过一定大小再 zlib 压缩。
+
+pack() 返回 bytes，unpack() 还原出与原值相等的新对象。编码后的数据只在本服务的缓存中流转，
+与 Django 缓存后端自身的 pickle 处于同一信任边界。
+"""
+
+import pickle
+import zlib
+
+FORMAT_VERSION = 1
+
+PLAIN = b"P"
+COMPRESSED = b"Z"
+
+# 列类型
+STRINGS = "s"  # 字符串或 None，存字符串表下标，None 为 -1
+STRING_LISTS = "S"  # 字符串列表：长度列 + 展开后的字符串下标
+TABLE = "d"  # 结构相同的字典：子表
+TABLE_LISTS = "L"  # 结构相同的字典列表：长度列 + 展开后的子表
+RAW = "v"  # 其他，原样保存
+
+# 值类型
+VALUE_TABLE = "t"
+VALUE_DICT = "o"
+VALUE_LIST = "l"
+VALUE_RAW = "r"
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+    def value(self, value):
+        if isinstance(value, list):
+            if is_table(value):
+                return (VALUE_TABLE, self.table(value))
+            return (VALUE_LIST, [self.value(item) for item in value])
+        if isinstance(value, dict):
+            return (VALUE_DICT, tuple(value), [self.value(item) for item in value.values()])
+        return (VALUE_RAW, value)
+
+    def table(self, rows):
+        keys = tuple(rows[0])
+        return (len(rows), keys, [self.column([row[key] for row in rows]) for key in keys])
+
+    def column(self, values):
+        if all(value is None or isinstance(value, str) for value in values):
+            return (STRINGS, [self.intern(value) for value in values])
+        if all(isinstance(value, dict) for value in values) and is_table(values):
+            return (TABLE, self.table(values))
+        if all(isinstance(value, list) for value in values):
+            flat = [item for value in values for item in value]
+            lengths = [len(value) for value in values]
+            if all(isinstance(item, str) for item in flat):
+                return (STRING_LISTS, lengths, [self.intern(item) for item in flat])
+            if is_table(flat):
+                return (TABLE_LISTS, lengths, self.table(flat))
+        return (RAW, values)
+
+
+class _Decoder:
+    def __init__(self, strings):
+        self.strings = strings
+
+    def value(self, encoded):
+        kind = encoded[0]
+        if kind == VALUE_TABLE:
+            return self.table(encoded[1])
+        if kind == VALUE_LIST:
+            return [self.value(item) for item in encoded[1]]
+        if kind == VALUE_DICT:
+            return dict(zip(encoded[1], [self.value(item) for item in encoded[2]]))
+        return encoded[1]
+
+    def table(self, encoded):
+        count, keys, columns = encoded
+        if not keys:
+            return [{} for _ in range(count)]
+        values = [self.column(column) for column in columns]
+        return [dict(zip(keys, row)) for row in zip(*values)]
+
+    def column(self, column):
+        kind = column[0]
+        if kind == STRINGS:
+            strings = self.strings
+            return [None if idx < 0 else strings[idx] for idx in column[1]]
+        if kind == TABLE:
+            return self.table(column[1])
+        if kind == STRING_LISTS:
+            strings = self.strings
+            return split(column[1], [strings[idx] for idx in column[2]])
+        if kind == TABLE_LISTS:
+            return split(column[1], self.table(column[2]))
+        return list(column[1])
+
+
+def is_table(rows):
+    """rows 是否为非空、键完全相同的字典列表"""
+    if not rows or not isinstance(rows[0], dict):
+        return False
+    keys = rows[0].keys()
+    return all(isinstance(row, dict) and row.keys() == keys for row in rows)
+
+
+def split(lengths, flat):
+    result = []
+    start = 0
+    for length in lengths:
+        result.append(flat[start:start + length])
+        start += length
+    return result
+
+
+def pack(value, compress_min_bytes=4096):
+    """编码 value，序列化结果不小于 compress_min_bytes 时压缩（None 表示不压缩）"""
+    encoder = _Encoder()
+    body = encoder.value(value)
+    data = pickle.dumps((FORMAT_VERSION, encoder.strings, body), protocol=pickle.HIGHEST_PROTOCOL)
+    if compress_min_bytes is not None and len(data) >= compress_min_bytes:
+        return COMPRESSED + zlib.compress(data, 6)
+    return PLAIN + data
+
+
+def unpack(data):
+    """还原 pack() 的结果"""
+    flag, payload = data[:1], data[1:]
+    if flag == COMPRESSED:
+        payload = zlib.decompress(payload)
+    elif flag != PLAIN:
+        raise ValueError("不是 pack() 编码的数据")
+    version, strings, body = pickle.loads(payload)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"不支持的编码版本: {version}")
+    return _Decoder(strings).value(body)
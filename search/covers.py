@@ -0,0 +1,324 @@
+"""
+封面图片代理
+
+上游返回的 picUrl 是原图，列表里的小缩略图也要下载几百 KB 到几 MB。/api/search/cover/?url=&size=&format=
+从白名单域名取一次原图，用 Pillow 一次生成所有尺寸（SIZES）和格式（FORMATS）的缩略图，写入
+MEDIA_ROOT/CACHE_DIR 下的磁盘缓存，之后直接返回文件；响应带长期缓存头（同一 url 的缩略图不会变）。
+
+- 缓存目录按 url 的哈希分开，总大小超过 MAX_CACHE_BYTES 时按最近使用时间淘汰整个目录。
+- 同一 url 同时只有一个线程在下载生成，其他线程等待后读缓存；整个进程同时最多 MAX_RENDERS 个下载生成，
+  等待超过 RENDER_WAIT 秒时返回繁忙。
+- 只跟随指向白名单域名的重定向；原图超过 MAX_SOURCE_BYTES 或像素数超过 MAX_PIXELS 时拒绝。
+- 下载或解析失败的 url 在 FAILURE_TTL 秒内直接返回同样的错误，不再重试。
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .cache import LocalLRU
+
+DEFAULTS = {
+    # 允许代理的域名，以 . 开头时匹配其所有子域名
+    "ALLOWED_HOSTS": [".music.126.net"],
+    "SIZES": (64, 128, 300),
+    "FORMATS": ("webp", "jpeg"),
+    "QUALITY": {"webp": 80, "jpeg": 85},
+    # MEDIA_ROOT 下的子目录
+    "CACHE_DIR": "covers",
+    "MAX_CACHE_BYTES": 512 * 1024 * 1024,
+    "MAX_SOURCE_BYTES": 10 * 1024 * 1024,
+    "MAX_PIXELS": 40_000_000,
+    "MAX_REDIRECTS": 3,
+    "TIMEOUT": (3, 10),
+    "MAX_AGE": 365 * 24 * 3600,
+    # 同时下载生成的上限和等待时间（秒）
+    "MAX_RENDERS": 4,
+    "RENDER_WAIT": 5,
+    # 失败结果的缓存时间（秒）和条目数上限
+    "FAILURE_TTL": 300,
+    "MAX_FAILURES": 10000,
+}
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+session = requests.Session()
+
+
+class CoverError(Exception):
+    pass
+
+
+class HostNotAllowed(CoverError):
+    pass
+
+
+class CoverBusy(CoverError):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "COVER_PROXY", {}))
+    return config
+
+
+def host_allowed(url, allowed_hosts):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    host = parts.hostname.lower()
+    return any(
+        host == pattern or (pattern.startswith(".") and host.endswith(pattern))
+        for pattern in (item.lower() for item in allowed_hosts)
+    )
+
+
+def download(url, config):
+    """下载原图；只跟随白名单内的重定向，超过大小上限时中止"""
+    for _ in range(config["MAX_REDIRECTS"] + 1):
+        if not host_allowed(url, config["ALLOWED_HOSTS"]):
+            raise HostNotAllowed(f"不允许代理该地址: {url}")
+        try:
+            response = session.get(url, timeout=config["TIMEOUT"], stream=True, allow_redirects=False)
+        except requests.RequestException as e:
+            raise CoverError(f"下载封面失败: {e}")
+        with response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers["Location"])
+                continue
+            if response.status_code != 200:
+                raise CoverError(f"下载封面失败: HTTP {response.status_code}")
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > config["MAX_SOURCE_BYTES"]:
+                    raise CoverError("封面图片过大")
+            return bytes(data)
+    raise CoverError("重定向次数过多")
+
+
+def render(data, config):
+    """返回 {(尺寸, 格式): 编码后的字节}"""
+    sizes = sorted(config["SIZES"], reverse=True)
+    try:
+        image = Image.open(io.BytesIO(data))
+        # open() 只读了文件头，解码前检查像素数
+        if image.width * image.height > config["MAX_PIXELS"]:
+            raise CoverError("封面图片像素过多")
+        # JPEG 解码时直接按比例缩小，省去大部分解码开销
+        image.draft("RGB", (sizes[0], sizes[0]))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise CoverError(f"无法解析封面图片: {e}")
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    variants = {}
+    # 从大到小逐级缩小，每一级都以上一级为输入
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt in config["FORMATS"]:
+            output = image
+            if fmt == "jpeg" and image.mode == "RGBA":
+                output = Image.new("RGB", image.size, (255, 255, 255))
+                output.paste(image, mask=image.getchannel("A"))
+            buffer = io.BytesIO()
+            output.save(buffer, fmt.upper(), quality=config["QUALITY"][fmt], optimize=fmt == "jpeg")
+            variants[(size, fmt)] = buffer.getvalue()
+    return variants
+
+
+class CoverCache:
+    """MEDIA_ROOT 下的磁盘缓存，每个原图一个目录"""
+
+    def __init__(self):
+        config = get_config()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+        self._renders = threading.BoundedSemaphore(config["MAX_RENDERS"])
+        # url -> (失效时间, 异常类, 错误信息)
+        self._failures = LocalLRU(config["MAX_FAILURES"])
+        # 目录总大小，第一次写入前扫描一次
+        self._total = None
+
+    @property
+    def root(self):
+        return os.path.join(settings.MEDIA_ROOT, get_config()["CACHE_DIR"])
+
+    def directory(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def variant_path(self, url, size, fmt):
+        return os.path.join(self.directory(url), f"{size}.{fmt}")
+
+    def cached(self, url, size, fmt):
+        """已缓存的缩略图内容，没有时返回 None"""
+        return self.read(self.variant_path(url, size, fmt))
+
+    def get(self, url, size, fmt):
+        """返回缩略图内容，没有时下载原图并生成；size、fmt 须在配置的 SIZES、FORMATS 中"""
+        data = self.cached(url, size, fmt)
+        if data is not None:
+            return data
+        self.check_failure(url)
+        with self._key_lock(url):
+            data = self.cached(url, size, fmt)
+            if data is None:
+                self.check_failure(url)
+                config = get_config()
+                variants = self.render(url, config)
+                self.store(url, variants, config)
+                data = variants[(size, fmt)]
+        return data
+
+    def render(self, url, config):
+        if not self._renders.acquire(timeout=config["RENDER_WAIT"]):
+            raise CoverBusy("封面处理繁忙，请稍后再试")
+        try:
+            return render(download(url, config), config)
+        except CoverError as e:
+            self._failures.set(url, (time.time() + config["FAILURE_TTL"], type(e), str(e)))
+            raise
+        finally:
+            self._renders.release()
+
+    def check_failure(self, url):
+        """url 近期失败过时抛出同样的错误"""
+        failure = self._failures.get(url)
+        if failure is None:
+            return
+        expires_at, error_class, message = failure
+        if time.time() < expires_at:
+            raise error_class(message)
+        self._failures.delete(url)
+
+    def read(self, path):
+        # 文件可能刚被其他线程淘汰，读不到时当作未缓存
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self.touch(path)
+        return data
+
+    def store(self, url, variants, config):
+        directory = self.directory(url)
+        os.makedirs(directory, exist_ok=True)
+        written = 0
+        for (size, fmt), data in variants.items():
+            path = os.path.join(directory, f"{size}.{fmt}")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            written += len(data)
+        with self._lock:
+            if self._total is None:
+                self._total = self.scan_size()
+            else:
+                self._total += written
+            if self._total > config["MAX_CACHE_BYTES"]:
+                self.evict(config["MAX_CACHE_BYTES"] * 0.9, keep=directory)
+
+    def touch(self, path):
+        # 用目录的修改时间记录最近使用时间，淘汰时按它排序
+        try:
+            os.utime(os.path.dirname(path))
+        except OSError:
+            pass
+
+    def entries(self):
+        """[(最近使用时间, 目录, 字节数)]"""
+        result = []
+        if not os.path.isdir(self.root):
+            return result
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir():
+                    continue
+                try:
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                    result.append((entry.stat().st_mtime, entry.path, size))
+                except OSError:
+                    continue
+        return result
+
+    def scan_size(self):
+        return sum(size for _, _, size in self.entries())
+
+    def evict(self, target, keep=None):
+        """按最近使用时间从旧到新删除目录，直到总大小不超过 target（调用方持有 _lock）"""
+        entries = sorted(self.entries())
+        total = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._total = total
+
+    @contextmanager
+    def _key_lock(self, url):
+        with self._key_locks_lock:
+            item = self._key_locks.get(url)
+            if item is None:
+                item = self._key_locks[url] = [threading.Lock(), 0]
+            item[1] += 1
+        try:
+            with item[0]:
+                yield
+        finally:
+            with self._key_locks_lock:
+                item[1] -= 1
+                if item[1] == 0:
+                    self._key_locks.pop(url, None)
+
+    def reset(self):
+        """清空磁盘缓存（测试时使用）"""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._total = None
+        self._failures.clear()
+
+
+cache = CoverCache()
+
+
+def etag(url, size, fmt):
+    return '"%s-%d-%s"' % (hashlib.sha256(url.encode("utf-8")).hexdigest()[:16], size, fmt)
+
+
+def choose_format(requested, accept, config):
+    """请求指定的格式；没有指定时浏览器支持 WebP 就用 WebP"""
+    if requested:
+        return requested if requested in config["FORMATS"] else None
+    if "webp" in config["FORMATS"] and "image/webp" in accept:
+        return "webp"
+    return "jpeg" if "jpeg" in config["FORMATS"] else config["FORMATS"][0]
+
+
+def choose_size(requested, config):
+    """不小于请求尺寸的最小一档；比最大一档还大时用最大一档"""
+    sizes = sorted(config["SIZES"])
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
@@ -0,0 +1,170 @@
+"""
+上游歌曲实体存储
+
+搜索、歌手热门歌曲、专辑曲目、新歌等接口的应答里反复出现同一批歌曲。
+upstream.fetch() 每次成功后调用 ingest()，把其中歌曲列表展示需要的字段（歌名、歌手、专辑、封面）
+按上游 id 合并进实体存储（进程内 LRU + 共享缓存后端，保留 settings.ENTITY_STORE["TTL"] 秒），
+用于补全收藏记录缺少的封面、歌手、专辑信息。
+
+歌手页、专辑页的热门歌曲和曲目列表只有对应接口才会返回，不由实体拼出，仍由页面缓存负责。
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import LocalLRU
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ALIAS": "default",
+    "TTL": 7 * 24 * 3600,
+    "LOCAL_MAX_ENTRIES": 20000,
+}
+
+SONG = "song"
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "ENTITY_STORE", {}))
+    return config
+
+
+def is_blank(value):
+    return value is None or value == ""
+
+
+class EntityStore:
+    def __init__(self):
+        self.local = LocalLRU(get_config()["LOCAL_MAX_ENTRIES"])
+
+    @property
+    def backend(self):
+        return caches[get_config()["ALIAS"]]
+
+    def make_key(self, kind, id):
+        return f"entity:{kind}:{id}"
+
+    def get_many(self, kind, ids):
+        """返回 {id: 实体}，不存在的 id 不出现在结果中"""
+        result = {}
+        missing = {}
+        for id in ids:
+            key = self.make_key(kind, id)
+            entity = self.local.get(key)
+            if entity is None:
+                missing[key] = id
+            else:
+                result[id] = entity
+        if missing:
+            for key, entity in self.backend.get_many(list(missing)).items():
+                self.local.set(key, entity)
+                result[missing[key]] = entity
+        return result
+
+    def get(self, kind, id):
+        return self.get_many(kind, [id]).get(id)
+
+    def merge_many(self, kind, records):
+        """按 id 合并字段，值为 None 的字段不会覆盖已有的值"""
+        records = {record["id"]: record for record in records if record.get("id")}
+        if not records:
+            return
+        existing = self.get_many(kind, list(records))
+        changed = {}
+        for id, record in records.items():
+            entity = dict(existing.get(id) or {})
+            updated = False
+            for field, value in record.items():
+                if value is None or entity.get(field) == value:
+                    continue
+                entity[field] = value
+                updated = True
+            if updated:
+                key = self.make_key(kind, id)
+                self.local.set(key, entity)
+                changed[key] = entity
+        if changed:
+            self.backend.set_many(changed, timeout=get_config()["TTL"])
+
+    def clear_local(self):
+        self.local.clear()
+
+
+store = EntityStore()
+
+
+def song_record(song, artists_key="ar", album_key="al"):
+    """歌曲实体只保留列表展示需要的字段"""
+    album = song.get(album_key) or {}
+    return {
+        "id": song.get("id"),
+        "name": song.get("name"),
+        "ar": [{"id": ar.get("id"), "name": ar.get("name")} for ar in song.get(artists_key) or []],
+        "al": {"id": album.get("id"), "name": album.get("name"), "picUrl": album.get("picUrl")},
+    }
+
+
+def ingest_songs(songs, artists_key="ar", album_key="al"):
+    store.merge_many(SONG, [song_record(song, artists_key, album_key) for song in songs])
+
+
+def ingest(api, params, data):
+    """把上游应答中的实体合并进存储，出错只记日志"""
+    if not isinstance(data, dict) or data.get("code") != 200:
+        return
+    try:
+        if api == "cloudsearch":
+            ingest_songs((data.get("result") or {}).get("songs") or [])
+        elif api == "newsong":
+            ingest_songs(
+                [item.get("song") or {} for item in data.get("result") or []],
+                artists_key="artists", album_key="album",
+            )
+        elif api == "artists":
+            ingest_songs(data.get("hotSongs") or [])
+        elif api == "album":
+            ingest_songs(data.get("songs") or [])
+    except Exception:
+        logger.exception("写入实体存储失败: %s", api)
+
+
+def parse_id(id):
+    try:
+        return int(id)
+    except (TypeError, ValueError):
+        return None
+
+
+def favorite_fields(data):
+    """收藏记录中缺少的封面、歌手、专辑信息，返回需要补上的字段"""
+    return missing_fields(data, store.get(SONG, parse_id(data.get("song_id"))))
+
+
+def favorite_fields_many(rows):
+    """批量补全收藏记录，一次读取所有歌曲实体，返回补全后的新列表"""
+    songs = store.get_many(SONG, {parse_id(row.get("song_id")) for row in rows})
+    return [dict(row, **missing_fields(row, songs.get(parse_id(row.get("song_id"))))) for row in rows]
+
+
+def missing_fields(data, song):
+    if song is None:
+        return {}
+    artists = song.get("ar") or []
+    album = song.get("al") or {}
+    known = {
+        "song_name": song.get("name"),
+        "artist_name": "/".join(ar["name"] for ar in artists if ar.get("name")),
+        "album_name": album.get("name"),
+        "pic_url": album.get("picUrl"),
+        "artist_id": artists[0].get("id") if artists else None,
+        "album_id": album.get("id"),
+    }
+    defaults = {"song_name": "Unknown Song", "artist_name": "Unknown Artist"}
+    return {
+        field: value for field, value in known.items()
+        if not is_blank(value) and (is_blank(data.get(field)) or data.get(field) == defaults.get(field))
+    }
@@ -0,0 +1,230 @@
+"""
+大模型调用客户端
+
+所有 AI 推荐接口统一通过 get_client().complete(prompt) 调用，负责：
+连接池复用、全局并发上限、带抖动的指数退避重试、token/耗时统计。
+配置见 settings.LLM_CLIENT，PROVIDER 设为 "fake" 时使用本地确定性实现，便于离线压测。
+"""
+
+import hashlib
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import replay, timing, tracing
+
+DEFAULTS = {
+    "PROVIDER": "siliconflow",
+    "API_URL": "https://api.siliconflow.cn/v1/chat/completions",
+    "API_KEY": "",
+    "MODEL": "deepseek-ai/DeepSeek-V3",
+    "TIMEOUT": 30,
+    "POOL_SIZE": 16,
+    "MAX_IN_FLIGHT": 8,
+    "ACQUIRE_TIMEOUT": 10,
+    "MAX_RETRIES": 2,
+    "BACKOFF_BASE": 0.5,
+    "BACKOFF_MAX": 4,
+    "FAKE_LATENCY": 0,
+}
+
+# 这些状态码说明服务端暂时不可用，可以重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMBusyError(LLMError):
+    """全局并发已满，等待超时"""
+
+
+class SiliconFlowProvider:
+    """OpenAI 兼容的 chat/completions 接口"""
+
+    def __init__(self, config):
+        self.config = config
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=config["POOL_SIZE"], max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def complete(self, prompt, max_tokens, temperature):
+        payload = {
+            "model": self.config["MODEL"],
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "n": 1,
+            "stop": None,
+        }
+        headers = {
+            "Authorization": f"Bearer {self.config['API_KEY']}",
+            "Content-Type": "application/json",
+        }
+        started = time.monotonic()
+        response = self.session.post(
+            self.config["API_URL"],
+            json=payload,
+            headers=headers,
+            timeout=self.config["TIMEOUT"],
+        )
+        response.raise_for_status()
+        result = response.json()
+        replay.record(replay.CHAT, {"prompt": prompt}, result, time.monotonic() - started)
+        return result["choices"][0]["message"]["content"], result.get("usage", {})
+
+
+class FakeProvider:
+    """本地替身：根据 prompt 的哈希确定性地返回歌名列表，不访问网络"""
+
+    SONGS = [
+        "晴天", "七里香", "稻香", "夜曲", "青花瓷", "江南", "修炼爱情", "她说",
+        "后来", "小幸运", "平凡之路", "光年之外", "起风了", "孤勇者", "海阔天空",
+        "红豆", "匆匆那年", "演员", "告白气球", "童话", "Yesterday", "Hey Jude",
+        "Let It Be", "Imagine", "Hotel California", "Shape of You", "Someone Like You",
+        "Viva La Vida", "Bohemian Rhapsody", "Billie Jean", "Counting Stars",
+        "See You Again", "Perfect", "Halo", "Rolling in the Deep", "Thinking Out Loud",
+    ]
+
+    def __init__(self, config):
+        self.config = config
+
+    def complete(self, prompt, max_tokens, temperature):
+        if self.config["FAKE_LATENCY"]:
+            time.sleep(self.config["FAKE_LATENCY"])
+        seed = int(hashlib.md5(prompt.encode("utf-8")).hexdigest(), 16)
+        count = 20
+        start = seed % len(self.SONGS)
+        names = [self.SONGS[(start + i * 7) % len(self.SONGS)] for i in range(count)]
+        text = "\n".join(names)
+        usage = {
+            "prompt_tokens": len(prompt),
+            "completion_tokens": len(text),
+            "total_tokens": len(prompt) + len(text),
+        }
+        return text, usage
+
+
+PROVIDERS = {
+    "siliconflow": SiliconFlowProvider,
+    "fake": FakeProvider,
+}
+
+
+class LLMClient:
+    def __init__(self, config):
+        self.config = config
+        self.provider = PROVIDERS[config["PROVIDER"]](config)
+        self._slots = threading.BoundedSemaphore(config["MAX_IN_FLIGHT"])
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def _record(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _should_retry(self, exc):
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+            return True
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            return exc.response.status_code in RETRY_STATUS
+        return False
+
+    def _backoff(self, attempt):
+        # full jitter：在 [0, min(max, base * 2^attempt)] 之间随机等待
+        ceiling = min(self.config["BACKOFF_MAX"], self.config["BACKOFF_BASE"] * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
+
+    def complete(self, prompt, max_tokens=512, temperature=0.7):
+        with tracing.span("llm.complete", provider=self.config["PROVIDER"]) as span:
+            text, usage, attempts = self._complete(prompt, max_tokens, temperature)
+            if span is not None:
+                span.set("attempts", attempts)
+                span.set("completion_tokens", usage.get("completion_tokens", 0))
+        return text
+
+    def _complete(self, prompt, max_tokens, temperature):
+        waited = time.monotonic()
+        if not self._slots.acquire(timeout=self.config["ACQUIRE_TIMEOUT"]):
+            self._record(rejected=1)
+            timing.add("llm", time.monotonic() - waited)
+            raise LLMBusyError("AI服务繁忙，请稍后再试")
+        self._record(in_flight=1)
+        started = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    text, usage = self.provider.complete(prompt, max_tokens, temperature)
+                    break
+                except Exception as e:
+                    if attempt >= self.config["MAX_RETRIES"] or not self._should_retry(e):
+                        self._record(failures=1)
+                        raise
+                    self._record(retries=1)
+                    self._backoff(attempt)
+                    attempt += 1
+        finally:
+            elapsed = time.monotonic() - started
+            self._slots.release()
+            # 计入请求耗时分解的包括排队等待名额的时间
+            timing.add("llm", time.monotonic() - waited)
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["in_flight"] -= 1
+                self._stats["latency_total"] += elapsed
+                self._stats["latency_max"] = max(self._stats["latency_max"], elapsed)
+        self._record(
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+        return text, usage, attempt + 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "LLM_CLIENT", {}))
+    return config
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(get_config())
+    return _client
+
+
+def reset_client():
+    """配置变更后（主要用于测试）重新创建客户端"""
+    global _client
+    with _client_lock:
+        _client = None
@@ -0,0 +1,521 @@
+"""
+端到端压测
+
+seed() 按给定规模生成合成的曲库和用户（歌手、专辑、歌曲、标签、歌单、收藏、评论、评分、播放历史），
+ENDPOINTS 覆盖 music、search、user 三个应用的每个路由，run() 用多个并发客户端逐个接口施压，
+summarize() 统计吞吐量和 p50/p95/p99 延迟，结果写成 JSON 便于对比不同版本。
+
+由 python manage.py bench_load 调用。压测会写入数据库（播放、收藏、注册、注销等），
+应使用单独的压测数据库。
+"""
+
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from music.models import (
+    Album, Artist, Comment, Favorite, Playlist, PlaylistSong, PlayHistory, Rating, Song, SongTag, Tag,
+)
+
+User = get_user_model()
+
+BENCH_DOMAIN = "bench.local"
+BENCH_PASSWORD = "Bench-Passw0rd"
+ARTIST_PREFIX = "压测歌手"
+TAG_PREFIX = "压测标签"
+# 压测中新建的收藏使用该值以上的歌曲 id，结束后删除
+TEMP_SONG_ID = 10 ** 12
+
+# 没有录制的搜索参数时使用的关键词
+DEFAULT_KEYWORDS = ["晴天", "七里香", "稻香", "周杰伦", "陈奕迅", "孙燕姿", "后来", "海阔天空", "Yesterday", "Halo"]
+
+
+def bench_email(name):
+    return f"{name}@{BENCH_DOMAIN}"
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def is_seeded():
+    return User.objects.filter(email=bench_email("bench0")).exists()
+
+
+def seed(songs, users, history, batch_size=5000, seed=0, log=print):
+    """生成合成数据；已经生成过时直接返回 False"""
+    if is_seeded():
+        return False
+    rng = random.Random(seed)
+    now = timezone.now()
+    artist_count = max(1, songs // 50)
+    album_count = max(1, songs // 10)
+
+    def create(model, objects, label):
+        count = 0
+        for batch in batched(objects, batch_size):
+            model.objects.bulk_create(batch, batch_size=batch_size)
+            count += len(batch)
+        log(f"{label}: {count}")
+
+    create(Artist, (
+        Artist(name=f"{ARTIST_PREFIX}{i}", bio=f"简介{i}", image_url=f"https://example.com/artist/{i}.jpg")
+        for i in range(artist_count)
+    ), "歌手")
+    artist_ids = list(Artist.objects.filter(name__startswith=ARTIST_PREFIX).order_by("id").values_list("id", flat=True))
+    create(Album, (
+        Album(
+            title=f"压测专辑{i}", artist_id=artist_ids[i % artist_count],
+            cover_url=f"https://example.com/album/{i}.jpg", release_date=(now - timedelta(days=i % 3650)).date(),
+        )
+        for i in range(album_count)
+    ), "专辑")
+    albums = list(Album.objects.filter(artist_id__in=artist_ids).order_by("id").values_list("id", "artist_id"))
+    create(Song, (
+        Song(
+            title=f"压测歌曲{i}", artist_id=albums[i % album_count][1], album_id=albums[i % album_count][0],
+            audio_url=f"https://example.com/song/{i}.mp3", duration=rng.randrange(120, 360),
+            play_count=int(rng.paretovariate(1.2)) * 10,
+        )
+        for i in range(songs)
+    ), "歌曲")
+    song_ids = list(Song.objects.filter(artist_id__in=artist_ids).order_by("id").values_list("id", flat=True))
+
+    create(Tag, (Tag(name=f"{TAG_PREFIX}{i}") for i in range(50)), "标签")
+    tag_ids = list(Tag.objects.filter(name__startswith=TAG_PREFIX).values_list("id", flat=True))
+    create(SongTag, (
+        SongTag(song_id=song_id, tag_id=tag_id)
+        for song_id in song_ids for tag_id in rng.sample(tag_ids, 2)
+    ), "歌曲标签")
+
+    password = make_password(BENCH_PASSWORD)
+    create(User, (
+        User(email=bench_email(f"bench{i}"), username=bench_email(f"bench{i}"), nickname=f"bench{i}", password=password)
+        for i in range(users)
+    ), "用户")
+    user_ids = list(User.objects.filter(email__endswith="@" + BENCH_DOMAIN).order_by("id").values_list("id", flat=True))
+
+    create(Playlist, (
+        Playlist(title=f"歌单{user_id}-{n}", user_id=user_id, is_public=n == 0)
+        for user_id in user_ids for n in range(2)
+    ), "歌单")
+    playlist_ids = Playlist.objects.filter(user_id__in=user_ids).values_list("id", flat=True).iterator()
+    create(PlaylistSong, (
+        PlaylistSong(playlist_id=playlist_id, song_id=song_id, order=order)
+        for playlist_id in playlist_ids
+        for order, song_id in enumerate(rng.sample(song_ids, min(20, len(song_ids))))
+    ), "歌单歌曲")
+    create(Favorite, (
+        Favorite(user_id=user_id, song_id=song_id, song_name=f"压测歌曲{song_id}", artist_name="压测")
+        for user_id in user_ids for song_id in rng.sample(song_ids, min(20, len(song_ids)))
+    ), "收藏")
+    create(Rating, (
+        Rating(user_id=user_id, song_id=song_id, score=rng.randint(1, 5))
+        for user_id in user_ids for song_id in rng.sample(song_ids, min(5, len(song_ids)))
+    ), "评分")
+    create(Comment, (
+        Comment(user_id=rng.choice(user_ids), song_id=rng.choice(song_ids), content=f"评论{i}")
+        for i in range(max(1, songs // 10))
+    ), "评论")
+    # 播放历史集中在少数热门歌曲上，时间分布在最近 30 天
+    hot = song_ids[: max(1, len(song_ids) // 20)]
+    create(PlayHistory, (
+        PlayHistory(
+            user_id=rng.choice(user_ids),
+            song_id=rng.choice(hot) if rng.random() < 0.8 else rng.choice(song_ids),
+            played_at=now - timedelta(seconds=rng.randrange(30 * 24 * 3600)),
+        )
+        for _ in range(history)
+    ), "播放历史")
+    return True
+
+
+class BenchUser:
+    def __init__(self, user):
+        self.id = user.pk
+        self.email = user.email
+        self.nickname = user.nickname
+        self.token = str(RefreshToken.for_user(user).access_token)
+
+
+class Context:
+    """各接口构造请求时使用的数据"""
+
+    def __init__(self, pool_size, keywords=None, seed=0):
+        self.rng = random.Random(seed)
+        self.run_id = f"{int(time.time())}{random.randrange(1000):03d}"
+        self.users = [
+            BenchUser(user)
+            for user in User.objects.filter(email__in=[bench_email(f"bench{i}") for i in range(pool_size)])
+        ]
+        if not self.users:
+            raise ValueError("没有压测用户，请先使用 --seed 生成数据")
+        artists = Artist.objects.filter(name__startswith=ARTIST_PREFIX)
+        self.artist_ids = self.sample_ids(artists)
+        self.album_ids = self.sample_ids(Album.objects.filter(artist__in=artists))
+        self.song_ids = self.sample_ids(Song.objects.filter(artist__in=artists))
+        self.tag_ids = self.sample_ids(Tag.objects.filter(name__startswith=TAG_PREFIX))
+        user_ids = [user.id for user in self.users]
+        self.playlists = self.owned_ids(Playlist.objects.filter(user_id__in=user_ids))
+        self.favorites = self.owned_ids(Favorite.objects.filter(user_id__in=user_ids))
+        self.history = self.owned_ids(PlayHistory.objects.filter(user_id__in=user_ids)[: 20 * len(user_ids)])
+        self.keywords = keywords or DEFAULT_KEYWORDS
+        # 每个接口 prepare() 准备的一次性数据
+        self.prepared = {}
+
+    def sample_ids(self, queryset, limit=1000):
+        return list(queryset.order_by("id").values_list("id", flat=True)[:limit])
+
+    def owned_ids(self, queryset):
+        owned = {}
+        for id, user_id in queryset.values_list("id", "user_id"):
+            owned.setdefault(user_id, []).append(id)
+        return owned
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def pick(self, ids):
+        return self.rng.choice(ids)
+
+    def keyword(self, i):
+        return self.keywords[i % len(self.keywords)]
+
+    def disposable_users(self, count, label):
+        """注销、改密码等一次性操作用的用户"""
+        password = make_password(BENCH_PASSWORD)
+        emails = [bench_email(f"bench-{label}-{self.run_id}-{i}") for i in range(count)]
+        User.objects.bulk_create([
+            User(email=email, username=email, nickname=email.split("@")[0], password=password) for email in emails
+        ])
+        return [BenchUser(user) for user in User.objects.filter(email__in=emails).order_by("id")]
+
+
+def cleanup(ctx):
+    """删除压测过程中注册的临时用户、新建的歌单和收藏"""
+    User.objects.filter(email__startswith="bench-", email__contains=ctx.run_id).delete()
+    Playlist.objects.filter(title__startswith=f"bench-{ctx.run_id}").delete()
+    Favorite.objects.filter(user_id__in=[user.id for user in ctx.users], song_id__gte=TEMP_SONG_ID).delete()
+
+
+class Call:
+    def __init__(self, method, path, user=None, params=None, body=None):
+        self.method = method
+        self.path = path
+        self.token = user.token if user is not None else None
+        self.params = params
+        self.body = body
+
+
+class Endpoint:
+    """一个被压测的路由：build(ctx, i) 构造第 i 个请求，prepare(ctx, count) 在压测前准备数据"""
+
+    def __init__(self, name, build, prepare=None):
+        self.name = name
+        self.build = build
+        self.prepare = prepare
+
+
+def get(path, auth=False, params=None):
+    """只读接口：path、params 可以是 lambda ctx, i 的函数"""
+
+    def build(ctx, i):
+        return Call(
+            "GET",
+            path(ctx, i) if callable(path) else path,
+            ctx.user(i) if auth else None,
+            params(ctx, i) if callable(params) else params,
+        )
+
+    return build
+
+
+def prepare_disposable(label):
+    def prepare(ctx, count):
+        ctx.prepared[label] = ctx.disposable_users(count, label)
+    return prepare
+
+
+def prepare_own(model, field, make):
+    """为压测用户创建之后会被删除的记录，field 字段以 bench-<run_id> 开头用于找回主键"""
+
+    def prepare(ctx, count):
+        users = [ctx.user(i) for i in range(count)]
+        marker = f"bench-{ctx.run_id}-"
+        model.objects.bulk_create([make(user, marker + str(i)) for i, user in enumerate(users)])
+        # MySQL 的 bulk_create 不返回主键，按标记重新查询
+        ids = model.objects.filter(**{f"{field}__startswith": marker}).order_by("id").values_list("id", flat=True)
+        ctx.prepared[model.__name__] = list(zip(users, ids))
+
+    return prepare
+
+
+def own_playlist(ctx, i):
+    user = ctx.user(i)
+    return user, ctx.playlists[user.id][0]
+
+
+def own_favorite(ctx, i):
+    user = ctx.user(i)
+    return user, ctx.pick(ctx.favorites[user.id])
+
+
+ENDPOINTS = [
+    # user
+    Endpoint("user.register", lambda ctx, i: Call("POST", "/api/user/register/", body={
+        "email": bench_email(f"bench-reg-{ctx.run_id}-{i}"), "nickname": f"bench-reg-{ctx.run_id}-{i}",
+        "password": BENCH_PASSWORD,
+    })),
+    Endpoint("user.login", lambda ctx, i: Call("POST", "/api/user/login/", body={
+        "email": ctx.user(i).email, "password": BENCH_PASSWORD,
+    })),
+    Endpoint("user.profile", get("/api/user/profile/", auth=True)),
+    Endpoint("user.update", lambda ctx, i: Call("PUT", "/api/user/update/", ctx.user(i), body={
+        "nickname": ctx.user(i).nickname,
+    })),
+    Endpoint(
+        "user.password",
+        lambda ctx, i: Call("PUT", "/api/user/update/password/", ctx.prepared["password"][i], body={
+            "password": BENCH_PASSWORD, "new_password": BENCH_PASSWORD + "-new",
+        }),
+        prepare_disposable("password"),
+    ),
+    Endpoint(
+        "user.delete",
+        lambda ctx, i: Call("DELETE", "/api/user/delete/", ctx.prepared["delete"][i]),
+        prepare_disposable("delete"),
+    ),
+    # music
+    Endpoint("music.artists.list", get("/api/music/artists/")),
+    Endpoint("music.artists.retrieve", get(lambda ctx, i: f"/api/music/artists/{ctx.pick(ctx.artist_ids)}/")),
+    Endpoint("music.artists.songs", get(lambda ctx, i: f"/api/music/artists/{ctx.pick(ctx.artist_ids)}/songs/")),
+    Endpoint("music.artists.albums", get(lambda ctx, i: f"/api/music/artists/{ctx.pick(ctx.artist_ids)}/albums/")),
+    Endpoint("music.albums.list", get("/api/music/albums/", params=lambda ctx, i: {"search": f"压测专辑{i % 100}1"})),
+    Endpoint("music.albums.retrieve", get(lambda ctx, i: f"/api/music/albums/{ctx.pick(ctx.album_ids)}/")),
+    Endpoint("music.albums.songs", get(lambda ctx, i: f"/api/music/albums/{ctx.pick(ctx.album_ids)}/songs/")),
+    Endpoint("music.songs.list", get("/api/music/songs/", params=lambda ctx, i: {"search": f"压测歌曲{i % 100}1"})),
+    Endpoint("music.songs.retrieve", get(lambda ctx, i: f"/api/music/songs/{ctx.pick(ctx.song_ids)}/", auth=True)),
+    Endpoint("music.songs.play", lambda ctx, i: Call("POST", f"/api/music/songs/{ctx.pick(ctx.song_ids)}/play/", ctx.user(i))),
+    Endpoint("music.songs.comments", get(lambda ctx, i: f"/api/music/songs/{ctx.pick(ctx.song_ids)}/comments/")),
+    Endpoint("music.songs.favorite", lambda ctx, i: Call("POST", f"/api/music/songs/{ctx.pick(ctx.song_ids)}/favorite/", ctx.user(i))),
+    Endpoint("music.songs.unfavorite", lambda ctx, i: Call("POST", f"/api/music/songs/{ctx.pick(ctx.song_ids)}/unfavorite/", ctx.user(i))),
+    Endpoint("music.songs.rate", lambda ctx, i: Call(
+        "POST", f"/api/music/songs/{ctx.pick(ctx.song_ids)}/rate/", ctx.user(i), body={"score": i % 5 + 1},
+    )),
+    Endpoint("music.songs.comment", lambda ctx, i: Call(
+        "POST", f"/api/music/songs/{ctx.pick(ctx.song_ids)}/comment/", ctx.user(i), body={"content": f"压测评论{i}"},
+    )),
+    Endpoint("music.songs.recommended", get("/api/music/songs/recommended/")),
+    Endpoint("music.songs.trending", get("/api/music/songs/trending/")),
+    Endpoint("music.songs.personalized", get("/api/music/songs/personalized/", auth=True)),
+    Endpoint("music.tags.list", get("/api/music/tags/")),
+    Endpoint("music.tags.retrieve", get(lambda ctx, i: f"/api/music/tags/{ctx.pick(ctx.tag_ids)}/")),
+    Endpoint("music.tags.songs", get(lambda ctx, i: f"/api/music/tags/{ctx.pick(ctx.tag_ids)}/songs/")),
+    Endpoint("music.playlists.list", get("/api/music/playlists/", auth=True, params=lambda ctx, i: {"search": ctx.user(i).nickname})),
+    Endpoint("music.playlists.retrieve", get(lambda ctx, i: f"/api/music/playlists/{own_playlist(ctx, i)[1]}/", auth=True)),
+    Endpoint("music.playlists.create", lambda ctx, i: Call(
+        "POST", "/api/music/playlists/", ctx.user(i), body={"title": f"bench-{ctx.run_id}-new-{i}", "user": ctx.user(i).id},
+    )),
+    Endpoint("music.playlists.update", lambda ctx, i: Call(
+        "PATCH", "/api/music/playlists/%d/" % own_playlist(ctx, i)[1], ctx.user(i),
+        body={"title": f"歌单{ctx.user(i).id}-0"},
+    )),
+    Endpoint(
+        "music.playlists.destroy",
+        lambda ctx, i: Call("DELETE", "/api/music/playlists/%d/" % ctx.prepared["Playlist"][i][1], ctx.prepared["Playlist"][i][0]),
+        prepare_own(Playlist, "title", lambda user, title: Playlist(title=title, user_id=user.id)),
+    ),
+    Endpoint("music.playlists.add_song", lambda ctx, i: Call(
+        "POST", "/api/music/playlists/%d/add_song/" % own_playlist(ctx, i)[1], ctx.user(i),
+        body={"song_id": ctx.pick(ctx.song_ids)},
+    )),
+    Endpoint("music.playlists.remove_song", lambda ctx, i: Call(
+        "POST", "/api/music/playlists/%d/remove_song/" % own_playlist(ctx, i)[1], ctx.user(i),
+        body={"song_id": ctx.pick(ctx.song_ids)},
+    )),
+    Endpoint("music.favorites.list", get("/api/music/favorites/", auth=True)),
+    Endpoint("music.favorites.create", lambda ctx, i: Call(
+        "POST", "/api/music/favorites/", ctx.user(i),
+        body={"song_id": TEMP_SONG_ID + 10 ** 6 + i, "song_name": f"压测歌曲{i}"},
+    )),
+    Endpoint("music.favorites.retrieve", get(lambda ctx, i: f"/api/music/favorites/{own_favorite(ctx, i)[1]}/", auth=True)),
+    Endpoint("music.favorites.update", lambda ctx, i: Call(
+        "PATCH", "/api/music/favorites/%d/" % own_favorite(ctx, i)[1], ctx.user(i), body={"album_name": f"压测专辑{i}"},
+    )),
+    Endpoint(
+        "music.favorites.destroy",
+        lambda ctx, i: Call("DELETE", "/api/music/favorites/%d/" % ctx.prepared["Favorite"][i][1], ctx.prepared["Favorite"][i][0]),
+        prepare_own(Favorite, "song_name", lambda user, name: Favorite(
+            user_id=user.id, song_id=TEMP_SONG_ID + int(name.rsplit("-", 1)[1]), song_name=name,
+        )),
+    ),
+    Endpoint("music.favorites.toggle", lambda ctx, i: Call(
+        "POST", "/api/music/favorites/toggle/", ctx.user(i), body={"song_id": TEMP_SONG_ID + 2 * 10 ** 6 + i % 10, "song_name": "压测"},
+    )),
+    Endpoint("music.favorites.check", get(
+        "/api/music/favorites/check/", auth=True, params=lambda ctx, i: {"song_id": ctx.pick(ctx.song_ids)},
+    )),
+    Endpoint("music.history.list", get("/api/music/history/", auth=True)),
+    Endpoint("music.history.retrieve", get(
+        lambda ctx, i: f"/api/music/history/{ctx.pick(ctx.history.get(ctx.user(i).id) or [0])}/", auth=True,
+    )),
+    # search
+    Endpoint("search.bytitle", get("/api/search/bytitle/", params=lambda ctx, i: {"keyword": ctx.keyword(i)})),
+    Endpoint("search.byartist", get("/api/search/byartist/", params=lambda ctx, i: {"keyword": ctx.keyword(i)})),
+    Endpoint("search.byalbum", get("/api/search/byalbum/", params=lambda ctx, i: {"keyword": ctx.keyword(i)})),
+    Endpoint("search.all", get("/api/search/all/", params=lambda ctx, i: {"keyword": ctx.keyword(i)})),
+    Endpoint("search.byartistsong", get("/api/search/byartistsong/", params=lambda ctx, i: {"id": 6452 + i % 20})),
+    Endpoint("search.artistpage", get("/api/search/artistpage/", params=lambda ctx, i: {"id": 6452 + i % 20})),
+    Endpoint("search.byalbumsong", get("/api/search/byalbumsong/", params=lambda ctx, i: {"id": 18905 + i % 20})),
+    Endpoint("search.bysong", get("/api/search/bysong/", params=lambda ctx, i: {"id": 186016 + i % 50})),
+    # 以压测用户身份发送，按用户计入 warm_queue 限流，不会全部落在同一个匿名 IP 上
+    Endpoint("search.warm", lambda ctx, i: Call(
+        "POST", "/api/search/warm/", ctx.user(i), body={"ids": [186016 + (i + n) % 50 for n in range(3)]},
+    )),
+    Endpoint("search.bydesc", get("/api/search/bydesc/", auth=True, params=lambda ctx, i: {"describe": f"适合{ctx.keyword(i)}时听的歌"})),
+    Endpoint("search.byspirit", get("/api/search/byspirit/", auth=True, params=lambda ctx, i: {"spirit": f"像{ctx.keyword(i)}一样"})),
+    Endpoint("search.guess", get("/api/search/guess/", auth=True)),
+    Endpoint("search.related", get("/api/search/related/", auth=True, params=lambda ctx, i: {"title": ctx.keyword(i)})),
+    Endpoint("search.newsong", get("/api/search/newsong/")),
+]
+
+
+class InProcessTarget:
+    """直接调用 Django 的 WSGI 处理流程，不经过网络"""
+
+    name = "in-process"
+
+    def client(self):
+        return Client(raise_request_exception=False)
+
+    def send(self, client, call):
+        extra = {"HTTP_AUTHORIZATION": f"Bearer {call.token}"} if call.token else {}
+        if call.method == "GET":
+            response = client.get(call.path, call.params, **extra)
+        else:
+            response = client.generic(
+                call.method, call.path, json.dumps(call.body or {}), content_type="application/json", **extra
+            )
+        return response.status_code
+
+    def close(self, client):
+        connection.close()
+
+
+class HttpTarget:
+    """通过 HTTP 压测已经启动的服务"""
+
+    def __init__(self, base_url, timeout=30):
+        import requests
+
+        self.requests = requests
+        self.name = base_url
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def client(self):
+        return self.requests.Session()
+
+    def send(self, client, call):
+        headers = {"Authorization": f"Bearer {call.token}"} if call.token else {}
+        response = client.request(
+            call.method, self.base_url + call.path, params=call.params,
+            json=call.body if call.method != "GET" else None, headers=headers, timeout=self.timeout,
+        )
+        return response.status_code
+
+    def close(self, client):
+        client.close()
+
+
+def run(target, endpoint, ctx, requests, concurrency, warmup=0):
+    """对一个接口发出 requests 个请求（另加 warmup 个不计入统计的预热请求），返回统计结果"""
+    if endpoint.prepare is not None:
+        endpoint.prepare(ctx, warmup + requests)
+    calls = [endpoint.build(ctx, i) for i in range(warmup + requests)]
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = itertools.count()
+    started = {}
+
+    def worker():
+        client = target.client()
+        try:
+            while True:
+                i = next(counter)
+                if i >= len(calls):
+                    return
+                if i == warmup:
+                    started.setdefault("at", time.perf_counter())
+                begin = time.perf_counter()
+                try:
+                    status = target.send(client, calls[i])
+                except Exception:
+                    status = 0
+                elapsed = time.perf_counter() - begin
+                if i >= warmup:
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[status] += 1
+        finally:
+            target.close(client)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started.get("at", time.perf_counter())
+    return summarize(latencies, statuses, wall)
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, statuses, wall):
+    values = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        "requests": len(values),
+        "errors": sum(count for status, count in statuses.items() if status == 0 or status >= 500),
+        "status": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(values) / wall, 2) if wall > 0 else None,
+        "mean_ms": ms(sum(values) / len(values)) if values else None,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+def compare(report, baseline):
+    """与上一次结果对比，返回 [(接口, 基线 p95, 本次 p95, 变化百分比)]"""
+    rows = []
+    for name, result in report["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name, {}).get("p95_ms")
+        after = result.get("p95_ms")
+        change = round((after - before) / before * 100, 1) if before and after is not None else None
+        rows.append((name, before, after, change))
+    return rows
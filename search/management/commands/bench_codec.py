@@ -0,0 +1,115 @@
+import json
+import pickle
+import random
+import timeit
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from search import codec
+from search.views import format_album, format_artist, format_song
+
+
+def fake_song(rng, i):
+    artist_id = rng.randrange(50)
+    album_id = rng.randrange(200)
+    return {
+        "name": f"歌曲{i}",
+        "id": 100000 + i,
+        "ar": [{"id": artist_id, "name": f"歌手{artist_id}", "tns": [], "alias": []}],
+        "al": {
+            "id": album_id,
+            "name": f"专辑{album_id}",
+            "picUrl": f"https://p1.music.126.net/{album_id:08d}/{album_id}.jpg",
+            "tns": [],
+        },
+        "publishTime": 1600000000000 + i,
+    }
+
+
+def fake_artist(rng, i):
+    return {
+        "id": i,
+        "name": f"歌手{i}",
+        "picUrl": f"https://p1.music.126.net/artist/{i}.jpg",
+        "alias": [f"别名{i}"] if rng.random() < 0.3 else [],
+        "albumSize": rng.randrange(100),
+        "mvSize": rng.randrange(20),
+    }
+
+
+def fake_album(rng, i):
+    artist_id = rng.randrange(50)
+    return {
+        "name": f"专辑{i}",
+        "id": i,
+        "size": rng.randrange(30),
+        "picUrl": f"https://p1.music.126.net/{i:08d}/{i}.jpg",
+        "publishTime": 1600000000000 + i,
+        "company": "某唱片公司",
+        "alias": [],
+        "artists": [{"name": f"歌手{artist_id}", "id": artist_id, "picUrl": ""}],
+    }
+
+
+def retained_bytes(make, count):
+    """创建 count 个对象后常驻的内存（字节）"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+class Command(BaseCommand):
+    help = "对比缓存数据紧凑编码与直接 pickle 字典的体积、内存和编解码耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100, help="每条缓存包含的元素数，默认 100")
+        parser.add_argument("--entries", type=int, default=200, help="测量内存时创建的条目数，默认 200")
+        parser.add_argument("--repeat", type=int, default=200, help="测量耗时的重复次数，默认 200")
+        parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        items = options["items"]
+        payloads = {
+            "search_song": [format_song(fake_song(rng, i)) for i in range(items)],
+            "search_artist": [format_artist(fake_artist(rng, i)) for i in range(items)],
+            "search_album": [format_album(fake_album(rng, i)) for i in range(items)],
+        }
+
+        report = {}
+        for name, value in payloads.items():
+            pickled = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            plain = codec.pack(value, compress_min_bytes=None)
+            compressed = codec.pack(value, compress_min_bytes=0)
+            assert codec.unpack(plain) == value and codec.unpack(compressed) == value
+
+            repeat = options["repeat"]
+            report[name] = {
+                "pickle_bytes": len(pickled),
+                "packed_bytes": len(plain),
+                "packed_zlib_bytes": len(compressed),
+                # 进程内 LRU 中每条缓存占用的内存
+                "dict_memory_bytes": retained_bytes(lambda: pickle.loads(pickled), options["entries"]),
+                "packed_memory_bytes": retained_bytes(lambda: bytes(memoryview(plain)), options["entries"]),
+                "pickle_dumps_us": timeit.timeit(
+                    lambda: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), number=repeat
+                ) / repeat * 1e6,
+                "pickle_loads_us": timeit.timeit(lambda: pickle.loads(pickled), number=repeat) / repeat * 1e6,
+                "pack_us": timeit.timeit(lambda: codec.pack(value, None), number=repeat) / repeat * 1e6,
+                "unpack_us": timeit.timeit(lambda: codec.unpack(plain), number=repeat) / repeat * 1e6,
+                "pack_zlib_us": timeit.timeit(lambda: codec.pack(value, 0), number=repeat) / repeat * 1e6,
+                "unpack_zlib_us": timeit.timeit(lambda: codec.unpack(compressed), number=repeat) / repeat * 1e6,
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, row in report.items():
+            self.stdout.write(f"{name}（{items} 条）")
+            for key, value in row.items():
+                self.stdout.write(f"  {key:<22}{value:>12.1f}")
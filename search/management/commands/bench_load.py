@@ -0,0 +1,206 @@
+import json
+import logging
+import subprocess
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from search import llm, loadtest, prefetch, upstream
+from search.replay import CHAT, FixtureSet, ReplayServer
+
+
+class Command(BaseCommand):
+    help = "端到端压测：生成合成数据，逐个接口并发施压，输出吞吐量和 p50/p95/p99 延迟（JSON）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="压测前生成合成数据（已存在时跳过）")
+        parser.add_argument("--songs", type=int, default=100000)
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--history", type=int, default=1000000, help="播放历史行数")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--base-url",
+            default="",
+            help="压测已经启动的服务（此时上游回放需另行用 replay_upstream 启动）；默认在进程内调用",
+        )
+        parser.add_argument(
+            "--fixtures",
+            default="",
+            help="上游录制目录，进程内压测时在本地回放；未指定时上游由空的本地回放代替，所有上游调用返回 404",
+        )
+        parser.add_argument(
+            "--live", action="store_true", help="进程内压测时访问真实上游和配置的大模型（会产生真实调用和费用）"
+        )
+        parser.add_argument("--latency", default="recorded", help="回放延迟分布，见 replay_upstream")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=200, help="每个接口的请求数")
+        parser.add_argument("--warmup", type=int, default=10, help="每个接口不计入统计的预热请求数")
+        parser.add_argument("--user-pool", type=int, default=100, help="轮流使用的压测用户数")
+        parser.add_argument("--only", action="append", default=[], help="只压测名称以此开头的接口，可重复")
+        parser.add_argument("--exclude", action="append", default=[], help="跳过名称以此开头的接口，可重复")
+        parser.add_argument(
+            "--keep-throttle", action="store_true", help="保留 AI 接口限流（默认进程内压测时放开）"
+        )
+        parser.add_argument("--output", default="bench_results.json")
+        parser.add_argument("--baseline", default="", help="上一次的结果文件，输出 p95 对比")
+
+    def handle(self, *args, **options):
+        self.replay = None
+        self.fixtures = None
+        if options["seed"]:
+            self.stdout.write("生成压测数据...")
+            seeded = loadtest.seed(
+                options["songs"], options["users"], options["history"],
+                batch_size=options["batch_size"], log=self.stdout.write,
+            )
+            if not seeded:
+                self.stdout.write("压测数据已存在，跳过")
+
+        endpoints = [
+            endpoint for endpoint in loadtest.ENDPOINTS
+            if (not options["only"] or any(endpoint.name.startswith(p) for p in options["only"]))
+            and not any(endpoint.name.startswith(p) for p in options["exclude"])
+        ]
+        if not endpoints:
+            raise CommandError("没有匹配的接口")
+
+        if options["base_url"]:
+            if options["fixtures"] or options["live"]:
+                raise CommandError(
+                    "--fixtures 和 --live 只用于进程内压测，压测外部服务时请另行启动 replay_upstream"
+                )
+            target = loadtest.HttpTarget(options["base_url"])
+            overrides = {}
+        else:
+            if options["fixtures"] and options["live"]:
+                raise CommandError("--fixtures 和 --live 不能同时使用")
+            target = loadtest.InProcessTarget()
+            overrides = self.in_process_settings(options)
+
+        # 5xx 已计入结果，进程内压测时不再逐条打印异常堆栈
+        request_logger = logging.getLogger("django.request")
+        log_level = request_logger.level
+        if not options["base_url"]:
+            request_logger.setLevel(logging.CRITICAL)
+        with override_settings(**overrides):
+            upstream.reset()
+            llm.reset_client()
+            try:
+                ctx = loadtest.Context(options["user_pool"], keywords=self.keywords(options))
+            except ValueError as e:
+                self.stop_replay()
+                raise CommandError(str(e))
+            try:
+                results = {}
+                for endpoint in endpoints:
+                    result = loadtest.run(
+                        target, endpoint, ctx, options["requests"], options["concurrency"], options["warmup"]
+                    )
+                    results[endpoint.name] = result
+                    self.stdout.write(
+                        f"{endpoint.name:<28} {result['throughput_rps'] or 0:>8.1f} rps  "
+                        f"p50 {result['p50_ms'] or 0:>8.1f}  p95 {result['p95_ms'] or 0:>8.1f}  "
+                        f"p99 {result['p99_ms'] or 0:>8.1f} ms  错误 {result['errors']}"
+                    )
+            finally:
+                # 预取任务在后台线程里访问上游，要在恢复配置（真实上游）之前结束
+                if not prefetch.drain(timeout=30):
+                    self.stderr.write("仍有预取任务未结束")
+                loadtest.cleanup(ctx)
+                upstream.reset()
+                llm.reset_client()
+                self.stop_replay()
+                request_logger.setLevel(log_level)
+
+        report = {
+            "version": 1,
+            "finished_at": timezone.now().isoformat(),
+            "commit": self.git_commit(),
+            "target": target.name,
+            "upstream": self.upstream_name(options),
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "warmup": options["warmup"],
+            "scale": {"songs": options["songs"], "users": options["users"], "history": options["history"]},
+            "endpoints": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(f"结果已写入 {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            self.stdout.write("p95 对比（基线 -> 本次）：")
+            for name, before, after, change in loadtest.compare(report, baseline):
+                delta = "" if change is None else f"{change:+.1f}%"
+                self.stdout.write(f"{name:<28} {before} -> {after} ms {delta}")
+
+    def in_process_settings(self, options):
+        overrides = {}
+        if not options["keep_throttle"]:
+            overrides["AI_THROTTLE"] = dict(
+                getattr(settings, "AI_THROTTLE", {}),
+                USER_BURST=10 ** 9, ANON_BURST=10 ** 9, GLOBAL_BURST=10 ** 9,
+                USER_RATE=10 ** 9, ANON_RATE=10 ** 9, GLOBAL_RATE=10 ** 9,
+            )
+        # search.warm 只在开启预取时可用，否则整行只统计到 404
+        overrides["PREFETCH"] = dict(getattr(settings, "PREFETCH", {}), ENABLED=True)
+        if options["live"]:
+            self.stderr.write("--live：搜索接口会访问真实上游和配置的大模型")
+            return overrides
+        if not options["fixtures"]:
+            self.stderr.write("未指定 --fixtures，上游由空的本地回放代替，依赖上游的接口只能测到错误路径")
+
+        try:
+            fixtures = FixtureSet(options["fixtures"] or None)
+            self.replay = ReplayServer(("127.0.0.1", 0), fixtures, default_latency=options["latency"], latency=None)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        threading.Thread(target=self.replay.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:%d" % self.replay.server_address[1]
+        overrides["UPSTREAMS"] = {
+            host: dict(config, MIRRORS=[f"{base}/{host}"])
+            for host, config in getattr(settings, "UPSTREAMS", {}).items()
+        }
+        if CHAT in fixtures.fixtures:
+            overrides["LLM_CLIENT"] = dict(settings.LLM_CLIENT, PROVIDER="siliconflow", API_URL=f"{base}/chat/completions")
+        else:
+            overrides["LLM_CLIENT"] = dict(settings.LLM_CLIENT, PROVIDER="fake")
+        self.fixtures = fixtures
+        return overrides
+
+    def upstream_name(self, options):
+        if options["base_url"]:
+            return "external"
+        if options["live"]:
+            return "live"
+        return options["fixtures"] or "empty"
+
+    def keywords(self, options):
+        """优先使用录制过的搜索关键词，回放时命中率更高"""
+        if self.fixtures is None:
+            return None
+        keywords = sorted({
+            json.loads(key).get("keywords") for key in self.fixtures.fixtures.get("cloudsearch", {})
+        } - {None})
+        return keywords or None
+
+    def stop_replay(self):
+        if self.replay is not None:
+            self.replay.shutdown()
+            self.replay.server_close()
+            stats = self.fixtures.stats
+            self.stdout.write(f"上游回放：命中 {stats['hits']}，未录到 {stats['misses']}")
+            self.replay = None
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,125 @@
+import json
+import time
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "通过 /api/search/memory/ 查看运行中 worker 的内存：缓存大小、tracemalloc 快照及其对比。"
+        "多 worker 部署时请求可能落到不同进程，请直接指向单个 worker 的地址"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--admin", default="", help="用该管理员账号（邮箱）签发访问令牌")
+        parser.add_argument("--token", default="", help="管理员的访问令牌，与 --admin 二选一")
+        parser.add_argument("--count", type=int, default=0, help="保存的快照数，达到两个时输出首尾对比")
+        parser.add_argument("--interval", type=float, default=60, help="快照间隔（秒）")
+        parser.add_argument("--label", default="", help="快照标签")
+        parser.add_argument("--objects", action="store_true", help="附带按类型的对象数（较慢）")
+        parser.add_argument("--stop", action="store_true", help="停止 tracemalloc 并丢弃快照")
+        parser.add_argument("--json", action="store_true", help="输出原始 JSON")
+
+    def handle(self, *args, **options):
+        self.url = options["base_url"].rstrip("/") + "/api/search/memory/"
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.get_token(options)}"
+
+        if options["stop"]:
+            self.call("delete")
+            self.stdout.write("已停止 tracemalloc")
+            return
+
+        taken = []
+        for i in range(options["count"]):
+            if i:
+                time.sleep(options["interval"])
+            label = f"{options['label']}#{i + 1}" if options["label"] else ""
+            snapshot = self.call("post", json={"label": label})
+            taken.append(snapshot["id"])
+            self.stdout.write(f"快照 {snapshot['id']}：tracemalloc {format_bytes(snapshot['traced'])}")
+
+        report = self.call("get", params={"objects": "1"} if options["objects"] else None)
+        diff = None
+        if len(taken) >= 2:
+            diff = self.call("get", params={"diff": "1", "base": taken[0], "target": taken[-1]})
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"report": report, "diff": diff}, ensure_ascii=False, indent=2))
+        else:
+            self.print_report(report)
+            if diff is not None:
+                self.print_diff(diff)
+
+    def get_token(self, options):
+        if options["token"]:
+            return options["token"]
+        if not options["admin"]:
+            raise CommandError("请指定 --admin 或 --token")
+        user = get_user_model().objects.filter(email=options["admin"], is_staff=True).first()
+        if user is None:
+            raise CommandError(f"管理员 {options['admin']} 不存在")
+        return str(RefreshToken.for_user(user).access_token)
+
+    def call(self, method, **kwargs):
+        try:
+            response = self.session.request(method, self.url, timeout=60, **kwargs)
+        except requests.RequestException as e:
+            raise CommandError(f"请求失败: {e}")
+        try:
+            body = response.json()
+        except ValueError:
+            raise CommandError(f"HTTP {response.status_code}")
+        if response.status_code == 404 and "code" not in body:
+            raise CommandError("内存检查未开启（MEMORY_DEBUG_ENABLED）")
+        if response.status_code != 200:
+            raise CommandError(body.get("message") or body.get("detail") or f"HTTP {response.status_code}")
+        return body.get("data")
+
+    def print_report(self, report):
+        self.stdout.write(f"RSS {format_bytes(report['rss'])}")
+        traced = report["tracemalloc"]
+        if traced:
+            self.stdout.write(
+                f"tracemalloc 当前 {format_bytes(traced['current'])}，峰值 {format_bytes(traced['peak'])}，"
+                f"自身占用 {format_bytes(traced['overhead'])}"
+            )
+        structures = report["structures"]
+        self.stdout.write("缓存（条目数 / 上限 / 估算大小）：")
+        for name, data in list(structures["caches"].items()) + [("entities", structures["entities"])]:
+            self.stdout.write(
+                f"  {name:<20} {data['entries']:>6} / {data['max_entries']:<6} {format_bytes(data['bytes']):>10}"
+            )
+        self.stdout.write("预取器（排队 key / 已预取 key / 线程池队列 / 线程）：")
+        for name, data in structures["prefetchers"].items():
+            self.stdout.write(
+                f"  {name:<20} {data['pending']:>6} {data['tracked_keys']:>6} "
+                f"{data['executor_queue']:>6} {data['workers']:>4}"
+            )
+        self.stdout.write(f"线程数 {structures['threads']}")
+        for name, count in (report.get("objects") or {}).items():
+            self.stdout.write(f"  {name:<32} {count:>10}")
+
+    def print_diff(self, diff):
+        self.stdout.write(
+            f"快照 {diff['base']} -> {diff['target']}（{diff['seconds']} 秒）："
+            f"共 {format_bytes(diff['size_diff'])}"
+        )
+        for item in diff["top"]:
+            self.stdout.write(
+                f"  {format_bytes(item['size_diff']):>10} {item['count_diff']:>+8}  {item['location']}"
+            )
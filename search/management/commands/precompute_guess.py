@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from search.models import GuessResult
+from search.views import SearchGuess
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "为近期活跃用户批量预计算猜你喜欢结果（建议每晚执行一次）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=7, help="活跃用户的时间窗口（天），默认 7"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100, help="每批处理的用户数，默认 100"
+        )
+        parser.add_argument(
+            "--llm-concurrency",
+            type=int,
+            default=4,
+            help="同时进行的 AI 推荐数量上限，默认 4",
+        )
+        parser.add_argument(
+            "--force", action="store_true", help="忽略未过期的结果，全部重新计算"
+        )
+
+    def get_active_user_ids(self, days, force):
+        since = timezone.now() - timedelta(days=days)
+        users = (
+            User.objects.filter(is_active=True, favorites__isnull=False)
+            .filter(
+                Q(last_login__gte=since)
+                | Q(favorites__created_at__gte=since)
+                | Q(play_history__played_at__gte=since)
+            )
+            .distinct()
+        )
+        if not force:
+            # 距离过期还剩一半以上有效期的结果不必重算
+            fresh_after = timezone.now() - settings.GUESS_RESULT_MAX_AGE / 2
+            users = users.exclude(guess_result__computed_at__gte=fresh_after)
+        return list(users.order_by("id").values_list("id", flat=True))
+
+    def compute_one(self, user):
+        try:
+            if not SearchGuess().compute(user):
+                self.stderr.write(f"用户 {user.pk} 结果为空，保留原有结果")
+                return False
+            return True
+        except Exception as e:
+            self.stderr.write(f"用户 {user.pk} 计算失败: {e}")
+            return False
+        finally:
+            # 工作线程各自持有数据库连接，用完及时关闭
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        user_ids = self.get_active_user_ids(options["days"], options["force"])
+        self.stdout.write(f"待计算用户数: {len(user_ids)}")
+
+        succeeded = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options["llm_concurrency"])) as executor:
+            for start in range(0, len(user_ids), batch_size):
+                batch = User.objects.filter(id__in=user_ids[start:start + batch_size])
+                for ok in executor.map(self.compute_one, batch):
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                self.stdout.write(f"已处理 {min(start + batch_size, len(user_ids))}/{len(user_ids)}")
+
+        # 清理已不再活跃用户的过期结果
+        expired = timezone.now() - settings.GUESS_RESULT_MAX_AGE
+        deleted, _ = GuessResult.objects.filter(computed_at__lt=expired).delete()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"完成: 成功 {succeeded}，失败 {failed}，清理过期结果 {deleted}")
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from search.replay import FixtureSet, ReplayServer
+
+
+class Command(BaseCommand):
+    help = "启动上游回放服务，按录制的应答和配置的延迟分布返回，用于离线压测"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fixtures", required=True, help="录制目录（UPSTREAM_RECORD_DIR）")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8900)
+        parser.add_argument(
+            "--latency",
+            default="recorded",
+            help="默认延迟分布：fixed:50 / uniform:20,120 / lognormal:80,0.5 / recorded",
+        )
+        parser.add_argument(
+            "--api-latency",
+            action="append",
+            default=[],
+            metavar="API=SPEC",
+            help="单个接口的延迟分布，例如 cloudsearch=lognormal:120,0.6，可重复",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="延迟随机种子，相同种子延迟序列相同")
+
+    def handle(self, *args, **options):
+        latency = {}
+        for item in options["api_latency"]:
+            api, sep, spec = item.partition("=")
+            if not sep:
+                raise CommandError(f"--api-latency 格式应为 API=SPEC: {item}")
+            latency[api] = spec
+
+        try:
+            fixtures = FixtureSet(options["fixtures"])
+            server = ReplayServer(
+                (options["host"], options["port"]),
+                fixtures,
+                latency,
+                default_latency=options["latency"],
+                seed=options["seed"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        host, port = server.server_address[:2]
+        base = f"http://{host}:{port}"
+        self.stdout.write(f"已载入 {len(fixtures)} 条录制应答，回放服务: {base}")
+        self.stdout.write("后端启动前设置：")
+        self.stdout.write(f"  NETSTART_MIRRORS={base}/netstart")
+        self.stdout.write(f"  ALGER_MIRRORS={base}/alger")
+        self.stdout.write(f"  LLM_API_URL={base}/chat/completions")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"命中 {fixtures.stats['hits']}，未录到 {fixtures.stats['misses']}")
@@ -0,0 +1,203 @@
+"""
+worker 内存检查（管理员手动使用）
+
+- report()：进程 RSS、tracemalloc 统计，以及进程内大结构的大小：各命名空间的缓存 LRU（条目数、
+  估算字节数）、实体缓存、预取器的排队和线程池队列、上游舱壁、线程数；objects=True 时
+  再按类型统计 gc 跟踪的对象数（较慢）。
+- take_snapshot()：第一次调用时启动 tracemalloc，之后每次保存一个快照（最多 MAX_SNAPSHOTS 个）；
+  diff() 按代码行比较两个快照，增长最多的在前，间隔一段时间反复比较即可发现泄漏。
+- stop()：停止 tracemalloc 并丢弃快照，tracemalloc 开启期间分配内存会变慢、占用更多内存。
+
+管理员接口 /api/search/memory/ 调用这里的函数；python manage.py memory_snapshot 通过该接口操作运行中的 worker。
+"""
+
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+
+DEFAULTS = {
+    "ENABLED": False,
+    # tracemalloc 记录的栈深度
+    "TRACEMALLOC_FRAMES": 10,
+    "MAX_SNAPSHOTS": 10,
+    "TOP": 20,
+}
+
+# 不计入快照的内部分配
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_lock = threading.Lock()
+_snapshots = []
+_next_id = 1
+
+
+class SnapshotNotFound(Exception):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "MEMORY", {}))
+    return config
+
+
+def rss_bytes():
+    """当前 RSS；没有 /proc 时返回峰值 RSS"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位是字节，Linux 上是 KB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(obj, seen=None, depth=0):
+    """对象及其包含的容器、字符串的估算字节数（只展开常见的内置容器）"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > 16:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen, depth + 1) + deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen, depth + 1)
+    return size
+
+
+def lru_size(lru):
+    items = lru.items()
+    seen = set()
+    return {
+        "entries": len(items),
+        "max_entries": lru.max_entries,
+        "bytes": sum(deep_size(key, seen) + deep_size(entry, seen) for key, entry in items),
+    }
+
+
+def structures():
+    """进程内各大结构的大小"""
+    from . import cache, entities, prefetch, upstream
+
+    return {
+        "caches": {name: lru_size(item.local) for name, item in sorted(cache.registered().items())},
+        "entities": lru_size(entities.store.local),
+        "prefetchers": {name: item.sizes() for name, item in sorted(prefetch.registered().items())},
+        "bulkheads": {
+            host: {"in_flight": stats["bulkhead"]["in_flight"], "waiting": stats["bulkhead"]["waiting"]}
+            for host, stats in sorted(upstream.stats().items()) if stats["bulkhead"]
+        },
+        "threads": threading.active_count(),
+    }
+
+
+def object_counts(limit):
+    """gc 跟踪的对象按类型计数，最多的 limit 种"""
+    counts = Counter(type(obj).__qualname__ for obj in gc.get_objects())
+    return dict(counts.most_common(limit))
+
+
+def report(objects=False):
+    config = get_config()
+    traced = None
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        traced = {"current": current, "peak": peak, "overhead": tracemalloc.get_tracemalloc_memory()}
+    data = {
+        "rss": rss_bytes(),
+        "tracemalloc": traced,
+        "snapshots": list_snapshots(),
+        "structures": structures(),
+    }
+    if objects:
+        data["objects"] = object_counts(config["TOP"])
+    return data
+
+
+def list_snapshots():
+    with _lock:
+        return [
+            {"id": id, "label": label, "taken_at": taken_at, "traced": traced}
+            for id, label, taken_at, traced, _ in _snapshots
+        ]
+
+
+def take_snapshot(label=""):
+    """保存一个 tracemalloc 快照，返回其描述；第一次调用时启动 tracemalloc"""
+    global _next_id
+    config = get_config()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(config["TRACEMALLOC_FRAMES"])
+    snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    traced = tracemalloc.get_traced_memory()[0]
+    with _lock:
+        id = _next_id
+        _next_id += 1
+        _snapshots.append((id, label, time.time(), traced, snapshot))
+        del _snapshots[: -config["MAX_SNAPSHOTS"]]
+    return {"id": id, "label": label, "traced": traced}
+
+
+def get_snapshot(id):
+    with _lock:
+        for item in _snapshots:
+            if item[0] == id:
+                return item
+    raise SnapshotNotFound(f"快照 {id} 不存在")
+
+
+def diff(base=None, target=None, limit=None, key_type="lineno"):
+    """比较两个快照（默认最早和最新的），返回按增长字节数排序的前 limit 行"""
+    with _lock:
+        if len(_snapshots) < 2 and (base is None or target is None):
+            raise SnapshotNotFound("至少需要两个快照")
+        base_id = _snapshots[0][0] if base is None else base
+        target_id = _snapshots[-1][0] if target is None else target
+    base_item = get_snapshot(base_id)
+    target_item = get_snapshot(target_id)
+    stats = target_item[4].compare_to(base_item[4], key_type)
+    return {
+        "base": base_id,
+        "target": target_id,
+        "seconds": round(target_item[2] - base_item[2], 1),
+        "size_diff": sum(stat.size_diff for stat in stats),
+        "top": [
+            {
+                "location": str(stat.traceback[0]) if stat.traceback else "?",
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in stats[: limit or get_config()["TOP"]]
+        ],
+    }
+
+
+def stop():
+    """停止 tracemalloc 并丢弃所有快照"""
+    with _lock:
+        _snapshots.clear()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
@@ -0,0 +1,286 @@
+"""
+上游调用指标
+
+upstream.fetch() 按逻辑接口记录延迟直方图、状态码/错误计数、应答字节数和进行中的请求数。
+热路径上不加锁：每个线程写自己的分片（Shard），抓取时再把各线程的分片加起来；
+已退出线程的分片在抓取时、以及新分片注册使分片数翻倍时并入 retired 后丢弃，
+没有抓取、线程频繁创建也不会无限增长。
+
+render() 输出 Prometheus 文本格式，由 /metrics 返回；除上游接口外还包括缓存命中、预取、
+舱壁、镜像和大模型客户端已有的统计。
+"""
+
+import bisect
+import threading
+
+from django.conf import settings
+
+DEFAULTS = {
+    # 非空时 /metrics 需要带上 Authorization: Bearer <TOKEN>
+    "TOKEN": "",
+}
+
+# 延迟直方图的桶上界（秒）
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 分片数达到该值时清理已退出线程的分片，之后的阈值为清理后分片数的两倍
+SWEEP_MIN_SHARDS = 64
+
+_local = threading.local()
+_shards = []
+_retired = None
+_next_sweep = SWEEP_MIN_SHARDS
+_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "METRICS", {}))
+    return config
+
+
+class Shard:
+    """一个线程的计数，只由该线程写入"""
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        # (指标, 标签...) -> 值
+        self.counters = {}
+        # 接口 -> [各桶计数..., 超出最后一个桶的计数, 总耗时]
+        self.histograms = {}
+
+    def add(self, key, value=1):
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, api, seconds):
+        histogram = self.histograms.get(api)
+        if histogram is None:
+            histogram = self.histograms[api] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+    def merge(self, other):
+        # dict()/list() 复制在持有 GIL 时完成，不会读到写了一半的数据
+        for key, value in dict(other.counters).items():
+            self.add(key, value)
+        for api, histogram in dict(other.histograms).items():
+            mine = self.histograms.setdefault(api, [0] * (len(BUCKETS) + 1) + [0.0])
+            for i, value in enumerate(list(histogram)):
+                mine[i] += value
+
+
+def shard():
+    global _next_sweep
+    current = getattr(_local, "shard", None)
+    if current is None:
+        current = _local.shard = Shard(threading.current_thread())
+        with _lock:
+            _shards.append(current)
+            if len(_shards) >= _next_sweep:
+                retire_dead()
+                _next_sweep = max(SWEEP_MIN_SHARDS, len(_shards) * 2)
+    return current
+
+
+def retire_dead():
+    """把已退出线程的分片并入 retired（调用方持有 _lock）"""
+    global _retired
+    if _retired is None:
+        _retired = Shard()
+    alive = []
+    for item in _shards:
+        if item.thread.is_alive():
+            alive.append(item)
+        else:
+            _retired.merge(item)
+    _shards[:] = alive
+
+
+def request_started(api):
+    shard().add(("started", api))
+
+
+def request_finished(api, status, seconds, size):
+    """一次上游请求结束；status 为 HTTP 状态码或 timeout、error 等错误类别"""
+    current = shard()
+    current.add(("finished", api))
+    current.add(("requests", api, str(status)))
+    current.add(("bytes", api), size)
+    current.observe(api, seconds)
+
+
+def rejected(api, reason):
+    """请求没有发出：舱壁已满（overloaded）或全部镜像熔断（circuit_open）"""
+    shard().add(("requests", api, reason))
+
+
+def collect():
+    """各线程分片之和"""
+    total = Shard()
+    with _lock:
+        retire_dead()
+        alive = list(_shards)
+        total.merge(_retired)
+    for item in alive:
+        total.merge(item)
+    return total
+
+
+def reset():
+    """清空所有计数（测试时使用）"""
+    global _retired
+    with _lock:
+        for item in _shards:
+            item.counters.clear()
+            item.histograms.clear()
+        _retired = None
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class Writer:
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help, samples):
+        """samples: [(标签字典, 值)]，没有样本时不输出"""
+        if not samples:
+            return
+        self.lines.append(f"# HELP {name} {help}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.sample(name, labels, value)
+
+    def sample(self, name, labels, value):
+        if value is None:
+            return
+        if labels:
+            text = ",".join(f'{key}="{escape(val)}"' for key, val in labels.items())
+            self.lines.append(f"{name}{{{text}}} {format_value(value)}")
+        else:
+            self.lines.append(f"{name} {format_value(value)}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_upstream(writer):
+    data = collect()
+    counters = sorted(data.counters.items())
+    writer.metric(
+        "upstream_requests_total", "counter", "上游请求数，按接口和状态码/错误类别",
+        [({"api": key[1], "status": key[2]}, value) for key, value in counters if key[0] == "requests"],
+    )
+    writer.metric(
+        "upstream_response_bytes_total", "counter", "上游应答字节数",
+        [({"api": key[1]}, value) for key, value in counters if key[0] == "bytes"],
+    )
+    started = {key[1]: value for key, value in counters if key[0] == "started"}
+    finished = {key[1]: value for key, value in counters if key[0] == "finished"}
+    writer.metric(
+        "upstream_in_flight", "gauge", "正在进行的上游请求数",
+        [({"api": api}, count - finished.get(api, 0)) for api, count in sorted(started.items())],
+    )
+
+    name = "upstream_request_duration_seconds"
+    if data.histograms:
+        writer.lines.append(f"# HELP {name} 上游请求耗时")
+        writer.lines.append(f"# TYPE {name} histogram")
+    for api, histogram in sorted(data.histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), histogram[:-1]):
+            cumulative += count
+            writer.sample(f"{name}_bucket", {"api": api, "le": bound}, cumulative)
+        writer.sample(f"{name}_sum", {"api": api}, float(histogram[-1]))
+        writer.sample(f"{name}_count", {"api": api}, cumulative)
+
+
+def render_hosts(writer):
+    from . import upstream
+
+    hosts = sorted(upstream.stats().items())
+    for field, kind, help in (
+        ("in_flight", "gauge", "舱壁中正在进行的请求数"),
+        ("waiting", "gauge", "舱壁中排队的请求数"),
+        ("rejected", "counter", "舱壁拒绝的请求数"),
+    ):
+        writer.metric(
+            f"upstream_bulkhead_{field}" + ("_total" if kind == "counter" else ""), kind, help,
+            [({"host": host}, data["bulkhead"][field]) for host, data in hosts if data["bulkhead"]],
+        )
+    mirrors = [(host, mirror) for host, data in hosts for mirror in data["mirrors"]]
+    writer.metric(
+        "upstream_mirror_latency_seconds", "gauge", "镜像的 EWMA 延迟",
+        [
+            ({"host": host, "mirror": mirror["url"]}, mirror["latency_ms"] / 1000)
+            for host, mirror in mirrors if mirror["latency_ms"] is not None
+        ],
+    )
+    writer.metric(
+        "upstream_mirror_open", "gauge", "镜像是否处于熔断状态",
+        [({"host": host, "mirror": mirror["url"]}, int(mirror["open"])) for host, mirror in mirrors],
+    )
+
+
+def render_caches(writer):
+    from . import cache, prefetch
+
+    caches = sorted(cache.stats().items())
+    writer.metric(
+        "search_cache_events_total", "counter", "缓存事件数（命中、未命中、回源、返回旧数据等）",
+        [
+            ({"cache": name, "event": field}, data[field])
+            for name, data in caches for field in cache.STAT_FIELDS
+        ],
+    )
+    ratios = []
+    for name, data in caches:
+        hits = data["local_hits"] + data["shared_hits"]
+        total = hits + data["misses"]
+        if total:
+            ratios.append(({"cache": name}, hits / total))
+    writer.metric("search_cache_hit_ratio", "gauge", "缓存命中率", ratios)
+    writer.metric(
+        "search_cache_local_entries", "gauge", "进程内 LRU 条目数",
+        [({"cache": name}, data["local_entries"]) for name, data in caches],
+    )
+
+    prefetchers = sorted(prefetch.stats().items())
+    writer.metric(
+        "prefetch_events_total", "counter", "预取事件数",
+        [
+            ({"prefetcher": name, "event": field}, data[field])
+            for name, data in prefetchers for field in prefetch.STAT_FIELDS
+        ],
+    )
+    writer.metric(
+        "prefetch_pending", "gauge", "排队中的预取任务数",
+        [({"prefetcher": name}, data["pending"]) for name, data in prefetchers],
+    )
+
+
+def render_llm(writer):
+    from . import llm
+
+    data = llm.get_client().stats()
+    for field in ("calls", "failures", "retries", "rejected", "prompt_tokens", "completion_tokens"):
+        writer.metric(f"llm_{field}_total", "counter", f"大模型客户端 {field}", [({}, data[field])])
+    writer.metric("llm_in_flight", "gauge", "正在进行的大模型调用数", [({}, data["in_flight"])])
+    writer.metric("llm_latency_seconds_total", "counter", "大模型调用总耗时", [({}, data["latency_total"])])
+
+
+def render():
+    writer = Writer()
+    render_upstream(writer)
+    render_hosts(writer)
+    render_caches(writer)
+    render_llm(writer)
+    return writer.text()
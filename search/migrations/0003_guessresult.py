@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('search', '0002_delete_searchhistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GuessResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('songs', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField()),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='guess_result', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '猜你喜欢结果',
+                'verbose_name_plural': '猜你喜欢结果',
+                'db_table': 'guess_result',
+            },
+        ),
+    ]
@@ -2,3 +2,20 @@ from django.db import models
 from django.conf import settings
 
 # Create your models here.
+
+
+class GuessResult(models.Model):
+    """预计算的"猜你喜欢"结果"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='guess_result'
+    )
+    songs = models.JSONField(default=list)  # 格式化后的歌曲列表，与接口返回的 data 一致
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'guess_result'
+        verbose_name = '猜你喜欢结果'
+        verbose_name_plural = '猜你喜欢结果'
+
+    def __str__(self):
+        return f"{self.user_id} - {self.computed_at}"
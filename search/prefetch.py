@@ -0,0 +1,172 @@
+"""
+后台预取
+
+在用户真正请求之前把数据拉进缓存：歌手页之后预取该歌手的主要专辑，播放时预热播放队列中
+后面几首歌的直链和歌词。预取在有界线程池中执行，排队数量有上限，超出时直接放弃；
+上游调用使用 PREFETCH 优先级，舱壁繁忙时立即让路给用户请求。
+
+每个 Prefetcher 统计预取了多少条、之后有多少条真的被用户请求到（hits），用来判断预取是否划算。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .cache import LocalLRU
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    # 歌手页之后预取的专辑数
+    "ARTIST_ALBUMS": 3,
+    # 播放时预热队列中后面的歌曲数
+    "QUEUE_AHEAD": 3,
+    "MAX_WORKERS": 2,
+    "MAX_PENDING": 64,
+    # 记录多少个已预取的 key 用于统计命中
+    "TRACKED_KEYS": 4096,
+}
+
+STAT_FIELDS = ("enqueued", "skipped", "dropped", "completed", "failed", "hits")
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PREFETCH", {}))
+    return config
+
+
+class Prefetcher:
+    def __init__(self, name, max_workers=None, max_pending=None):
+        config = get_config()
+        self.name = name
+        self.max_workers = max_workers or config["MAX_WORKERS"]
+        self.max_pending = max_pending or config["MAX_PENDING"]
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._prefetched = LocalLRU(config["TRACKED_KEYS"])
+        self._stats = dict.fromkeys(STAT_FIELDS, 0)
+        with _registry_lock:
+            _registry[name] = self
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"prefetch-{self.name}"
+                )
+            return self._executor
+
+    def submit(self, cache, key, loader):
+        """在后台调用 cache.fetch(key, loader)；已缓存、已在排队或队列已满时返回 None"""
+        if cache.peek(key) is not None:
+            self._count("skipped")
+            return None
+        cache_key = cache.make_key(key)
+        with self._lock:
+            if cache_key in self._pending:
+                self._stats["skipped"] += 1
+                return None
+            if len(self._pending) >= self.max_pending:
+                self._stats["dropped"] += 1
+                return None
+            self._pending.add(cache_key)
+            self._stats["enqueued"] += 1
+
+        def run():
+            try:
+                value, _ = cache.fetch(key, loader)
+            except Exception as e:
+                self._count("failed")
+                logger.debug("预取失败 %s %r: %s", self.name, key, e)
+            else:
+                if value is not None:
+                    self._prefetched.set(cache_key, True)
+                self._count("completed")
+            finally:
+                with self._lock:
+                    self._pending.discard(cache_key)
+
+        return self._get_executor().submit(run)
+
+    def record_use(self, cache, key):
+        """用户请求了 key，若是预取来的则计一次命中"""
+        cache_key = cache.make_key(key)
+        if self._prefetched.get(cache_key) is not None:
+            self._prefetched.delete(cache_key)
+            self._count("hits")
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["pending"] = len(self._pending)
+        data["hit_rate"] = data["hits"] / data["completed"] if data["completed"] else 0.0
+        return data
+
+    def drain(self, timeout=None):
+        """等待排队和进行中的预取结束，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def reset(self):
+        with self._lock:
+            self._stats = dict.fromkeys(STAT_FIELDS, 0)
+        self._prefetched.clear()
+
+    def sizes(self):
+        """内存占用相关的大小：排队 key 数、记录的已预取 key 数、线程池队列长度和线程数"""
+        with self._lock:
+            executor = self._executor
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "tracked_keys": len(self._prefetched),
+            "executor_queue": executor._work_queue.qsize() if executor is not None else 0,
+            "workers": len(executor._threads) if executor is not None else 0,
+        }
+
+
+def registered():
+    """名称 -> Prefetcher"""
+    with _registry_lock:
+        return dict(_registry)
+
+
+def stats():
+    """各预取器的统计"""
+    with _registry_lock:
+        prefetchers = dict(_registry)
+    return {name: prefetcher.stats() for name, prefetcher in prefetchers.items()}
+
+
+def drain(timeout=None):
+    """等待所有预取器的任务结束（压测切换配置前使用）"""
+    with _registry_lock:
+        prefetchers = list(_registry.values())
+    return all([prefetcher.drain(timeout) for prefetcher in prefetchers])
+
+
+def reset():
+    """清空统计和命中记录（测试时使用）"""
+    with _registry_lock:
+        prefetchers = list(_registry.values())
+    for prefetcher in prefetchers:
+        prefetcher.reset()
@@ -0,0 +1,248 @@
+"""
+采样分析器（线上 worker 用，管理员手动开启）
+
+Session 在后台线程里每隔 INTERVAL 秒用 sys._current_frames() 抓一次调用栈，持续 seconds 秒后自动停止：
+- 不指定 route 时采样本进程除自己外的所有线程；
+- 指定 route（正则）时只采样 ProfilingMiddleware 按 rate 抽中的匹配请求所在的线程
+  （请求提交到线程池的任务不在其中）。
+每次采样后按本次耗时调整下次的等待时间，保证采样线程占用的时间不超过 MAX_OVERHEAD。
+
+结果是折叠栈（collapsed stack，每行 "外层;...;内层 次数"，可直接交给 flamegraph.pl 或 speedscope）
+和按函数统计的 top 列表，结束后写入 OUTPUT_DIR。每个进程同时只有一个 Session；
+多 worker 部署时只分析处理开启请求的那个 worker，结果里带 pid。
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+DEFAULTS = {
+    "ENABLED": False,
+    # 采样间隔（秒）
+    "INTERVAL": 0.01,
+    # 单次最长持续时间（秒）
+    "MAX_SECONDS": 120,
+    # 采样线程占用时间的上限比例
+    "MAX_OVERHEAD": 0.02,
+    "MAX_DEPTH": 64,
+    # 非空时把折叠栈写入该目录
+    "OUTPUT_DIR": "",
+}
+
+_lock = threading.Lock()
+_session = None
+_last = None
+# 代码对象 -> 栈帧名称
+_labels = {}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PROFILING", {}))
+    return config
+
+
+def frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+class Session:
+    def __init__(self, seconds, interval, max_overhead, max_depth, route=None, rate=1.0, output_dir=""):
+        self.seconds = seconds
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.max_depth = max_depth
+        self.route = re.compile(route) if route else None
+        self.rate = rate
+        self.output_dir = output_dir
+        self.stacks = Counter()
+        self.samples = 0
+        # 因开销上限而延长等待的次数
+        self.throttled = 0
+        self.busy = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self.output_path = None
+        # route 模式下正在采样的请求线程
+        self.threads = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def matches(self, path):
+        return self.route is not None and self.route.search(path) is not None and random.random() < self.rate
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self.finished_at is None
+
+    def run(self):
+        deadline = time.monotonic() + self.seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                started = time.perf_counter()
+                self.sample()
+                cost = time.perf_counter() - started
+                self.busy += cost
+                # 等待时间至少要让 cost / (cost + wait) 不超过 max_overhead
+                wait = cost * (1 - self.max_overhead) / self.max_overhead
+                if wait > self.interval:
+                    self.throttled += 1
+                self._stop.wait(max(wait, self.interval))
+        finally:
+            self.finished_at = time.time()
+            self.write()
+            finish(self)
+
+    def sample(self):
+        own = threading.get_ident()
+        threads = self.threads if self.route is not None else None
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (threads is not None and ident not in threads):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+            self.samples += 1
+
+    def snapshot(self):
+        # 采样线程可能正在写入，dict() 复制在持有 GIL 时完成
+        return Counter(dict(self.stacks))
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.snapshot().most_common())
+
+    def top(self, limit=20):
+        """按自身采样数排序的函数，inclusive 为出现在栈中任意位置的采样数"""
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.snapshot().items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+        total = sum(own.values()) or 1
+        return [
+            {
+                "function": label,
+                "self": count,
+                "self_percent": round(count * 100 / total, 1),
+                "inclusive": inclusive[label],
+                "inclusive_percent": round(inclusive[label] * 100 / total, 1),
+            }
+            for label, count in own.most_common(limit)
+        ]
+
+    def summary(self, limit=20):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "route": self.route.pattern if self.route is not None else None,
+            "rate": self.rate,
+            "seconds": self.seconds,
+            "interval_ms": self.interval * 1000,
+            "elapsed": round(elapsed, 3),
+            "samples": self.samples,
+            "throttled": self.throttled,
+            "overhead": round(self.busy / elapsed, 4) if elapsed > 0 else 0,
+            "output": self.output_path,
+            "top": self.top(limit),
+        }
+
+    def write(self):
+        if not self.output_dir:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        self.output_path = os.path.join(self.output_dir, f"profile-{name}-{os.getpid()}.collapsed")
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+
+
+def start(seconds, interval=None, route=None, rate=1.0):
+    """开始一次采样，已有进行中的采样时抛出 ProfilerBusy"""
+    global _session
+    config = get_config()
+    session = Session(
+        seconds=min(seconds, config["MAX_SECONDS"]),
+        interval=interval or config["INTERVAL"],
+        max_overhead=config["MAX_OVERHEAD"],
+        max_depth=config["MAX_DEPTH"],
+        route=route,
+        rate=rate,
+        output_dir=config["OUTPUT_DIR"],
+    )
+    with _lock:
+        if _session is not None:
+            raise ProfilerBusy("已有进行中的采样")
+        _session = session
+    session.start()
+    return session
+
+
+def finish(session):
+    global _session, _last
+    with _lock:
+        if _session is session:
+            _session = None
+        _last = session
+
+
+def current():
+    """进行中的采样，没有时返回最近一次结束的采样"""
+    return _session or _last
+
+
+def stop():
+    session = _session
+    if session is not None:
+        session.stop()
+    return session
+
+
+class ProfilingMiddleware:
+    """route 模式下把抽中的请求线程加入采样"""
+
+    def __init__(self, get_response):
+        if not get_config()["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = _session
+        if session is None or not session.matches(request.path):
+            return self.get_response(request)
+        ident = threading.get_ident()
+        session.threads.add(ident)
+        try:
+            return self.get_response(request)
+        finally:
+            session.threads.discard(ident)
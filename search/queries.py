@@ -0,0 +1,122 @@
+"""
+SQL 查询检查（开发、测试用）
+
+capture() 在当前线程的数据库连接上记录执行的 SQL。shape() 把 IN 列表和字面量归一化，
+得到查询形状。同一形状在一个请求里重复 N_PLUS_ONE_THRESHOLD 次以上，通常说明是逐行查询（N+1）。
+
+- QueryInspectorMiddleware：settings.QUERY_INSPECTOR["ENABLED"] 为真时检查每个请求，
+  发现 N+1 记警告日志，RAISE 为真时抛出 NPlusOneError。
+- QueryBudgetMixin：测试中用 assertQueryBudget(上限) 声明接口的查询数预算，超出预算或出现 N+1 时失败。
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "N_PLUS_ONE_THRESHOLD": 5,
+    "RAISE": False,
+}
+
+_IN_LIST = re.compile(r"\bIN \((?:%s|\?|[^()]*?)(?:, (?:%s|\?|[^(),]*?))*\)", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "QUERY_INSPECTOR", {}))
+    return config
+
+
+def shape(sql):
+    """去掉参数差异后的查询形状"""
+    sql = _STRING.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def record(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """重复 threshold 次及以上的查询形状，[(形状, 次数)]，次数多的在前"""
+        counts = Counter(shape(sql) for sql in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+    def describe(self):
+        return "\n".join(f"{i}. {sql}" for i, sql in enumerate(self.queries, 1))
+
+
+@contextmanager
+def capture():
+    """记录当前线程各数据库连接上执行的 SQL"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log.record))
+        yield log
+
+
+def describe_repeated(repeated):
+    return "; ".join(f"{count} 次: {sql[:200]}" for sql, count in repeated)
+
+
+class QueryInspectorMiddleware:
+    def __init__(self, get_response):
+        config = get_config()
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = config["N_PLUS_ONE_THRESHOLD"]
+        self.raise_error = config["RAISE"]
+
+    def __call__(self, request):
+        with capture() as log:
+            response = self.get_response(request)
+        repeated = log.repeated(self.threshold)
+        if repeated:
+            message = f"可能的 N+1 查询 {request.method} {request.path}（共 {len(log)} 条）: {describe_repeated(repeated)}"
+            if self.raise_error:
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class QueryBudgetMixin:
+    """TestCase 混入：with self.assertQueryBudget(5): ..."""
+
+    n_plus_one_threshold = DEFAULTS["N_PLUS_ONE_THRESHOLD"]
+
+    @contextmanager
+    def assertQueryBudget(self, budget, name=""):
+        with capture() as log:
+            yield log
+        label = f"{name} " if name else ""
+        repeated = log.repeated(self.n_plus_one_threshold)
+        if repeated:
+            self.fail(f"{label}出现 N+1 查询: {describe_repeated(repeated)}\n{log.describe()}")
+        if len(log) > budget:
+            self.fail(f"{label}执行了 {len(log)} 条查询，超出预算 {budget}\n{log.describe()}")
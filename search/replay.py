@@ -0,0 +1,223 @@
+"""
+上游应答录制与回放
+
+录制：settings.UPSTREAM_REPLAY["RECORD_DIR"]（环境变量 UPSTREAM_RECORD_DIR）非空时，
+upstream.fetch() 和大模型客户端每次成功调用后，把参数、应答和耗时追加到
+RECORD_DIR/<接口名>.jsonl，大模型的接口名为 chat。
+
+回放：python manage.py replay_upstream --fixtures <目录> 启动本地服务，按录制的参数返回应答，
+并按配置的延迟分布等待后再返回。把 NETSTART_MIRRORS、ALGER_MIRRORS、LLM_API_URL 指向它，
+就可以离线、可重复地压测整个搜索和推荐链路。
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "RECORD_DIR": "",
+}
+
+# 大模型 chat/completions 在录制文件中的接口名
+CHAT = "chat"
+
+_record_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "UPSTREAM_REPLAY", {}))
+    return config
+
+
+def make_key(params):
+    """参数的规范形式；回放时参数来自查询字符串，所以值统一转成字符串"""
+    return json.dumps(
+        {str(name): str(value) for name, value in (params or {}).items()},
+        ensure_ascii=False, sort_keys=True,
+    )
+
+
+def record(api, params, response, latency):
+    """追加一条录制记录，未开启录制时什么也不做，写入失败只记日志"""
+    directory = get_config()["RECORD_DIR"]
+    if not directory:
+        return
+    line = json.dumps(
+        {"params": params or {}, "response": response, "latency_ms": round(latency * 1000, 1)},
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    try:
+        with _record_lock:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"{api}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        logger.exception("写入录制文件失败: %s", api)
+
+
+class LatencyModel:
+    """
+    回放延迟分布，spec 形如：
+    fixed:50 / uniform:20,120 / lognormal:80,0.5（中位数毫秒, sigma）/ recorded（录制时的耗时）
+    """
+
+    KINDS = ("fixed", "uniform", "lognormal", "recorded")
+
+    def __init__(self, spec):
+        kind, _, args = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {spec}")
+        try:
+            self.args = [float(arg) for arg in args.split(",")] if args else []
+        except ValueError:
+            raise ValueError(f"延迟分布参数无效: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "recorded": 0}[kind]
+        if len(self.args) != expected:
+            raise ValueError(f"延迟分布参数个数不对: {spec}")
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self, rng, recorded_ms):
+        """返回等待时间（秒）"""
+        if self.kind == "fixed":
+            ms = self.args[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.args)
+        elif self.kind == "lognormal":
+            median, sigma = self.args
+            ms = rng.lognormvariate(math.log(median), sigma) if median > 0 else 0
+        else:
+            ms = recorded_ms or 0
+        return max(ms, 0) / 1000
+
+
+class FixtureSet:
+    """录制目录中的所有应答，按 (接口名, 参数) 查找；directory 为空时没有任何应答"""
+
+    def __init__(self, directory=None):
+        self.fixtures = {}
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        for name in sorted(os.listdir(directory)) if directory else ():
+            if not name.endswith(".jsonl"):
+                continue
+            by_key = {}
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        # 同一参数录到多次时保留最后一次
+                        by_key[make_key(item["params"])] = item
+            self.fixtures[name[: -len(".jsonl")]] = by_key
+
+    def __len__(self):
+        return sum(len(by_key) for by_key in self.fixtures.values())
+
+    def lookup(self, api, params):
+        """
+        返回录制的记录；参数没有录到时按参数哈希确定性地挑一条同接口的记录，
+        保证压测时换关键词也有应答。该接口一条都没有时返回 None
+        """
+        by_key = self.fixtures.get(api)
+        if not by_key:
+            return None
+        key = make_key(params)
+        item = by_key.get(key)
+        with self._lock:
+            self.stats["hits" if item is not None else "misses"] += 1
+        if item is None:
+            keys = sorted(by_key)
+            item = by_key[keys[stable_hash(key) % len(keys)]]
+        return item
+
+
+def stable_hash(text):
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    回放服务：GET /<上游主机><接口路径>（与 upstream.APIS 一致，如 /netstart/cloudsearch）
+    以及 POST /chat/completions（大模型）
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, fixtures, latency, default_latency="recorded", seed=0):
+        from .upstream import APIS
+
+        super().__init__(address, ReplayHandler)
+        self.fixtures = fixtures
+        self.routes = {f"/{host}{path}": api for api, (host, path, _) in APIS.items()}
+        self.routes["/chat/completions"] = CHAT
+        self.latency = {api: LatencyModel(spec) for api, spec in (latency or {}).items()}
+        self.default_latency = LatencyModel(default_latency)
+        self.seed = seed
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def delay(self, api, params, recorded_ms):
+        """
+        同一请求第 n 次到达时的延迟只取决于 (seed, 接口, 参数, n)，
+        与并发下请求到达的先后无关，重复压测时延迟序列一致
+        """
+        key = make_key(params)
+        with self._lock:
+            count = self._counts.get((api, key), 0)
+            self._counts[(api, key)] = count + 1
+        rng = random.Random(stable_hash(f"{self.seed}|{api}|{key}|{count}"))
+        model = self.latency.get(api, self.default_latency)
+        return model.sample(rng, recorded_ms)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "UpstreamReplay"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.replay(self.server.routes.get(url.path), dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        api = self.server.routes.get(urlsplit(self.path).path)
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            params = {"prompt": payload["messages"][-1]["content"]}
+        except (ValueError, KeyError, IndexError, TypeError):
+            self.send_json(400, {"code": 400, "message": "请求体无效"})
+            return
+        self.replay(api, params)
+
+    def replay(self, api, params):
+        if api is None:
+            self.send_json(404, {"code": 404, "message": "未知的接口"})
+            return
+        item = self.server.fixtures.lookup(api, params)
+        if item is None:
+            self.send_json(404, {"code": 404, "message": f"没有录制的应答: {api}"})
+            return
+        time.sleep(self.server.delay(api, params, item.get("latency_ms")))
+        self.send_json(200, item["response"])
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from music.models import Favorite
+from .models import GuessResult
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_guess_result(sender, instance, **kwargs):
+    """收藏变化后丢弃该用户的预计算结果，下次请求时重新计算"""
+    GuessResult.objects.filter(user_id=instance.user_id).delete()
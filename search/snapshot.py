@@ -0,0 +1,155 @@
+"""
+进程内缓存快照
+
+重启后进程内 LRU 是空的，所有请求都要回源。这里把搜索、歌词、歌曲 URL 等命名空间的 LRU
+定期写入磁盘（zlib 压缩的 JSON），正常退出（atexit、SIGTERM）时再写一次，
+启动时批量载入，跳过已过期的条目。
+
+由 wsgi.py 调用 start()，只在实际提供服务的进程中启用；未配置 SNAPSHOT_PATH 时不做任何事。
+"""
+
+import atexit
+import json
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+import zlib
+
+from . import cache as search_cache
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+_started = False
+_lock = threading.Lock()
+
+
+def collect(namespaces):
+    """收集各命名空间 LRU 中尚未过期的条目"""
+    now = time.time()
+    caches = search_cache.registered()
+    data = {}
+    for namespace in namespaces:
+        cache = caches.get(namespace)
+        if cache is None:
+            continue
+        entries = [
+            [cache_key, search_cache.entry_value(entry), entry["expires_at"], entry["delta"]]
+            for cache_key, entry in cache.local.items()
+            if entry["expires_at"] > now
+        ]
+        if entries:
+            data[namespace] = entries
+    return data
+
+
+def save(path, namespaces):
+    """写入快照，返回写入的条目数；没有可写的条目时保留旧文件"""
+    data = collect(namespaces)
+    count = sum(len(entries) for entries in data.values())
+    if not count:
+        return 0
+    payload = json.dumps(
+        {"version": FORMAT_VERSION, "saved_at": time.time(), "namespaces": data},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with _lock:
+        # 先写临时文件再替换，避免进程中途退出留下不完整的快照
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(payload, 6))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return count
+
+
+def load(path, namespaces):
+    """载入快照中未过期的条目，返回载入的条目数"""
+    try:
+        with open(path, "rb") as f:
+            payload = json.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError, zlib.error) as e:
+        logger.warning("缓存快照无法读取，已忽略: %s", e)
+        return 0
+    if payload.get("version") != FORMAT_VERSION:
+        return 0
+
+    now = time.time()
+    caches = search_cache.registered()
+    count = 0
+    for namespace, entries in payload["namespaces"].items():
+        cache = caches.get(namespace)
+        if cache is None or namespace not in namespaces:
+            continue
+        for cache_key, value, expires_at, delta in entries:
+            if expires_at > now:
+                cache.local.set(cache_key, search_cache.make_entry(value, expires_at, delta))
+                count += 1
+    return count
+
+
+def _save_quietly(path, namespaces):
+    try:
+        save(path, namespaces)
+    except Exception:
+        logger.exception("写入缓存快照失败")
+
+
+def _run_periodically(path, namespaces, interval):
+    while True:
+        time.sleep(interval)
+        _save_quietly(path, namespaces)
+
+
+def _install_sigterm_handler(path, namespaces):
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        _save_quietly(path, namespaces)
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+def start():
+    """载入快照，并注册定期保存和退出时保存"""
+    global _started
+    config = search_cache.get_config()
+    path = config.get("SNAPSHOT_PATH")
+    if not path or _started:
+        return
+    _started = True
+    # 注册各命名空间的缓存
+    from . import views  # noqa: F401
+
+    namespaces = config["SNAPSHOT_NAMESPACES"]
+    count = load(path, namespaces)
+    logger.info("已从缓存快照载入 %s 条记录", count)
+
+    atexit.register(_save_quietly, path, namespaces)
+    if threading.current_thread() is threading.main_thread():
+        _install_sigterm_handler(path, namespaces)
+    else:
+        # 例如开启自动重载的 runserver 在子线程中加载 WSGI 应用；SIGTERM 退出时不会保存，只能依赖定期保存
+        logger.warning("不在主线程中，无法注册 SIGTERM 处理，退出时不会保存缓存快照")
+    if config["SNAPSHOT_INTERVAL"]:
+        threading.Thread(
+            target=_run_periodically,
+            args=(path, namespaces, config["SNAPSHOT_INTERVAL"]),
+            name="cache-snapshot",
+            daemon=True,
+        ).start()
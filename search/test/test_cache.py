@@ -0,0 +1,255 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch, Mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from search import cache as search_cache, snapshot, upstream
+from search.cache import LocalLRU, TwoTierCache
+from search.views import SearchByTitleView, SearchBySongView
+
+
+class LocalLRUTest(TestCase):
+    """进程内 LRU 测试"""
+
+    def test_evicts_least_recently_used(self):
+        """超出容量时淘汰最久未使用的条目"""
+        lru = LocalLRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+
+
+class TwoTierCacheTest(TestCase):
+    """两级缓存测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        self.cache = TwoTierCache('test')
+
+    def test_fresh_entry_skips_loader(self):
+        """未过期时不调用上游"""
+        loader = Mock(return_value=['a'])
+        self.assertEqual(self.cache.fetch('k', loader), (['a'], False))
+        self.assertEqual(self.cache.fetch('k', loader), (['a'], False))
+        loader.assert_called_once()
+
+    @override_settings(SEARCH_CACHE={'TTL': {'test': 0}})
+    def test_stale_served_on_error(self):
+        """过期后刷新失败，返回旧数据并标记"""
+        self.cache.fetch('k', lambda: ['a'])
+        loader = Mock(side_effect=upstream.UpstreamError('API调用失败'))
+        self.assertEqual(self.cache.fetch('k', loader), (['a'], True))
+        loader.assert_called_once()
+
+    @override_settings(SEARCH_CACHE={'TTL': {'test': 0}})
+    def test_stale_served_on_failed_answer(self):
+        """上游应答失败（loader 返回 None）时返回旧数据"""
+        self.cache.fetch('k', lambda: ['a'])
+        self.assertEqual(self.cache.fetch('k', lambda: None), (['a'], True))
+
+    def test_error_without_stale_raises(self):
+        """没有旧数据时抛出异常"""
+        with self.assertRaises(upstream.UpstreamError):
+            self.cache.fetch('k', Mock(side_effect=upstream.UpstreamError('x')))
+
+    @override_settings(SEARCH_CACHE={'NEGATIVE_TTL': 0, 'TTL': {'test': 600}})
+    def test_empty_result_uses_negative_ttl(self):
+        """空结果只按 NEGATIVE_TTL 缓存"""
+        self.cache.fetch('k', lambda: [])
+        loader = Mock(return_value=['a'])
+        self.assertEqual(self.cache.fetch('k', loader), (['a'], False))
+        loader.assert_called_once()
+
+    def test_local_tier_serves_without_shared(self):
+        """共享后端被清空后，本进程 LRU 仍可命中"""
+        self.cache.fetch('k', lambda: ['a'])
+        cache.clear()
+        self.assertEqual(self.cache.fetch('k', Mock()), (['a'], False))
+        self.assertEqual(self.cache.stats()['local_hits'], 1)
+
+    def test_shared_tier_fills_local(self):
+        """本进程未命中时读取共享后端（其他进程写入的数据）"""
+        other_worker = TwoTierCache('test')
+        other_worker.fetch('k', lambda: ['a'])
+        self.cache.local.clear()
+
+        self.assertEqual(self.cache.fetch('k', Mock()), (['a'], False))
+        self.assertEqual(len(self.cache.local), 1)
+
+    def test_single_flight(self):
+        """同一个 key 并发未命中时只回源一次"""
+        calls = []
+        started = threading.Event()
+
+        def loader():
+            calls.append(1)
+            started.set()
+            time.sleep(0.05)
+            return ['a']
+
+        threads = [threading.Thread(target=self.cache.fetch, args=('k', loader)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(SEARCH_CACHE={'EARLY_EXPIRY_BETA': 1e9})
+    def test_early_refresh_before_expiry(self):
+        """刷新耗时较长的条目会在过期前被提前刷新"""
+        self.cache.set('k', ['old'], delta=1)
+        value, stale = self.cache.fetch('k', lambda: ['new'])
+        self.assertEqual(value, ['new'])
+        self.assertFalse(stale)
+        self.assertEqual(self.cache.stats()['early_refreshes'], 1)
+
+    @override_settings(SEARCH_CACHE={'EARLY_EXPIRY_BETA': 1e9})
+    def test_failed_early_refresh_not_stale(self):
+        """提前刷新失败时返回的仍是未过期数据，不标记为旧数据"""
+        self.cache.set('k', ['old'], delta=1)
+        value, stale = self.cache.fetch('k', Mock(side_effect=upstream.UpstreamError('x')))
+        self.assertEqual(value, ['old'])
+        self.assertFalse(stale)
+        self.assertEqual(self.cache.stats()['stale_served'], 0)
+
+
+class InvalidationTest(TestCase):
+    """跨进程失效测试，两个 TwoTierCache 实例模拟两个进程"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        self.worker_a = TwoTierCache('test')
+        self.worker_b = TwoTierCache('test')
+        self.worker_a.fetch('k', lambda: ['old'])
+        self.worker_b.fetch('k', Mock())
+
+    def test_delete_reaches_other_worker_after_poll(self):
+        """其他进程的删除在下一次检查日志后生效，其余 key 不受影响"""
+        self.worker_b.fetch('other', lambda: ['x'])
+        self.worker_a.delete('k')
+
+        # 检查间隔内仍读取本进程 LRU
+        self.assertEqual(self.worker_b.fetch('k', Mock())[0], ['old'])
+
+        self.worker_b.sync(force=True)
+        self.assertEqual(self.worker_b.fetch('k', lambda: ['new'])[0], ['new'])
+        self.assertEqual(self.worker_b.fetch('other', Mock())[0], ['x'])
+        self.assertEqual(self.worker_b.stats()['invalidations'], 1)
+        self.assertEqual(self.worker_b.stats()['local_flushes'], 0)
+
+    def test_missing_log_flushes_local(self):
+        """日志已丢失时清空本进程 LRU"""
+        self.worker_b.sync(force=True)
+        self.worker_a.delete('k')
+        cache.delete(self.worker_a.event_key(1))
+
+        self.worker_b.sync(force=True)
+        self.assertEqual(len(self.worker_b.local), 0)
+        self.assertEqual(self.worker_b.stats()['local_flushes'], 1)
+
+
+@override_settings(SEARCH_CACHE={'TTL': {'search_song': 0, 'song_url': 0, 'lyric': 0}})
+class StaleResponseTest(TestCase):
+    """接口返回旧数据测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        upstream.reset()
+
+    @patch.object(SearchByTitleView, 'keyword_api')
+    def test_title_search_marks_stale(self, mock_api):
+        """上游出错时返回旧的搜索结果，并带上 stale 标记"""
+        mock_api.return_value = {'code': 200, 'result': {'songs': [{'name': '晴天', 'id': 1}]}}
+        mock_request = Mock()
+        mock_request.GET.get.return_value = '晴天'
+        first = SearchByTitleView().get(mock_request)
+        self.assertNotIn('stale', first.data)
+
+        mock_api.side_effect = upstream.CircuitOpen('上游服务暂不可用: netstart')
+        response = SearchByTitleView().get(mock_request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['stale'])
+        self.assertEqual(response.data['data'][0]['name'], '晴天')
+
+    @patch.object(SearchBySongView, 'lyric_api')
+    @patch.object(SearchBySongView, 'song_api')
+    def test_song_served_stale_when_overloaded(self, mock_song_api, mock_lyric_api):
+        """舱壁拒绝时播放请求也能返回旧数据"""
+        mock_song_api.return_value = {'data': {'url': 'http://music.mp3'}}
+        mock_lyric_api.return_value = {'lrc': {'lyric': '[00:00]歌词'}}
+        mock_request = Mock()
+        mock_request.GET.get.return_value = '789'
+        SearchBySongView().get(mock_request)
+
+        mock_song_api.side_effect = upstream.UpstreamOverloaded('上游服务繁忙: alger')
+        response = SearchBySongView().get(mock_request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['stale'])
+        self.assertEqual(response.data['data']['url'], 'http://music.mp3')
+
+
+class SnapshotTest(TestCase):
+    """缓存快照测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        self.cache = TwoTierCache('snapshot_test')
+        self.path = os.path.join(tempfile.mkdtemp(), 'snapshot.bin')
+
+    def test_round_trip_skips_expired(self):
+        """快照只保留未过期的条目，重启后载入本进程 LRU"""
+        self.cache.set('fresh', ['a'])
+        self.cache.set('expired', ['b'])
+        expired_key = self.cache.make_key('expired')
+        entry = dict(self.cache.local.get(expired_key), expires_at=time.time() - 1)
+        self.cache.local.set(expired_key, entry)
+
+        self.assertEqual(snapshot.save(self.path, ['snapshot_test']), 1)
+
+        # 模拟重启：本进程和共享后端都是空的
+        search_cache.reset()
+        cache.clear()
+        self.assertEqual(snapshot.load(self.path, ['snapshot_test']), 1)
+        self.assertEqual(self.cache.fetch('fresh', Mock()), (['a'], False))
+
+    def test_empty_cache_keeps_previous_snapshot(self):
+        """没有可保存的条目时不覆盖已有快照"""
+        self.cache.set('fresh', ['a'])
+        snapshot.save(self.path, ['snapshot_test'])
+        search_cache.reset()
+
+        self.assertEqual(snapshot.save(self.path, ['snapshot_test']), 0)
+        self.assertEqual(snapshot.load(self.path, ['snapshot_test']), 1)
+
+    def test_corrupt_snapshot_ignored(self):
+        """快照损坏时忽略"""
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot')
+        with self.assertLogs('search.snapshot', 'WARNING'):
+            self.assertEqual(snapshot.load(self.path, ['snapshot_test']), 0)
+
+    @patch('search.snapshot.atexit.register')
+    @patch('search.snapshot._started', False)
+    def test_warns_when_not_on_main_thread(self, mock_register):
+        """不在主线程启动时无法注册 SIGTERM 处理，记录警告"""
+        config = {'SNAPSHOT_PATH': self.path, 'SNAPSHOT_INTERVAL': 0}
+        with override_settings(SEARCH_CACHE=config), self.assertLogs('search.snapshot', 'WARNING') as logs:
+            thread = threading.Thread(target=snapshot.start)
+            thread.start()
+            thread.join()
+        self.assertIn('SIGTERM', logs.output[-1])
+        mock_register.assert_called_once()
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from search import cache as search_cache, codec
+from search.cache import TwoTierCache
+from search.views import format_song
+
+
+def make_song(i):
+    return format_song({
+        "name": f"歌曲{i}",
+        "id": i,
+        "ar": [{"id": 1, "name": "歌手", "alias": ["别名"]}] * (i % 3),
+        "al": {"id": 2, "name": None, "picUrl": "https://example.com/a.jpg"},
+    })
+
+
+class CodecTest(SimpleTestCase):
+    """紧凑编码测试"""
+
+    def test_round_trip(self):
+        """各种结构编码后都能还原"""
+        values = [
+            [make_song(i) for i in range(20)],
+            {"artist": {"id": 1, "alias": []}, "songs": [make_song(i) for i in range(3)]},
+            [{"a": 1}, {"b": 2}, 3],
+            [{"a": [1, "x"]}, {"a": []}],
+            [{}, {}],
+            {"lyric": "歌词" * 5000},
+        ]
+        for value in values:
+            with self.subTest(value=repr(value)[:40]):
+                self.assertEqual(codec.unpack(codec.pack(value)), value)
+                self.assertEqual(codec.unpack(codec.pack(value, compress_min_bytes=0)), value)
+
+    def test_smaller_than_pickle(self):
+        """结构相同的字典列表编码后小于直接 pickle"""
+        import pickle
+
+        songs = [make_song(i) for i in range(100)]
+        packed = codec.pack(songs, compress_min_bytes=None)
+        self.assertLess(len(packed), len(pickle.dumps(songs, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def test_rejects_foreign_data(self):
+        with self.assertRaises(ValueError):
+            codec.unpack(b"xyz")
+
+
+class PackedCacheTest(TestCase):
+    """缓存透明编解码测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        self.cache = TwoTierCache('codec_test')
+
+    def test_values_stored_packed(self):
+        songs = [make_song(i) for i in range(10)]
+        self.cache.set('k', songs)
+        self.assertIn('packed', cache.get(self.cache.make_key('k')))
+        self.assertEqual(self.cache.fetch('k', None), (songs, False))
+
+    def test_reads_return_fresh_objects(self):
+        """调用方修改返回值不会影响缓存"""
+        self.cache.set('k', [make_song(1)])
+        value, _ = self.cache.fetch('k', None)
+        value[0]['name'] = 'changed'
+        self.assertEqual(self.cache.fetch('k', None)[0][0]['name'], '歌曲1')
@@ -0,0 +1,131 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from search import covers
+from user.models import User
+
+COVER = 'https://p1.music.126.net/abc/cover.jpg'
+
+
+def image_bytes(width=600, height=400, fmt='PNG', mode='RGBA'):
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def cdn_response(body=b'', status_code=200, location=None):
+    response = MagicMock(status_code=status_code, is_redirect=location is not None, headers={'Location': location})
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [body[i:i + 1000] for i in range(0, len(body), 1000)]
+    return response
+
+
+class CoverProxyTest(TestCase):
+    """封面缩略图代理测试"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        covers.cache.reset()
+        # 清空限流记录
+        cache.clear()
+        patcher = patch('search.covers.session.get', return_value=cdn_response(image_bytes()))
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url=COVER, **params):
+        headers = params.pop('headers', {})
+        return self.client.get('/api/search/cover/', dict(params, url=url), **headers)
+
+    def test_variants_from_one_download(self):
+        response = self.get(size=100, headers={'HTTP_ACCEPT': 'image/avif,image/webp,*/*'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (128, 85))
+
+        response = self.get(size=300, format='jpeg')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (300, 200))
+        self.assertEqual(self.get(size=20).status_code, 200)
+        self.assertEqual(self.mock_get.call_count, 1)
+
+    def test_not_modified(self):
+        tag = self.get()['ETag']
+        response = self.get(headers={'HTTP_IF_NONE_MATCH': tag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_host_allowlist(self):
+        self.assertEqual(self.get(url='http://127.0.0.1/admin.png').status_code, 403)
+        self.assertEqual(self.get(url='file:///etc/passwd').status_code, 403)
+        self.mock_get.return_value = cdn_response(status_code=302, location='http://10.0.0.1/x.jpg')
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.mock_get.call_count, 1)
+
+    @override_settings(COVER_PROXY={'MAX_SOURCE_BYTES': 1000})
+    def test_source_too_large(self):
+        self.assertEqual(self.get().status_code, 502)
+
+    def test_evicts_least_recently_used(self):
+        self.get()
+        with override_settings(COVER_PROXY={'MAX_CACHE_BYTES': 1}):
+            self.get(url='https://p2.music.126.net/other.jpg')
+        self.assertFalse(os.path.exists(covers.cache.directory(COVER)))
+        self.assertTrue(os.path.exists(covers.cache.directory('https://p2.music.126.net/other.jpg')))
+
+    def test_failure_cached(self):
+        """下载失败的 url 在 FAILURE_TTL 内不再重复下载"""
+        self.mock_get.return_value = cdn_response(status_code=500)
+        self.assertEqual(self.get().status_code, 502)
+        self.assertEqual(self.get(size=300).status_code, 502)
+        self.assertEqual(self.mock_get.call_count, 1)
+
+        self.mock_get.return_value = cdn_response(image_bytes())
+        with patch('search.covers.time.time', return_value=covers.time.time() + 301):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_busy_when_renders_exhausted(self):
+        """同时生成的数量达到上限时返回 503，不记为失败"""
+        with patch.object(covers.cache, '_renders', MagicMock(**{'acquire.return_value': False})):
+            self.assertEqual(self.get().status_code, 503)
+        self.mock_get.assert_not_called()
+        self.assertEqual(self.get().status_code, 200)
+
+    @patch('rest_framework.throttling.ScopedRateThrottle.THROTTLE_RATES', {'cover': '1/min'})
+    def test_misses_throttled(self):
+        """需要生成的请求受限流，命中缓存的不受限制"""
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get(size=300).status_code, 200)
+        response = self.get(url='https://p2.music.126.net/other.jpg')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @patch('rest_framework.throttling.ScopedRateThrottle.THROTTLE_RATES', {'cover': '1/min'})
+    def test_bearer_token_throttled_per_user(self):
+        """带 JWT 的请求按用户限流，与同一 IP 的其他用户和匿名请求互不影响；令牌无效时按匿名处理"""
+        tokens = []
+        for name in ('alice', 'bob'):
+            user = User.objects.create_user(
+                email=f'{name}@example.com', username=f'{name}@example.com', password='Test123456', nickname=name
+            )
+            tokens.append({'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'})
+
+        self.assertEqual(self.get(size=20, headers=tokens[0]).status_code, 200)
+        self.assertEqual(self.get(url='https://p2.music.126.net/a.jpg', headers=tokens[0]).status_code, 429)
+        self.assertEqual(self.get(url='https://p2.music.126.net/b.jpg', headers=tokens[1]).status_code, 200)
+        self.assertEqual(self.get(url='https://p2.music.126.net/c.jpg').status_code, 200)
+        invalid = {'HTTP_AUTHORIZATION': 'Bearer invalid'}
+        self.assertEqual(self.get(url='https://p2.music.126.net/d.jpg', headers=invalid).status_code, 429)
@@ -0,0 +1,111 @@
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from music.models import Favorite
+from search import cache as search_cache, entities, upstream
+from search.views import SearchByArtistSongView
+
+ARTIST_RESPONSE = {
+    'code': 200,
+    'artist': {'id': 10, 'name': '周杰伦', 'picUrl': 'http://a.jpg', 'briefDesc': '简介'},
+    'hotSongs': [
+        {'id': 1, 'name': '晴天', 'ar': [{'id': 10, 'name': '周杰伦'}], 'al': {'id': 20, 'name': '叶惠美', 'picUrl': 'http://c.jpg'}},
+    ],
+}
+
+ALBUM_RESPONSE = {
+    'code': 200,
+    'album': {'id': 20, 'name': '叶惠美', 'company': '杰威尔', 'artist': {'id': 10, 'name': '周杰伦'}},
+    'songs': ARTIST_RESPONSE['hotSongs'],
+}
+
+
+class EntityStoreTest(TestCase):
+    """上游实体存储测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        entities.store.clear_local()
+        upstream.reset()
+
+    def test_search_results_feed_songs(self):
+        """搜索结果和新歌中的歌曲写入实体存储"""
+        entities.ingest('cloudsearch', {}, {'code': 200, 'result': {'songs': ARTIST_RESPONSE['hotSongs']}})
+        entities.ingest('newsong', {}, {'code': 200, 'result': [{'song': {
+            'id': 2, 'name': '七里香', 'artists': [{'id': 10, 'name': '周杰伦'}], 'album': {'id': 21, 'name': '七里香'},
+        }}]})
+        self.assertEqual(entities.store.get(entities.SONG, 1)['al']['picUrl'], 'http://c.jpg')
+        self.assertEqual(entities.store.get(entities.SONG, 2)['ar'], [{'id': 10, 'name': '周杰伦'}])
+
+    def test_merge_keeps_known_fields(self):
+        """后来的应答缺少某个字段时保留已有的值"""
+        entities.store.merge_many(entities.SONG, [{'id': 1, 'name': '晴天'}])
+        entities.store.merge_many(entities.SONG, [{'id': 1, 'name': None, 'al': {'id': 20}}])
+        self.assertEqual(entities.store.get(entities.SONG, 1), {'id': 1, 'name': '晴天', 'al': {'id': 20}})
+
+    def test_shared_across_workers(self):
+        """其他进程写入的实体从共享后端读到"""
+        entities.ingest('album', {'id': 20}, ALBUM_RESPONSE)
+        entities.store.clear_local()
+        self.assertEqual(entities.store.get(entities.SONG, 1)['name'], '晴天')
+
+    @patch('search.upstream.session.get')
+    def test_pages_always_fetched(self, mock_get):
+        """歌手页不由实体拼出：热门歌曲列表只有歌手接口会返回"""
+        mock_get.return_value = Mock(status_code=200, content=b'{}', json=Mock(return_value=ARTIST_RESPONSE))
+        upstream.fetch('artists', {'id': 10})
+
+        artist = SearchByArtistSongView().load_artist('10')
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(artist['artist']['briefDesc'], '简介')
+        self.assertEqual([song['name'] for song in artist['songs']], ['晴天'])
+
+
+class FavoriteEnrichmentTest(TestCase):
+    """收藏信息补全测试"""
+
+    def setUp(self):
+        cache.clear()
+        search_cache.reset()
+        entities.store.clear_local()
+        entities.ingest('artists', {'id': 10}, ARTIST_RESPONSE)
+        self.user = get_user_model().objects.create_user(
+            email='fav@example.com', password='Test123456', nickname='fav'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_toggle_fills_missing_fields(self):
+        """收藏时客户端只给了歌名，其余信息从实体补全"""
+        response = self.client.post('/api/music/favorites/toggle/', {'song_id': 1, 'song_name': '晴天'})
+        self.assertEqual(response.status_code, 200)
+
+        favorite = Favorite.objects.get(user=self.user, song_id=1)
+        self.assertEqual(favorite.pic_url, 'http://c.jpg')
+        self.assertEqual(favorite.artist_name, '周杰伦')
+        self.assertEqual(favorite.album_id, 20)
+
+    def test_client_values_not_overwritten(self):
+        fields = entities.favorite_fields({'song_id': 1, 'pic_url': 'http://mine.jpg', 'artist_name': '我'})
+        self.assertNotIn('pic_url', fields)
+        self.assertNotIn('artist_name', fields)
+        self.assertEqual(fields['album_name'], '叶惠美')
+
+    def test_list_reads_entities_once(self):
+        """收藏列表一次批量读取所有歌曲实体"""
+        Favorite.objects.create(user=self.user, song_id=1, song_name='晴天')
+        Favorite.objects.create(user=self.user, song_id=2, song_name='七里香')
+        entities.store.clear_local()
+
+        with patch.object(entities.store, 'get_many', wraps=entities.store.get_many) as mock_get_many:
+            response = self.client.get('/api/music/favorites/')
+
+        mock_get_many.assert_called_once()
+        favorites = {item['song_id']: item for item in response.data}
+        self.assertEqual(favorites[1]['pic_url'], 'http://c.jpg')
+        self.assertEqual(favorites[2]['song_name'], '七里香')
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch, Mock
+
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APITestCase
+
+from music.models import Favorite
+from search.models import GuessResult
+from search.views import SearchGuess
+from user.models import User
+
+
+class SearchGuessPrecomputeTest(APITestCase):
+    """猜你喜欢预计算测试"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='guess@example.com', username='guess@example.com',
+            password='Test123456', nickname='guess'
+        )
+        Favorite.objects.create(user=self.user, song_id=1, song_name='晴天')
+        self.view = SearchGuess()
+
+    def make_request(self):
+        mock_request = Mock()
+        mock_request.user = self.user
+        return mock_request
+
+    @patch('search.views.get_song_by_guess')
+    def test_fresh_result_served_without_llm(self, mock_llm):
+        """存在未过期结果时直接读取，不调用AI"""
+        GuessResult.objects.create(
+            user=self.user, songs=[{'name': '七里香', 'id': 2}], computed_at=timezone.now()
+        )
+
+        response = self.view.get(self.make_request())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], [{'name': '七里香', 'id': 2}])
+        mock_llm.assert_not_called()
+
+    @patch.object(SearchGuess, 'fetch_song_info')
+    @patch('search.views.get_song_by_guess')
+    def test_stale_result_falls_back_to_live(self, mock_llm, mock_fetch):
+        """结果过期时实时计算并写回"""
+        GuessResult.objects.create(
+            user=self.user, songs=[], computed_at=timezone.now() - timedelta(days=30)
+        )
+        mock_llm.return_value = ['稻香']
+        mock_fetch.return_value = [{'name': '稻香', 'id': 3}]
+
+        response = self.view.get(self.make_request())
+
+        self.assertEqual(response.data['data'], [{'name': '稻香', 'id': 3}])
+        stored = GuessResult.objects.get(user=self.user)
+        self.assertEqual(stored.songs, [{'name': '稻香', 'id': 3}])
+        self.assertGreater(stored.computed_at, timezone.now() - timedelta(minutes=1))
+
+    @patch.object(SearchGuess, 'fetch_song_info')
+    @patch('search.views.get_song_by_guess')
+    def test_empty_result_keeps_previous(self, mock_llm, mock_fetch):
+        """所有歌曲都查询失败时不覆盖原有结果"""
+        computed_at = timezone.now() - timedelta(hours=20)
+        GuessResult.objects.create(
+            user=self.user, songs=[{'name': '七里香', 'id': 2}], computed_at=computed_at
+        )
+        mock_llm.return_value = ['稻香']
+        mock_fetch.return_value = None
+
+        self.assertEqual(self.view.compute(self.user), [])
+
+        stored = GuessResult.objects.get(user=self.user)
+        self.assertEqual(stored.songs, [{'name': '七里香', 'id': 2}])
+        self.assertEqual(stored.computed_at, computed_at)
+
+    @patch('search.views.LLMBudgetThrottle.allow_request', return_value=False)
+    @patch.object(SearchGuess, 'compute')
+    def test_live_fallback_takes_llm_budget(self, mock_compute, mock_budget):
+        """没有预计算结果时需要占用全局大模型预算，预算耗尽返回 429"""
+        with self.assertRaises(Throttled):
+            self.view.get(self.make_request())
+
+        mock_budget.assert_called_once()
+        mock_compute.assert_not_called()
+
+    def test_favorite_change_invalidates_result(self):
+        """收藏变化后预计算结果被清除"""
+        GuessResult.objects.create(user=self.user, songs=[], computed_at=timezone.now())
+
+        Favorite.objects.create(user=self.user, song_id=2, song_name='七里香')
+
+        self.assertFalse(GuessResult.objects.filter(user=self.user).exists())
+
+    @patch.object(SearchGuess, 'compute')
+    def test_command_computes_active_users(self, mock_compute):
+        """管理命令只计算活跃且没有新结果的用户"""
+        idle = User.objects.create_user(
+            email='idle@example.com', username='idle@example.com',
+            password='Test123456', nickname='idle'
+        )
+        Favorite.objects.filter(user=self.user).update(created_at=timezone.now())
+        Favorite.objects.create(user=idle, song_id=1, song_name='晴天')
+        Favorite.objects.filter(user=idle).update(created_at=timezone.now() - timedelta(days=60))
+
+        out = StringIO()
+        call_command('precompute_guess', '--llm-concurrency', '1', stdout=out)
+
+        computed = [call.args[0].pk for call in mock_compute.call_args_list]
+        self.assertEqual(computed, [self.user.pk])
+        self.assertIn('成功 1', out.getvalue())
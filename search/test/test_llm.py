@@ -0,0 +1,99 @@
+from unittest.mock import patch, Mock
+
+import requests
+from django.test import TestCase
+
+from search import llm
+from search.views import get_song_names_from_deepseek, get_song_by_guess
+
+
+def make_config(**overrides):
+    config = dict(llm.DEFAULTS)
+    config.update({"API_KEY": "test-key", "BACKOFF_BASE": 0, "BACKOFF_MAX": 0})
+    config.update(overrides)
+    return config
+
+
+def make_response(status_code=200, content="晴天\n七里香"):
+    response = Mock()
+    response.status_code = status_code
+    response.json.return_value = {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+    }
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+class LLMClientTest(TestCase):
+    """大模型客户端测试"""
+
+    def test_complete_success_records_usage(self):
+        """调用成功时统计 token 和次数"""
+        client = llm.LLMClient(make_config())
+        with patch.object(client.provider.session, 'post', return_value=make_response()) as mock_post:
+            text = client.complete("prompt")
+
+        self.assertEqual(text, "晴天\n七里香")
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], llm.DEFAULTS['TIMEOUT'])
+        stats = client.stats()
+        self.assertEqual(stats['calls'], 1)
+        self.assertEqual(stats['prompt_tokens'], 10)
+        self.assertEqual(stats['completion_tokens'], 5)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_retry_on_server_error(self):
+        """5xx 时重试，之后成功"""
+        client = llm.LLMClient(make_config(MAX_RETRIES=2))
+        responses = [make_response(503), make_response()]
+        with patch.object(client.provider.session, 'post', side_effect=responses) as mock_post:
+            text = client.complete("prompt")
+
+        self.assertEqual(text, "晴天\n七里香")
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(client.stats()['retries'], 1)
+
+    def test_no_retry_on_client_error(self):
+        """4xx（非429）不重试"""
+        client = llm.LLMClient(make_config(MAX_RETRIES=2))
+        with patch.object(client.provider.session, 'post', return_value=make_response(401)) as mock_post:
+            with self.assertRaises(requests.HTTPError):
+                client.complete("prompt")
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(client.stats()['failures'], 1)
+
+    def test_in_flight_limit(self):
+        """并发已满时等待超时后拒绝"""
+        client = llm.LLMClient(make_config(MAX_IN_FLIGHT=1, ACQUIRE_TIMEOUT=0.01))
+        client._slots.acquire()
+        with self.assertRaises(llm.LLMBusyError):
+            client.complete("prompt")
+        self.assertEqual(client.stats()['rejected'], 1)
+
+    def test_fake_provider_is_deterministic(self):
+        """本地替身对相同 prompt 返回相同结果"""
+        client = llm.LLMClient(make_config(PROVIDER="fake"))
+        self.assertEqual(client.complete("安静的夜晚"), client.complete("安静的夜晚"))
+
+
+class RecommendSongNamesTest(TestCase):
+    """AI 推荐函数测试"""
+
+    def setUp(self):
+        llm.reset_client()
+
+    def tearDown(self):
+        llm.reset_client()
+
+    def test_recommend_functions_use_fake_provider(self):
+        """推荐函数通过统一客户端调用，并按数量上限截断"""
+        with self.settings(LLM_CLIENT={"PROVIDER": "fake"}):
+            llm.reset_client()
+            names = get_song_names_from_deepseek("安静的夜晚")
+            guess = get_song_by_guess("晴天、七里香")
+
+        self.assertEqual(len(names), len(set(names)))
+        self.assertLessEqual(len(names), 20)
+        self.assertLessEqual(len(guess), 10)
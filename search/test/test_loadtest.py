@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from search import loadtest, upstream
+
+
+class SummarizeTest(SimpleTestCase):
+    """压测统计测试"""
+
+    def test_percentiles(self):
+        result = loadtest.summarize([i / 1000 for i in range(100, 0, -1)], Counter({200: 99, 500: 1}), 2.0)
+        self.assertEqual(result['requests'], 100)
+        self.assertEqual(result['errors'], 1)
+        self.assertEqual(result['throughput_rps'], 50.0)
+        self.assertEqual((result['p50_ms'], result['p95_ms'], result['p99_ms'], result['max_ms']), (50, 95, 99, 100))
+
+    def test_empty(self):
+        self.assertIsNone(loadtest.summarize([], Counter(), 0)['p50_ms'])
+
+    def test_compare(self):
+        rows = loadtest.compare(
+            {'endpoints': {'a': {'p95_ms': 15.0}, 'b': {'p95_ms': 1.0}}},
+            {'endpoints': {'a': {'p95_ms': 10.0}}},
+        )
+        self.assertEqual(rows, [('a', 10.0, 15.0, 50.0), ('b', None, 1.0, None)])
+
+
+class BenchLoadCommandTest(TransactionTestCase):
+    """压测命令测试"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_seed_and_report(self):
+        output = os.path.join(self.directory, 'result.json')
+        call_command(
+            'bench_load', '--seed', '--songs', '100', '--users', '5', '--history', '50',
+            '--only', 'music.artists', '--only', 'user.profile', '--only', 'music.playlists.destroy',
+            '--requests', '4', '--warmup', '1', '--concurrency', '1', '--output', output,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(
+            set(report['endpoints']),
+            {'music.artists.list', 'music.artists.retrieve', 'music.artists.songs', 'music.artists.albums',
+             'user.profile', 'music.playlists.destroy'},
+        )
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 4, name)
+        self.assertEqual(report['endpoints']['user.profile']['status'], {'200': 4})
+        self.assertEqual(report['endpoints']['music.playlists.destroy']['status'], {'204': 4})
+        self.assertIsNotNone(report['endpoints']['music.artists.list']['p99_ms'])
+        # 压测中新建的数据已清理，重复生成会跳过
+        self.assertFalse(loadtest.seed(100, 5, 50))
+
+    def test_default_uses_local_stand_in(self):
+        """未指定 --fixtures 和 --live 时上游指向本地回放，预取打开，search.warm 不再只测到 404"""
+        output = os.path.join(self.directory, 'result.json')
+        with patch('search.upstream.session.get', wraps=upstream.session.get) as mock_get:
+            call_command(
+                'bench_load', '--seed', '--songs', '100', '--users', '5', '--history', '50',
+                '--only', 'search.warm', '--requests', '4', '--warmup', '1',
+                '--concurrency', '1', '--output', output, stdout=StringIO(), stderr=StringIO(),
+            )
+
+        with open(output, encoding='utf-8') as f:
+            report = json.load(f)
+        self.assertEqual(report['upstream'], 'empty')
+        self.assertEqual(report['endpoints']['search.warm']['status'], {'202': 4})
+        for call in mock_get.call_args_list:
+            self.assertTrue(call.args[0].startswith('http://127.0.0.1:'), call.args[0])
+
+    def test_live_conflicts_with_fixtures(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_load', '--live', '--fixtures', self.directory, stdout=StringIO(), stderr=StringIO())
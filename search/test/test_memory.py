@@ -0,0 +1,102 @@
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from search import memory
+from search.test.test_views import reset_search_state
+from search.views import song_search_cache
+from user.models import User
+
+leaked = []
+
+
+def leak():
+    leaked.extend(f"泄漏的字符串{i}" for i in range(20000))
+
+
+class MemoryTest(TestCase):
+    """内存检查测试"""
+
+    def setUp(self):
+        reset_search_state()
+        self.addCleanup(memory.stop)
+        self.addCleanup(leaked.clear)
+
+    def test_diff_points_at_growing_line(self):
+        base = memory.take_snapshot('before')
+        leak()
+        target = memory.take_snapshot('after')
+        result = memory.diff()
+        self.assertEqual((result['base'], result['target']), (base['id'], target['id']))
+        self.assertGreater(result['size_diff'], 0)
+        self.assertIn('test_memory.py', result['top'][0]['location'])
+
+    @override_settings(MEMORY={'MAX_SNAPSHOTS': 2})
+    def test_snapshots_bounded(self):
+        ids = [memory.take_snapshot()['id'] for _ in range(3)]
+        self.assertEqual([item['id'] for item in memory.list_snapshots()], ids[1:])
+        with self.assertRaises(memory.SnapshotNotFound):
+            memory.diff(ids[0], ids[2])
+
+    def test_cache_sizes(self):
+        song_search_cache.fetch(('晴天', 3), lambda: [{'id': 1, 'name': '晴天'}])
+        data = memory.report()['structures']['caches']['search_song']
+        self.assertEqual(data['entries'], 1)
+        self.assertGreater(data['bytes'], 0)
+
+
+@override_settings(MEMORY={'ENABLED': True})
+class MemoryViewTest(TestCase):
+    """内存检查接口和命令测试"""
+
+    url = '/api/search/memory/'
+
+    def setUp(self):
+        self.addCleanup(memory.stop)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='Test123456')
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(MEMORY={'ENABLED': False})
+    def test_disabled(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_snapshot_and_diff(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get(self.url, {'diff': '1'}).status_code, 404)
+        first = self.client.post(self.url, {'label': 'a'}).data['data']['id']
+        second = self.client.post(self.url, {'label': 'b'}).data['data']['id']
+        response = self.client.get(self.url, {'diff': '1', 'base': first, 'target': second})
+        self.assertEqual(response.data['data']['target'], second)
+        report = self.client.get(self.url, {'objects': '1'}).data['data']
+        self.assertEqual([item['label'] for item in report['snapshots']], ['a', 'b'])
+        self.assertIn('dict', report['objects'])
+
+    def test_command(self):
+        """命令通过接口操作 worker"""
+        def request(session, method, url, params=None, json=None, **kwargs):
+            self.assertEqual(url, 'http://worker:8000/api/search/memory/')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=session.headers['Authorization'])
+            if method == 'post':
+                response = client.post(url, json, format='json')
+            else:
+                response = getattr(client, method)(url, params)
+            return Mock(status_code=response.status_code, json=Mock(return_value=response.data))
+
+        out = StringIO()
+        with patch('requests.Session.request', autospec=True, side_effect=request):
+            call_command(
+                'memory_snapshot', '--base-url', 'http://worker:8000', '--admin', 'admin@example.com',
+                '--count', '2', '--interval', '0', stdout=out,
+            )
+        output = out.getvalue()
+        self.assertEqual(len(memory.list_snapshots()), 2)
+        self.assertIn('search_song', output)
+        self.assertRegex(output, r'快照 \d+ -> \d+')
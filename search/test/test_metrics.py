@@ -0,0 +1,81 @@
+import threading
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import TestCase, override_settings
+
+from search import metrics, upstream
+
+
+def ok_response(body=b'{"code": 200}'):
+    return Mock(status_code=200, content=body, json=Mock(return_value={'code': 200}))
+
+
+class UpstreamMetricsTest(TestCase):
+    """上游调用指标测试"""
+
+    def setUp(self):
+        upstream.reset()
+        metrics.reset()
+
+    @patch('search.upstream.session.get')
+    def test_records_status_latency_and_bytes(self, mock_get):
+        mock_get.return_value = ok_response()
+        upstream.fetch('lyric', {'id': 1})
+        mock_get.side_effect = requests.Timeout('timed out')
+        with self.assertRaises(upstream.UpstreamError):
+            upstream.fetch('lyric', {'id': 2})
+
+        text = metrics.render()
+        self.assertIn('upstream_requests_total{api="lyric",status="200"} 1', text)
+        self.assertIn('upstream_requests_total{api="lyric",status="timeout"} 1', text)
+        self.assertIn('upstream_response_bytes_total{api="lyric"} 13', text)
+        self.assertIn('upstream_request_duration_seconds_count{api="lyric"} 2', text)
+        self.assertIn('upstream_request_duration_seconds_bucket{api="lyric",le="+Inf"} 2', text)
+        self.assertIn('upstream_in_flight{api="lyric"} 0', text)
+
+    def test_rejections_counted(self):
+        bulkhead = upstream.get_bulkhead('alger')
+        bulkhead.acquire = Mock(side_effect=upstream.UpstreamOverloaded('busy'))
+        with self.assertRaises(upstream.UpstreamOverloaded):
+            upstream.fetch('song_url', {'id': 1})
+        self.assertIn('upstream_requests_total{api="song_url",status="overloaded"} 1', metrics.render())
+
+    @patch('search.upstream.session.get')
+    def test_exited_threads_kept(self, mock_get):
+        """线程退出后它记录的计数仍然保留"""
+        mock_get.return_value = ok_response()
+        threads = [threading.Thread(target=upstream.fetch, args=('lyric', {'id': i})) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.collect().counters[('requests', 'lyric', '200')], 4)
+
+    def test_dead_shards_bounded_without_scrape(self):
+        """不抓取时，已退出线程的分片也会在注册新分片时清理，计数不丢失"""
+        def record():
+            metrics.rejected('lyric', 'overloaded')
+
+        for _ in range(500):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        self.assertLess(len(metrics._shards), 2 * metrics.SWEEP_MIN_SHARDS)
+        self.assertEqual(metrics.collect().counters[('requests', 'lyric', 'overloaded')], 500)
+
+
+class MetricsViewTest(TestCase):
+    """/metrics 接口测试"""
+
+    def test_prometheus_text(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE llm_calls_total counter', response.content.decode())
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from search import profiling
+from user.models import User
+
+
+def spin(seconds):
+    """占用 CPU 的函数，用来在采样结果里找到"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+    return HttpResponse()
+
+
+def finish_session():
+    session = profiling.stop()
+    if session is not None:
+        session.join(5)
+
+
+@override_settings(PROFILING={'ENABLED': True, 'INTERVAL': 0.002, 'MAX_OVERHEAD': 0.05})
+class SamplingProfilerTest(TestCase):
+    """采样分析器测试"""
+
+    def setUp(self):
+        self.addCleanup(finish_session)
+
+    def test_samples_all_threads(self):
+        worker = threading.Thread(target=spin, args=(0.3,))
+        worker.start()
+        session = profiling.start(0.3)
+        worker.join()
+        session.join(5)
+
+        self.assertFalse(session.running)
+        self.assertGreater(session.samples, 0)
+        self.assertIn('spin (test_profiling.py:', session.collapsed())
+        summary = session.summary()
+        self.assertTrue(any(item['function'].startswith('spin ') for item in summary['top']))
+        self.assertLessEqual(summary['overhead'], 0.06)
+        self.assertIs(profiling.current(), session)
+
+    def test_one_session_per_process(self):
+        profiling.start(5)
+        with self.assertRaises(profiling.ProfilerBusy):
+            profiling.start(5)
+
+    def test_route_mode_samples_matching_requests_only(self):
+        middleware = profiling.ProfilingMiddleware(lambda request: spin(0.2))
+        session = profiling.start(5, route=r'^/api/search/bydesc/')
+        factory = RequestFactory()
+        middleware(factory.get('/api/music/artists/'))
+        self.assertEqual(session.samples, 0)
+        middleware(factory.get('/api/search/bydesc/'))
+        finish_session()
+        self.assertGreater(session.samples, 0)
+        self.assertTrue(all('spin (' in stack for stack in session.stacks))
+
+
+@override_settings(PROFILING={'ENABLED': True, 'INTERVAL': 0.005})
+class ProfileViewTest(TestCase):
+    """采样分析接口测试"""
+
+    url = '/api/search/profile/'
+
+    def setUp(self):
+        self.addCleanup(finish_session)
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='Test123456')
+
+    def test_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(
+            email='user@example.com', password='Test123456', nickname='user', username='user',
+        ))
+        self.assertEqual(self.client.post(self.url, {'seconds': 1}).status_code, 403)
+
+    @override_settings(PROFILING={'ENABLED': False})
+    def test_disabled(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {'seconds': 1}).status_code, 404)
+
+    def test_start_and_stop(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(self.url, {'seconds': 0}).status_code, 400)
+        response = self.client.post(self.url, {'seconds': 30, 'route': '^/api/', 'rate': 0.5})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['data']['route'], '^/api/')
+        self.assertEqual(self.client.post(self.url, {'seconds': 30}).status_code, 409)
+
+        response = self.client.delete(self.url)
+        self.assertFalse(response.data['data']['running'])
+        self.assertEqual(self.client.get(self.url).data['data']['rate'], 0.5)
+        response = self.client.get(self.url, {'output': 'collapsed'})
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
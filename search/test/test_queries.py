@@ -0,0 +1,47 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from music.models import Artist
+from search import queries
+
+
+def per_row_view(request):
+    """逐行查询的视图"""
+    for artist in Artist.objects.all():
+        Artist.objects.filter(pk=artist.pk).exists()
+    return HttpResponse()
+
+
+class QueryShapeTest(TestCase):
+    """查询形状归一化测试"""
+
+    def test_literals_and_in_lists(self):
+        self.assertEqual(
+            queries.shape('SELECT * FROM song WHERE id IN (%s, %s, %s) AND title = \'a\'\n LIMIT 21'),
+            queries.shape("SELECT * FROM song WHERE id IN (%s) AND title = 'b' LIMIT 1"),
+        )
+
+
+@override_settings(QUERY_INSPECTOR={'ENABLED': True, 'N_PLUS_ONE_THRESHOLD': 3})
+class QueryInspectorMiddlewareTest(TestCase):
+    """N+1 检查中间件测试"""
+
+    def setUp(self):
+        Artist.objects.bulk_create([Artist(name=f'歌手{i}') for i in range(3)])
+        self.request = RequestFactory().get('/api/music/artists/')
+
+    def test_logs_repeated_shapes(self):
+        with self.assertLogs('search.queries', level='WARNING') as logs:
+            queries.QueryInspectorMiddleware(per_row_view)(self.request)
+        self.assertIn('可能的 N+1 查询 GET /api/music/artists/', logs.output[0])
+        self.assertIn('3 次', logs.output[0])
+
+    @override_settings(QUERY_INSPECTOR={'ENABLED': True, 'N_PLUS_ONE_THRESHOLD': 3, 'RAISE': True})
+    def test_raise(self):
+        with self.assertRaises(queries.NPlusOneError):
+            queries.QueryInspectorMiddleware(per_row_view)(self.request)
+
+    def test_below_threshold(self):
+        Artist.objects.first().delete()
+        with self.assertNoLogs('search.queries', level='WARNING'):
+            queries.QueryInspectorMiddleware(per_row_view)(self.request)
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from search import llm, upstream
+from search.replay import FixtureSet, LatencyModel, ReplayServer
+
+
+class ReplayTest(TestCase):
+    """上游录制与回放测试"""
+
+    def setUp(self):
+        upstream.reset()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def start_server(self, latency=None, default_latency='fixed:0'):
+        server = ReplayServer(('127.0.0.1', 0), FixtureSet(self.directory), latency, default_latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, 'http://127.0.0.1:%d' % server.server_address[1]
+
+    @patch('search.upstream.session.get')
+    def test_fetch_records_response(self, mock_get):
+        mock_get.return_value = Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200, 'lrc': {'lyric': '歌词'}}))
+        with override_settings(UPSTREAM_REPLAY={'RECORD_DIR': self.directory}):
+            upstream.fetch('lyric', {'id': 1})
+
+        with open(os.path.join(self.directory, 'lyric.jsonl'), encoding='utf-8') as f:
+            item = json.loads(f.readline())
+        self.assertEqual(item['params'], {'id': 1})
+        self.assertEqual(item['response']['lrc']['lyric'], '歌词')
+
+    def test_not_recorded_by_default(self):
+        with patch('search.upstream.session.get') as mock_get:
+            mock_get.return_value = Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200}))
+            upstream.fetch('lyric', {'id': 1})
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_replays_through_upstream(self):
+        """镜像指向回放服务后，fetch 拿到录制的应答；没录到的参数也返回同接口的某条应答"""
+        with open(os.path.join(self.directory, 'cloudsearch.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'params': {'keywords': '晴天', 'type': 1}, 'response': {'code': 200, 'k': '晴天'}}) + '\n')
+            f.write(json.dumps({'params': {'keywords': '稻香', 'type': 1}, 'response': {'code': 200, 'k': '稻香'}}) + '\n')
+        server, base = self.start_server()
+
+        with override_settings(UPSTREAMS={'netstart': {'MIRRORS': [base + '/netstart']}}):
+            self.assertEqual(upstream.fetch('cloudsearch', {'keywords': '稻香', 'type': 1})['k'], '稻香')
+            self.assertIn(upstream.fetch('cloudsearch', {'keywords': '七里香', 'type': 1})['k'], ['晴天', '稻香'])
+        self.assertEqual(server.fixtures.stats, {'hits': 1, 'misses': 1})
+
+    def test_replays_chat_completions(self):
+        completion = {'choices': [{'message': {'content': '晴天\n稻香'}}], 'usage': {'total_tokens': 5}}
+        with open(os.path.join(self.directory, 'chat.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'params': {'prompt': '推荐'}, 'response': completion}) + '\n')
+        _, base = self.start_server()
+
+        config = dict(llm.get_config(), PROVIDER='siliconflow', API_URL=base + '/chat/completions')
+        self.assertEqual(llm.LLMClient(config).complete('推荐'), '晴天\n稻香')
+
+    def test_delay_deterministic(self):
+        """相同种子下，同一请求的延迟序列与到达顺序无关"""
+        servers = [
+            ReplayServer(('127.0.0.1', 0), FixtureSet(self.directory), {}, 'lognormal:80,0.5', seed=7)
+            for _ in range(2)
+        ]
+        for server in servers:
+            self.addCleanup(server.server_close)
+        first = [servers[0].delay('lyric', {'id': 1}, None), servers[0].delay('lyric', {'id': 2}, None)]
+        second = [servers[1].delay('lyric', {'id': 2}, None), servers[1].delay('lyric', {'id': 1}, None)]
+        self.assertEqual(first, second[::-1])
+
+
+class LatencyModelTest(SimpleTestCase):
+    """回放延迟分布测试"""
+
+    def test_distributions(self):
+        rng = random.Random(0)
+        self.assertEqual(LatencyModel('fixed:50').sample(rng, None), 0.05)
+        self.assertTrue(0.02 <= LatencyModel('uniform:20,120').sample(rng, None) <= 0.12)
+        self.assertEqual(LatencyModel('recorded').sample(rng, 30), 0.03)
+        samples = sorted(LatencyModel('lognormal:80,0.5').sample(rng, None) for _ in range(2001))
+        self.assertAlmostEqual(samples[1000], 0.08, delta=0.01)
+
+    def test_invalid_spec(self):
+        for spec in ('normal:1', 'fixed', 'uniform:1', 'lognormal:a,b'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                LatencyModel(spec)
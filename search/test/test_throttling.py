@@ -0,0 +1,81 @@
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from search.throttling import AIUserThrottle, LLMBudgetThrottle, take_token
+
+
+class TokenBucketTest(TestCase):
+    """令牌桶测试"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        """桶内令牌用完后按速率补充"""
+        for _ in range(3):
+            allowed, _, _ = take_token(cache, 'bucket', 3, 1, now=100)
+            self.assertTrue(allowed)
+        allowed, _, wait = take_token(cache, 'bucket', 3, 1, now=100)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1)
+
+        allowed, _, _ = take_token(cache, 'bucket', 3, 1, now=101)
+        self.assertTrue(allowed)
+
+
+@override_settings(AI_THROTTLE={
+    'USER_BURST': 2, 'USER_RATE': 0.001, 'ANON_BURST': 1, 'ANON_RATE': 0.001,
+    'GLOBAL_BURST': 10, 'GLOBAL_RATE': 0.001, 'FAIR_THRESHOLD': 0.5, 'MAX_WAIT': 0,
+})
+class AIThrottleTest(TestCase):
+    """AI 接口限流测试"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def make_request(self, ip='1.1.1.1'):
+        return Request(self.factory.get('/', REMOTE_ADDR=ip))
+
+    def test_anonymous_limited_per_ip(self):
+        """未登录用户按 IP 限流，互不影响"""
+        self.assertTrue(AIUserThrottle().allow_request(self.make_request(), None))
+        throttle = AIUserThrottle()
+        self.assertFalse(throttle.allow_request(self.make_request(), None))
+        self.assertGreater(throttle.wait(), 0)
+        self.assertTrue(AIUserThrottle().allow_request(self.make_request('2.2.2.2'), None))
+
+    def test_heavy_user_rejected_first_when_budget_low(self):
+        """预算紧张时，近期用得多的用户先被拒绝，轻度用户仍可通过"""
+        cache.set(LLMBudgetThrottle.key, (5, time.time()))  # 剩余一半
+
+        heavy = self.make_request()
+        heavy.ai_bucket_level = 0.1
+        light = self.make_request('2.2.2.2')
+        light.ai_bucket_level = 1.0
+
+        self.assertFalse(LLMBudgetThrottle().allow_request(heavy, None))
+        self.assertTrue(LLMBudgetThrottle().allow_request(light, None))
+
+    def test_user_throttled_request_does_not_consume_budget(self):
+        """已被单用户限流的请求不占用全局预算"""
+        request = self.make_request()
+        request.ai_user_throttled = True
+        self.assertTrue(LLMBudgetThrottle().allow_request(request, None))
+        self.assertIsNone(cache.get(LLMBudgetThrottle.key))
+
+    @patch('search.views.get_song_names_from_deepseek', return_value=[])
+    def test_endpoint_returns_429(self, mock_llm):
+        """超出限额时接口返回 429"""
+        client = APIClient()
+        url = reverse('search_by_desc')
+        self.assertEqual(client.get(url, {'describe': '安静'}).status_code, 200)
+        response = client.get(url, {'describe': '安静'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
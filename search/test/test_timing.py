@@ -0,0 +1,48 @@
+from unittest.mock import Mock, patch
+
+from django.test import TestCase, override_settings
+
+from music.models import Artist
+from search.test.test_views import reset_search_state
+
+
+def parse_header(value):
+    """{名称: (耗时毫秒, 次数)}"""
+    result = {}
+    for part in value.split(', '):
+        name, *params = part.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        result[name] = (float(params['dur']), params.get('desc', '').strip('"'))
+    return result
+
+
+class ServerTimingTest(TestCase):
+    """Server-Timing 响应头测试"""
+
+    def setUp(self):
+        reset_search_state()
+
+    def test_db_serialize_render(self):
+        Artist.objects.create(name='周杰伦')
+        response = self.client.get('/api/music/artists/')
+        timings = parse_header(response['Server-Timing'])
+        self.assertEqual(timings['db'][1], '1')
+        self.assertEqual(timings['serialize'][1], '1')
+        self.assertIn('render', timings)
+        self.assertNotIn('upstream', timings)
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+
+    @patch('search.upstream.session.get')
+    def test_upstream_calls_in_worker_threads(self, mock_get):
+        """线程池中并发的上游调用也计入当前请求"""
+        mock_get.return_value = Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200, 'data': {'url': 'u'}, 'lrc': {'lyric': 'l'}}))
+        response = self.client.get('/api/search/bysong/', {'id': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(parse_header(response['Server-Timing'])['upstream'][1], '2')
+
+    @override_settings(SERVER_TIMING={'LOG_SAMPLE_RATE': 1.0})
+    def test_sampled_log(self):
+        with self.assertLogs('search.timing', level='INFO') as logs:
+            self.client.get('/api/music/artists/')
+        self.assertIn('"path": "/api/music/artists/"', logs.output[0])
+        self.assertIn('"db_count": 1', logs.output[0])
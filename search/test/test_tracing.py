@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.test import TestCase, override_settings
+
+from search import llm, tracing
+from search.test.test_views import reset_search_state
+
+
+def cloudsearch_response():
+    songs = [{'id': 1, 'name': '晴天', 'ar': [{'id': 1, 'name': '周杰伦'}], 'al': {'id': 1, 'name': '叶惠美'}}]
+    return Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200, 'result': {'songs': songs}}))
+
+
+class TracingTest(TestCase):
+    """请求追踪测试"""
+
+    def setUp(self):
+        reset_search_state()
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings = override_settings(
+            TRACING={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'JSON_DIR': self.directory},
+            LLM_CLIENT={'PROVIDER': 'fake'},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def load_trace(self, response):
+        with open(os.path.join(self.directory, f"{response['X-Trace-Id']}.json"), encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+        return {event['args']['span_id']: event for event in events}
+
+    @patch('search.upstream.session.get')
+    def test_fan_out_spans(self, mock_get):
+        """线程池中的搜索任务挂在请求的根 span 下，上游请求挂在各自的任务下"""
+        mock_get.return_value = cloudsearch_response()
+        response = self.client.get('/api/search/bydesc/', {'describe': '安静的夜晚'})
+        self.assertEqual(response.status_code, 200)
+        spans = self.load_trace(response)
+
+        by_name = {}
+        for event in spans.values():
+            by_name.setdefault(event['name'], []).append(event)
+        root = by_name['GET /api/search/bydesc/'][0]
+        self.assertIsNone(root['args']['parent_id'])
+        self.assertEqual(root['args']['http.status_code'], 200)
+        self.assertEqual(by_name['llm.complete'][0]['args']['parent_id'], root['args']['span_id'])
+
+        tasks = by_name['fetch_song_info']
+        self.assertGreater(len(tasks), 1)
+        for task in tasks:
+            self.assertEqual(task['args']['parent_id'], root['args']['span_id'])
+            self.assertNotEqual(task['tid'], root['tid'])
+        for fetch in by_name['upstream.fetch']:
+            parent = spans[fetch['args']['parent_id']]
+            self.assertIn(parent['name'], ('cache.load', 'fetch_song_info'))
+
+    def test_traceparent(self):
+        """沿用调用方的 trace id 和父 span"""
+        trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+        response = self.client.get(
+            '/api/music/artists/', HTTP_TRACEPARENT=f'00-{trace_id}-00f067aa0ba902b7-01'
+        )
+        self.assertEqual(response['X-Trace-Id'], trace_id)
+        root, = self.load_trace(response).values()
+        self.assertEqual(root['args']['parent_id'], '00f067aa0ba902b7')
+
+    def test_json_directory_bounded(self):
+        """trace 文件数超过上限时删除最旧的"""
+        exporter = tracing.JSONExporter(dict(tracing.get_config(), JSON_MAX_FILES=10))
+        traces = [tracing.Trace() for _ in range(12)]
+        for i, trace in enumerate(traces):
+            exporter.export(trace)
+            path = os.path.join(self.directory, f'{trace.trace_id}.json')
+            os.utime(path, (i, i))
+        remaining = sorted(os.listdir(self.directory))
+        # 第 11 个写入后删到 9 个，再写入一个
+        self.assertEqual(len(remaining), 10)
+        self.assertNotIn(f'{traces[0].trace_id}.json', remaining)
+        self.assertNotIn(f'{traces[1].trace_id}.json', remaining)
+        self.assertIn(f'{traces[-1].trace_id}.json', remaining)
+
+    def test_unsampled_request(self):
+        response = self.client.get(
+            '/api/music/artists/', HTTP_TRACEPARENT='00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00'
+        )
+        self.assertNotIn('X-Trace-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class OTLPTest(TestCase):
+    def test_payload(self):
+        trace = tracing.Trace()
+        root = tracing.Span(trace, 'GET /', None, {'http.method': 'GET', 'http.status_code': 200})
+        child = tracing.Span(trace, 'upstream.fetch', root.span_id, {'api': 'lyric'})
+        child.error = 'UpstreamError: timeout'
+        child.finish()
+        root.finish()
+
+        spans = tracing.to_otlp(trace, 'music')['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual([span['name'] for span in spans], ['upstream.fetch', 'GET /'])
+        self.assertEqual(spans[0]['parentSpanId'], root.span_id)
+        self.assertEqual(spans[0]['status'], {'code': 2, 'message': 'UpstreamError: timeout'})
+        self.assertNotIn('parentSpanId', spans[1])
+        self.assertIn({'key': 'http.status_code', 'value': {'intValue': '200'}}, spans[1]['attributes'])
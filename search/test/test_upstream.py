@@ -0,0 +1,191 @@
+import threading
+import time
+from unittest.mock import patch, Mock
+
+import requests
+
+from django.test import TestCase, override_settings
+
+from search import upstream
+from search.upstream import (
+    Bulkhead, CircuitBreaker, CircuitOpen, UpstreamOverloaded, CRITICAL, DISCOVERY, PREFETCH
+)
+from search.views import SearchBySongView
+
+
+class BulkheadTest(TestCase):
+    """上游舱壁测试"""
+
+    def test_discovery_rejected_when_queue_full(self):
+        """普通请求在排队已满时立即拒绝"""
+        bulkhead = Bulkhead('test', max_in_flight=2, max_queue=0, queue_timeout=1, critical_reserve=1)
+        bulkhead.acquire(DISCOVERY)
+        with self.assertRaises(UpstreamOverloaded):
+            bulkhead.acquire(DISCOVERY)
+        self.assertEqual(bulkhead.stats()['rejected'], 1)
+
+    def test_critical_uses_reserved_slot(self):
+        """关键请求可以使用预留名额"""
+        bulkhead = Bulkhead('test', max_in_flight=2, max_queue=0, queue_timeout=0, critical_reserve=1)
+        bulkhead.acquire(DISCOVERY)
+        bulkhead.acquire(CRITICAL)
+        self.assertEqual(bulkhead.stats()['in_flight'], 2)
+
+    def test_prefetch_never_queues(self):
+        """预取最多占用普通名额的一半，满了立即拒绝"""
+        bulkhead = Bulkhead('test', max_in_flight=5, max_queue=10, queue_timeout=5, critical_reserve=1)
+        bulkhead.acquire(PREFETCH)
+        bulkhead.acquire(PREFETCH)
+        with self.assertRaises(UpstreamOverloaded):
+            bulkhead.acquire(PREFETCH)
+        bulkhead.acquire(DISCOVERY)
+        self.assertEqual(bulkhead.stats()['in_flight'], 3)
+
+    def test_queued_request_admitted_after_release(self):
+        """排队的请求在名额释放后进入"""
+        bulkhead = Bulkhead('test', max_in_flight=1, max_queue=1, queue_timeout=5, critical_reserve=0)
+        bulkhead.acquire(DISCOVERY)
+        admitted = threading.Event()
+
+        def worker():
+            bulkhead.acquire(DISCOVERY)
+            admitted.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        bulkhead.release()
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+
+    def test_queue_timeout(self):
+        """排队超时后拒绝"""
+        bulkhead = Bulkhead('test', max_in_flight=1, max_queue=1, queue_timeout=0.01, critical_reserve=0)
+        bulkhead.acquire(DISCOVERY)
+        with self.assertRaises(UpstreamOverloaded):
+            bulkhead.acquire(DISCOVERY)
+
+
+class CircuitBreakerTest(TestCase):
+    """熔断测试"""
+
+    def test_opens_after_consecutive_failures(self):
+        """连续失败达到阈值后熔断，冷却后放行一次试探"""
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05)
+        breaker.on_failure()
+        breaker.before_call()
+        breaker.on_failure()
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.on_success()
+        breaker.before_call()
+
+
+class UpstreamFetchTest(TestCase):
+    """上游调用测试"""
+
+    def setUp(self):
+        upstream.reset()
+
+    @patch('search.upstream.session.get')
+    def test_fetch_releases_slot_on_error(self, mock_get):
+        """调用失败后释放名额"""
+        mock_get.side_effect = Exception('Network error')
+        with self.assertRaises(upstream.UpstreamError):
+            upstream.fetch('lyric', {'id': 1})
+        self.assertEqual(upstream.get_bulkhead('netstart').stats()['in_flight'], 0)
+
+    @patch.object(SearchBySongView, 'song_api')
+    def test_view_returns_503_when_overloaded(self, mock_api):
+        """舱壁拒绝时接口快速返回 503"""
+        mock_api.side_effect = UpstreamOverloaded('上游服务繁忙: alger')
+        mock_request = Mock()
+        mock_request.GET.get.return_value = '789'
+
+        response = SearchBySongView().get(mock_request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['code'], 503)
+
+
+MIRRORS = {'netstart': {'MIRRORS': ['https://a.example/music', 'https://b.example/music'], 'EXPLORE_RATE': 0}}
+
+
+@override_settings(UPSTREAMS=MIRRORS)
+class MirrorSelectionTest(TestCase):
+    """镜像选择与切换测试"""
+
+    def setUp(self):
+        upstream.reset()
+
+    def test_prefers_fastest_mirror(self):
+        """两个镜像都测过延迟后，优先选择更快的"""
+        slow, fast = upstream.get_mirrors('netstart')
+        slow.record(0.5, ok=True)
+        fast.record(0.1, ok=True)
+        with patch('search.upstream.session.get') as mock_get:
+            mock_get.return_value = Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200}))
+            upstream.fetch('lyric', {'id': 1})
+        self.assertEqual(mock_get.call_args[0][0], 'https://b.example/music/lyric')
+
+    @patch('search.upstream.session.get')
+    def test_fails_over_to_next_mirror(self, mock_get):
+        """第一个镜像失败时本次请求改用下一个镜像，失败的镜像延迟被拉高"""
+        mock_get.side_effect = [Exception('Network error'), Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200}))]
+        self.assertEqual(upstream.fetch('lyric', {'id': 1}), {'code': 200})
+        self.assertEqual(
+            [call[0][0] for call in mock_get.call_args_list],
+            ['https://a.example/music/lyric', 'https://b.example/music/lyric'],
+        )
+        first, second = upstream.get_mirrors('netstart')
+        self.assertGreater(first.latency, second.latency)
+
+    @patch('search.upstream.session.get')
+    def test_error_status_counts_as_failure(self, mock_get):
+        """镜像返回 5xx 时即使带 JSON 也按失败处理并切换镜像"""
+        error = requests.Response()
+        error.status_code = 502
+        error._content = b'{"code": 502}'
+        mock_get.side_effect = [error, Mock(status_code=200, content=b'{}', json=Mock(return_value={'code': 200}))]
+        self.assertEqual(upstream.fetch('lyric', {'id': 1}), {'code': 200})
+        first, second = upstream.get_mirrors('netstart')
+        self.assertEqual(first.breaker.failures, 1)
+        self.assertGreater(first.latency, second.latency)
+
+    @patch('search.upstream.session.get')
+    def test_client_error_not_counted_against_mirror(self, mock_get):
+        """id 不存在等 4xx 应答交给调用方处理，不计入熔断，也不切换镜像"""
+        missing = requests.Response()
+        missing.status_code = 404
+        missing._content = b'{"code": 404, "msg": "not found"}'
+        mock_get.return_value = missing
+        for _ in range(10):
+            self.assertEqual(upstream.fetch('album', {'id': 999999}), {'code': 404, 'msg': 'not found'})
+        self.assertEqual(mock_get.call_count, 10)
+        for mirror in upstream.get_mirrors('netstart'):
+            self.assertEqual(mirror.breaker.failures, 0)
+            self.assertFalse(mirror.breaker.is_open())
+
+    @patch('search.upstream.session.get')
+    def test_unknown_album_answers_failed(self, mock_get):
+        """上游对不存在的专辑返回 4xx 时，接口仍按应答失败返回 400"""
+        missing = requests.Response()
+        missing.status_code = 404
+        missing._content = b'{"code": 404}'
+        mock_get.return_value = missing
+        response = self.client.get('/api/search/byalbumsong/', {'id': '999999'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'failed')
+
+    def test_open_mirrors_skipped(self):
+        """所有镜像都熔断时直接失败，不再请求上游"""
+        for mirror in upstream.get_mirrors('netstart'):
+            mirror.breaker.opened_at = time.monotonic()
+        with patch('search.upstream.session.get') as mock_get:
+            with self.assertRaises(CircuitOpen):
+                upstream.fetch('lyric', {'id': 1})
+        mock_get.assert_not_called()
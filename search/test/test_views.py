@@ -1,20 +1,32 @@
 import json
+import time
 from unittest.mock import patch, Mock
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
+from search import cache as search_cache, entities, prefetch, upstream, views
 from search.views import (
     BaseSearchView, SearchByTitleView, SearchByArtistView, 
     SearchByAlbumView, AdvancedSearchView, SearchByArtistSongView,
-    SearchByAlbumSongView, SearchBySongView, SearchNewSongView
+    SearchByAlbumSongView, SearchBySongView, SearchNewSongView, ArtistPageView
 )
 
 
+def reset_search_state():
+    """清空上游缓存和熔断状态，避免测试之间互相影响"""
+    cache.clear()
+    search_cache.reset()
+    entities.store.clear_local()
+    upstream.reset()
+
+
 class BaseSearchViewTest(TestCase):
     """BaseSearchView 基础测试类"""
     
     def setUp(self):
+        reset_search_state()
         self.view = BaseSearchView()
         
     def test_get_search_params(self):
@@ -35,11 +47,11 @@ class BaseSearchViewTest(TestCase):
         result = self.view.get_search_params(mock_request)
         self.assertEqual(result, '')
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_keyword_api_success(self, mock_get):
         """测试关键词API调用成功"""
         # 模拟成功响应
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'code': 200, 'data': 'test'}
         mock_get.return_value = mock_response
         
@@ -49,7 +61,7 @@ class BaseSearchViewTest(TestCase):
         self.assertEqual(result, {'code': 200, 'data': 'test'})
         mock_get.assert_called_once()
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_keyword_api_failure(self, mock_get):
         """测试关键词API调用失败"""
         # 模拟请求异常
@@ -62,10 +74,10 @@ class BaseSearchViewTest(TestCase):
             
         self.assertIn('API调用失败', str(context.exception))
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_newsong_api_success(self, mock_get):
         """测试新歌API调用成功"""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'code': 200, 'result': []}
         mock_get.return_value = mock_response
         
@@ -74,7 +86,7 @@ class BaseSearchViewTest(TestCase):
         self.assertEqual(result, {'code': 200, 'result': []})
         mock_get.assert_called_once()
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_newsong_api_failure(self, mock_get):
         """测试新歌API调用失败"""
         mock_get.side_effect = Exception('Network error')
@@ -89,6 +101,7 @@ class SearchByTitleViewTest(APITestCase):
     """按标题搜索视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchByTitleView()
         
     @patch.object(SearchByTitleView, 'keyword_api')
@@ -165,6 +178,7 @@ class SearchByArtistViewTest(APITestCase):
     """按歌手搜索视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchByArtistView()
         
     @patch.object(SearchByArtistView, 'keyword_api')
@@ -211,6 +225,7 @@ class SearchByAlbumViewTest(APITestCase):
     """按专辑搜索视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchByAlbumView()
         
     @patch.object(SearchByAlbumView, 'keyword_api')
@@ -245,10 +260,147 @@ class SearchByAlbumViewTest(APITestCase):
         self.assertEqual(response.data['data'][0]['name'], '测试专辑')
 
 
+class SearchAllViewTest(APITestCase):
+    """综合搜索视图测试"""
+
+    def setUp(self):
+        reset_search_state()
+        self.url = reverse('search_all')
+
+    @staticmethod
+    def keyword_response(params, priority=None):
+        results = {
+            1: {'songs': [{'name': f'歌曲{i}', 'id': i} for i in range(params['limit'])]},
+            100: {'artists': [{'name': '歌手', 'id': 1}]},
+            10: {'albums': [{'name': '专辑', 'id': 2}]},
+        }
+        return {'code': 200, 'result': results[params['type']]}
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_search_all_types(self, mock_api):
+        """三种类型并发搜索，按 limit 取少量结果"""
+        mock_api.side_effect = self.keyword_response
+        response = self.client.get(self.url, {'keyword': '周杰伦', 'limit': 5})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(len(data['songs']), 5)
+        self.assertEqual(data['artists'][0]['name'], '歌手')
+        self.assertEqual(data['albums'][0]['name'], '专辑')
+        self.assertEqual(sorted(call.args[0]['limit'] for call in mock_api.call_args_list), [5, 5, 5])
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_reuses_search_page_cache(self, mock_api):
+        """搜索页已经取过 100 条时直接截取，不再回源"""
+        mock_api.side_effect = self.keyword_response
+        self.client.get(reverse('search_by_title'), {'keyword': '周杰伦'})
+        mock_api.reset_mock()
+
+        response = self.client.get(self.url, {'keyword': '周杰伦', 'limit': 3})
+        self.assertEqual([song['id'] for song in response.data['data']['songs']], [0, 1, 2])
+        self.assertEqual(sorted(call.args[0]['type'] for call in mock_api.call_args_list), [10, 100])
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_partial_failure(self, mock_api):
+        """某一类型失败时其余类型照常返回"""
+        def respond(params, priority=None):
+            if params['type'] == 10:
+                raise Exception('album api down')
+            return self.keyword_response(params)
+
+        mock_api.side_effect = respond
+        response = self.client.get(self.url, {'keyword': '周杰伦'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['albums'], [])
+        self.assertEqual(len(response.data['data']['songs']), 10)
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_all_overloaded(self, mock_api):
+        mock_api.side_effect = upstream.UpstreamOverloaded('上游服务繁忙: netstart')
+        response = self.client.get(self.url, {'keyword': '周杰伦'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_no_keyword(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+
+class PrefixReuseTest(APITestCase):
+    """增量输入时复用前缀结果测试"""
+
+    def setUp(self):
+        reset_search_state()
+        self.url = reverse('search_by_title')
+
+    @staticmethod
+    def song(name, artist):
+        return {'name': name, 'id': hash(name) % 10000, 'ar': [{'id': 1, 'name': artist}], 'al': {'name': ''}}
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_complete_prefix_filtered_locally(self, mock_api):
+        """较短前缀的结果没有被截断时，较长的关键词在本地过滤"""
+        mock_api.return_value = {'code': 200, 'result': {'songs': [
+            self.song('晴天', '周杰伦'), self.song('七里香', '周杰伦'), self.song('周末', '周杰'),
+        ]}}
+        self.client.get(self.url, {'keyword': '周杰'})
+
+        response = self.client.get(self.url, {'keyword': '周杰伦 晴'})
+        self.assertEqual([song['name'] for song in response.data['data']], ['晴天'])
+        self.assertEqual(mock_api.call_count, 1)
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_truncated_prefix_not_reused(self, mock_api):
+        """较短前缀的结果条数达到 limit（可能被截断）时照常回源"""
+        mock_api.return_value = {'code': 200, 'result': {'songs': [
+            self.song(f'晴天{i}', '周杰伦') for i in range(100)
+        ]}}
+        self.client.get(self.url, {'keyword': '周'})
+        self.client.get(self.url, {'keyword': '周杰伦'})
+        self.assertEqual(mock_api.call_count, 2)
+
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_keystrokes_single_upstream_call(self, mock_api):
+        """默认配置下逐字输入只在第一个字回源一次，之后的按键都在本地过滤"""
+        mock_api.return_value = {'code': 200, 'result': {'songs': [
+            self.song('晴天', '周杰伦'), self.song('七里香', '周杰伦'), self.song('周末', '周杰'),
+        ]}}
+        enqueued = views.prefix_refresher.stats()['enqueued']
+        for keyword in ['周', '周杰', '周杰伦', '周杰伦 ', '周杰伦 晴', '周杰伦 晴天']:
+            response = self.client.get(self.url, {'keyword': keyword})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual([song['name'] for song in response.data['data']], ['晴天'])
+        self.assertEqual(mock_api.call_count, 1)
+        self.assertEqual(views.prefix_refresher.stats()['enqueued'], enqueued)
+
+    @override_settings(SEARCH_CACHE={'PREFIX_REFRESH': True})
+    @patch.object(BaseSearchView, 'keyword_api')
+    def test_background_refresh(self, mock_api):
+        """返回前缀过滤结果后，在后台用真实关键词回源写入缓存"""
+        mock_api.return_value = {'code': 200, 'result': {'songs': [self.song('晴天', '周杰伦')]}}
+        self.client.get(self.url, {'keyword': '周杰'})
+
+        futures = []
+        submit = views.prefix_refresher.submit
+
+        def refresh(*args):
+            futures.append(submit(*args))
+            return futures[-1]
+
+        with patch.object(views.prefix_refresher, 'submit', side_effect=refresh):
+            response = self.client.get(self.url, {'keyword': '周杰伦'})
+        self.assertEqual(response.data['data'][0]['name'], '晴天')
+        futures[0].result(timeout=5)
+
+        self.assertEqual(mock_api.call_args.args[0]['keywords'], '周杰伦')
+        self.assertEqual(mock_api.call_args.args[1], upstream.PREFETCH)
+        self.assertIsNotNone(views.song_search_cache.peek(('周杰伦', 100)))
+
+
 class AdvancedSearchViewTest(TestCase):
     """高级搜索视图基础测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = AdvancedSearchView()
         
     def test_get_search_params(self):
@@ -259,10 +411,10 @@ class AdvancedSearchViewTest(TestCase):
         result = self.view.get_search_params(mock_request)
         self.assertEqual(result, '123456')
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_artist_api_success(self, mock_get):
         """测试歌手API调用成功"""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'code': 200, 'artist': {}}
         mock_get.return_value = mock_response
         
@@ -271,10 +423,10 @@ class AdvancedSearchViewTest(TestCase):
         
         self.assertEqual(result, {'code': 200, 'artist': {}})
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_album_api_success(self, mock_get):
         """测试专辑API调用成功"""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'code': 200, 'album': {}}
         mock_get.return_value = mock_response
         
@@ -283,10 +435,10 @@ class AdvancedSearchViewTest(TestCase):
         
         self.assertEqual(result, {'code': 200, 'album': {}})
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_song_api_success(self, mock_get):
         """测试歌曲API调用成功"""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'data': {'url': 'http://music.mp3'}}
         mock_get.return_value = mock_response
         
@@ -295,10 +447,10 @@ class AdvancedSearchViewTest(TestCase):
         
         self.assertEqual(result, {'data': {'url': 'http://music.mp3'}})
         
-    @patch('search.views.requests.get')
+    @patch('search.upstream.session.get')
     def test_lyric_api_success(self, mock_get):
         """测试歌词API调用成功"""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {'lrc': {'lyric': '[00:00]测试歌词'}}
         mock_get.return_value = mock_response
         
@@ -312,6 +464,7 @@ class SearchByArtistSongViewTest(APITestCase):
     """按歌手搜索歌曲视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchByArtistSongView()
         
     @patch.object(SearchByArtistSongView, 'artist_api')
@@ -363,10 +516,112 @@ class SearchByArtistSongViewTest(APITestCase):
         self.assertEqual(response.data['message'], '请输入歌手id')
 
 
+class ArtistPageViewTest(APITestCase):
+    """歌手页视图测试"""
+
+    def setUp(self):
+        reset_search_state()
+        self.url = reverse('artist_page')
+        patchers = {
+            'artist_api': {'code': 200, 'artist': {'id': 6452, 'name': '周杰伦', 'picUrl': 'http://a.jpg'},
+                           'hotSongs': [{'id': 1, 'name': '晴天', 'ar': [], 'al': {}}]},
+            'artist_detail_api': {'code': 200, 'data': {'artist': {'id': 6452, 'name': '周杰伦', 'cover': 'http://c.jpg'},
+                                                        'identify': {'imageDesc': '华语歌手'}}},
+            'artist_album_api': {'code': 200, 'hotAlbums': [{'id': 2, 'name': '叶惠美'}], 'more': True},
+        }
+        self.mocks = {}
+        for name, value in patchers.items():
+            patcher = patch.object(AdvancedSearchView, name, return_value=value)
+            self.mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_artist_page(self):
+        """三部分合并为一个响应"""
+        response = self.client.get(self.url, {'id': '6452', 'album_limit': 10})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(data['artist']['picUrl'], 'http://a.jpg')
+        self.assertEqual(data['artist']['cover'], 'http://c.jpg')
+        self.assertEqual(data['artist']['identity'], '华语歌手')
+        self.assertEqual(data['songs'][0]['name'], '晴天')
+        self.assertEqual(data['albums'][0]['name'], '叶惠美')
+        self.assertTrue(data['moreAlbums'])
+        self.mocks['artist_album_api'].assert_called_once_with({'id': '6452', 'limit': 10})
+
+    def test_parts_cached_independently(self):
+        """热门歌曲与 byartistsong/ 共用缓存，已缓存的部分不再回源"""
+        self.client.get(reverse('search_by_artist_song'), {'id': '6452'})
+        self.client.get(self.url, {'id': '6452'})
+        self.client.get(self.url, {'id': '6452'})
+
+        self.assertEqual(self.mocks['artist_api'].call_count, 1)
+        self.assertEqual(self.mocks['artist_detail_api'].call_count, 1)
+        self.assertEqual(self.mocks['artist_album_api'].call_count, 1)
+
+    def test_partial_failure(self):
+        """专辑列表失败时其余部分照常返回"""
+        self.mocks['artist_album_api'].side_effect = Exception('album api down')
+        response = self.client.get(self.url, {'id': '6452'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['albums'], [])
+        self.assertEqual(response.data['data']['artist']['name'], '周杰伦')
+
+    def test_all_parts_fail(self):
+        for mock in self.mocks.values():
+            mock.side_effect = Exception('down')
+        response = self.client.get(self.url, {'id': '6452'})
+        self.assertEqual(response.status_code, 500)
+
+
+@override_settings(PREFETCH={'ENABLED': True, 'ARTIST_ALBUMS': 1})
+class AlbumPrefetchTest(APITestCase):
+    """歌手页之后预取专辑测试"""
+
+    def setUp(self):
+        reset_search_state()
+        prefetch.reset()
+
+    def wait_for_prefetch(self):
+        deadline = time.monotonic() + 5
+        while views.album_prefetcher.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    @patch.object(AdvancedSearchView, 'album_api')
+    @patch.object(AdvancedSearchView, 'artist_api')
+    def test_top_album_prefetched(self, mock_artist_api, mock_album_api):
+        """热门歌曲中出现最多的专辑被预取，之后打开专辑不再回源并计入命中"""
+        mock_artist_api.return_value = {'code': 200, 'artist': {'id': 1}, 'hotSongs': [
+            {'id': 1, 'al': {'id': 20}}, {'id': 2, 'al': {'id': 30}}, {'id': 3, 'al': {'id': 30}},
+        ]}
+        mock_album_api.return_value = {'code': 200, 'album': {'id': 30, 'name': '专辑'}, 'songs': []}
+
+        self.client.get(reverse('search_by_artist_song'), {'id': '1'})
+        self.wait_for_prefetch()
+        mock_album_api.assert_called_once_with({'id': '30'}, upstream.PREFETCH)
+
+        response = self.client.get(reverse('search_by_album_song'), {'id': '30'})
+        self.assertEqual(response.data['data'][0]['album']['name'], '专辑')
+        self.assertEqual(mock_album_api.call_count, 1)
+        stats = views.album_prefetcher.stats()
+        self.assertEqual((stats['completed'], stats['hits']), (1, 1))
+
+    @override_settings(PREFETCH={'ENABLED': False})
+    @patch.object(AdvancedSearchView, 'album_api')
+    @patch.object(AdvancedSearchView, 'artist_api')
+    def test_disabled(self, mock_artist_api, mock_album_api):
+        mock_artist_api.return_value = {'code': 200, 'artist': {'id': 1}, 'hotSongs': [{'id': 1, 'al': {'id': 20}}]}
+        self.client.get(reverse('search_by_artist_song'), {'id': '1'})
+        self.assertEqual(views.album_prefetcher.stats()['enqueued'], 0)
+        mock_album_api.assert_not_called()
+
+
 class SearchByAlbumSongViewTest(APITestCase):
     """按专辑搜索歌曲视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchByAlbumSongView()
         
     @patch.object(SearchByAlbumSongView, 'album_api')
@@ -427,6 +682,7 @@ class SearchBySongViewTest(APITestCase):
     """按歌曲搜索视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchBySongView()
         
     @patch.object(SearchBySongView, 'lyric_api')
@@ -492,10 +748,70 @@ class SearchBySongViewTest(APITestCase):
         self.assertEqual(response.data['code'], 403)
 
 
+@override_settings(PREFETCH={'ENABLED': True, 'QUEUE_AHEAD': 2})
+class WarmQueueViewTest(APITestCase):
+    """播放队列预热测试"""
+
+    def setUp(self):
+        reset_search_state()
+        prefetch.reset()
+        self.url = reverse('warm_queue')
+
+    def wait_for_prefetch(self):
+        deadline = time.monotonic() + 5
+        while views.queue_prefetcher.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    @patch.object(AdvancedSearchView, 'lyric_api')
+    @patch.object(AdvancedSearchView, 'song_api')
+    def test_next_tracks_warmed(self, mock_song_api, mock_lyric_api):
+        """预热队列中前 QUEUE_AHEAD 首，之后播放时直接命中缓存"""
+        mock_song_api.return_value = {'data': {'url': 'http://music.mp3'}}
+        mock_lyric_api.return_value = {'lrc': {'lyric': '[00:00]歌词'}}
+
+        response = self.client.post(self.url, {'ids': [11, 12, 13]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['data'], {'ids': ['11', '12'], 'queued': 4})
+        self.wait_for_prefetch()
+        self.assertEqual(mock_song_api.call_count, 2)
+        mock_song_api.assert_any_call({'id': '11'}, upstream.PREFETCH)
+
+        response = self.client.get(reverse('search_by_song'), {'id': '11'})
+        self.assertEqual(response.data['data']['url'], 'http://music.mp3')
+        self.assertEqual(mock_song_api.call_count, 2)
+        self.assertEqual(views.queue_prefetcher.stats()['hits'], 2)
+
+    def test_invalid_body(self):
+        response = self.client.post(self.url, {'ids': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_not_allowed(self):
+        response = self.client.get(self.url, {'id': '11'})
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(PREFETCH={'ENABLED': False})
+    def test_disabled(self):
+        """未开启预取时不接受预热请求"""
+        response = self.client.post(self.url, {'ids': [11]}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    @patch('rest_framework.throttling.ScopedRateThrottle.THROTTLE_RATES', {'warm_queue': '1/min'})
+    @patch.object(AdvancedSearchView, 'lyric_api')
+    @patch.object(AdvancedSearchView, 'song_api')
+    def test_throttled(self, mock_song_api, mock_lyric_api):
+        """同一客户端请求过于频繁时返回 429"""
+        mock_song_api.return_value = {'data': {'url': 'http://music.mp3'}}
+        mock_lyric_api.return_value = {'lrc': {'lyric': '[00:00]歌词'}}
+        self.assertEqual(self.client.post(self.url, {'ids': [11]}, format='json').status_code, 202)
+        self.assertEqual(self.client.post(self.url, {'ids': [12]}, format='json').status_code, 429)
+        self.wait_for_prefetch()
+
+
 class SearchNewSongViewTest(APITestCase):
     """搜索新歌视图测试"""
     
     def setUp(self):
+        reset_search_state()
         self.view = SearchNewSongView()
         
     @patch.object(SearchNewSongView, 'newsong_api')
@@ -559,11 +875,14 @@ class SearchNewSongViewTest(APITestCase):
 class IntegrationTest(APITestCase):
     """集成测试"""
     
-    @patch('search.views.requests.get')
+    def setUp(self):
+        reset_search_state()
+        
+    @patch('search.upstream.session.get')
     def test_full_search_workflow(self, mock_get):
         """测试完整搜索工作流程"""
         # 模拟搜索歌曲的完整流程
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, content=b'{}')
         mock_response.json.return_value = {
             'code': 200,
             'result': {
@@ -614,9 +933,12 @@ class IntegrationTest(APITestCase):
 class ErrorHandlingTest(APITestCase):
     """错误处理测试"""
     
+    def setUp(self):
+        reset_search_state()
+        
     def test_network_timeout_handling(self):
         """测试网络超时处理"""
-        with patch('search.views.requests.get') as mock_get:
+        with patch('search.upstream.session.get') as mock_get:
             mock_get.side_effect = Exception('Connection timeout')
             
             view = SearchByTitleView()
@@ -631,8 +953,8 @@ class ErrorHandlingTest(APITestCase):
             
     def test_invalid_json_response_handling(self):
         """测试无效JSON响应处理"""
-        with patch('search.views.requests.get') as mock_get:
-            mock_response = Mock()
+        with patch('search.upstream.session.get') as mock_get:
+            mock_response = Mock(status_code=200, content=b'{}')
             mock_response.json.side_effect = ValueError('Invalid JSON')
             mock_get.return_value = mock_response
             
@@ -664,6 +986,9 @@ class ErrorHandlingTest(APITestCase):
 class PerformanceTest(APITestCase):
     """性能测试"""
     
+    def setUp(self):
+        reset_search_state()
+        
     @patch.object(SearchByTitleView, 'keyword_api')
     def test_large_result_set_handling(self, mock_api):
         """测试大结果集处理"""
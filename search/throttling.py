@@ -0,0 +1,144 @@
+"""
+AI 接口的令牌桶限流
+
+- AIUserThrottle：按用户（未登录按 IP）限流，令牌桶允许短时突发。
+- LLMBudgetThrottle：所有用户共享的大模型调用预算。预算接近耗尽时进入公平模式：
+  近期用得多的用户直接 429，用得少的用户可以短暂排队等待令牌。
+
+桶状态保存在 settings.AI_THROTTLE["CACHE_ALIAS"] 指定的缓存中，多进程部署时应配置为共享后端
+（memcached/redis 等）。读改写不是原子的，多进程并发下可能略微超发，对限流来说可以接受。
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    "CACHE_ALIAS": "default",
+    # 单用户：桶容量与每秒补充的令牌数
+    "USER_BURST": 5,
+    "USER_RATE": 10 / 60,
+    "ANON_BURST": 2,
+    "ANON_RATE": 3 / 60,
+    # 全局大模型预算
+    "GLOBAL_BURST": 30,
+    "GLOBAL_RATE": 1.0,
+    # 全局剩余令牌低于该比例时进入公平模式
+    "FAIR_THRESHOLD": 0.2,
+    # 公平模式下，自身桶剩余比例不低于该值的用户才允许排队
+    "FAIR_MIN_USER_LEVEL": 0.5,
+    # 排队等待全局令牌的最长时间（秒）
+    "MAX_WAIT": 2.0,
+}
+
+_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "AI_THROTTLE", {}))
+    return config
+
+
+def take_token(cache, key, capacity, rate, now=None):
+    """
+    从令牌桶取一个令牌。
+
+    返回 (是否成功, 剩余令牌数, 距离下一个令牌的秒数)
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        tokens, updated_at = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # 超过补满所需时间后，状态与新桶相同，可以过期
+        cache.set(key, (tokens, now), timeout=int(capacity / rate) + 1)
+    wait = 0 if allowed else (1 - tokens) / rate
+    return allowed, tokens, wait
+
+
+def refund_token(cache, key, capacity, rate):
+    """归还一个令牌"""
+    with _lock:
+        state = cache.get(key)
+        if state is not None:
+            tokens, updated_at = state
+            cache.set(key, (min(capacity, tokens + 1), updated_at), timeout=int(capacity / rate) + 1)
+
+
+class AIUserThrottle(BaseThrottle):
+    scope = "ai"
+
+    def __init__(self):
+        self.config = get_config()
+        self.cache = caches[self.config["CACHE_ALIAS"]]
+        self.wait_seconds = None
+
+    def get_bucket(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+            return ident, self.config["USER_BURST"], self.config["USER_RATE"]
+        ident = f"ip:{self.get_ident(request)}"
+        return ident, self.config["ANON_BURST"], self.config["ANON_RATE"]
+
+    def allow_request(self, request, view):
+        ident, capacity, rate = self.get_bucket(request)
+        allowed, tokens, wait = take_token(
+            self.cache, f"throttle:{self.scope}:{ident}", capacity, rate
+        )
+        # 供 LLMBudgetThrottle 判断该用户近期的使用量
+        request.ai_bucket_level = tokens / capacity
+        request.ai_user_throttled = not allowed
+        self.wait_seconds = wait
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LLMBudgetThrottle(BaseThrottle):
+    key = "throttle:llm:global"
+
+    def __init__(self):
+        self.config = get_config()
+        self.cache = caches[self.config["CACHE_ALIAS"]]
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if getattr(request, "ai_user_throttled", False):
+            # 请求已被单用户限流拒绝，不再占用全局预算
+            return True
+        capacity = self.config["GLOBAL_BURST"]
+        rate = self.config["GLOBAL_RATE"]
+        allowed, tokens, wait = take_token(self.cache, self.key, capacity, rate)
+        if allowed and tokens >= capacity * self.config["FAIR_THRESHOLD"]:
+            return True
+
+        # 预算紧张：近期用得多的用户优先被拒绝
+        user_level = getattr(request, "ai_bucket_level", 1)
+        if user_level < self.config["FAIR_MIN_USER_LEVEL"]:
+            if allowed:
+                # 把刚取走的令牌还回去，留给轻度用户
+                refund_token(self.cache, self.key, capacity, rate)
+            self.wait_seconds = max(wait, 1 / rate)
+            return False
+        if allowed:
+            return True
+
+        # 轻度用户短暂排队等待令牌
+        deadline = time.monotonic() + self.config["MAX_WAIT"]
+        while time.monotonic() + wait <= deadline:
+            time.sleep(wait)
+            allowed, tokens, wait = take_token(self.cache, self.key, capacity, rate)
+            if allowed:
+                return True
+        self.wait_seconds = wait
+        return False
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,188 @@
+"""
+Server-Timing 请求耗时分解
+
+ServerTimingMiddleware 为每个请求建立一个 Timings，放在 contextvar 中，请求过程中各处往里累加：
+- db：SQL 条数和耗时（连接上的 execute_wrapper）
+- upstream：upstream.fetch() 的耗时，包括舱壁排队和镜像切换
+- llm：大模型调用耗时，包括重试
+- serialize：DRF 序列化（BaseSerializer.data）耗时，嵌套的序列化只计最外层
+- render：响应渲染耗时
+结束时写入 Server-Timing 响应头，并按 LOG_SAMPLE_RATE 抽样（或超过 LOG_SLOW_MS 时）记一条结构化日志。
+
+提交到线程池的任务要用 bind_context() 包装才会计入当前请求；并行的上游调用各自累加，
+所以 upstream 可能大于 total。后台预取不属于任何请求，不计入。
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    # 抽样写日志的比例，0 表示不抽样
+    "LOG_SAMPLE_RATE": 0.0,
+    # 总耗时超过该值（毫秒）的请求总是写日志，0 表示不启用
+    "LOG_SLOW_MS": 0,
+}
+
+# 响应头中各项的顺序
+BUCKETS = ("db", "upstream", "llm", "serialize", "render")
+
+_current = contextvars.ContextVar("server_timing", default=None)
+_serializing = contextvars.ContextVar("server_timing_serializing", default=False)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SERVER_TIMING", {}))
+    return config
+
+
+class Timings:
+    """一个请求的耗时分解，线程池中的任务也可能写入，所以加锁"""
+
+    def __init__(self):
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, count=1):
+        with self._lock:
+            bucket = self.buckets.setdefault(name, [0, 0.0])
+            bucket[0] += count
+            bucket[1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {name: list(bucket) for name, bucket in self.buckets.items()}
+
+    def header(self, total):
+        buckets = self.snapshot()
+        parts = []
+        for name in BUCKETS:
+            if name in buckets:
+                count, seconds = buckets[name]
+                parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count}"')
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def add(name, seconds, count=1):
+    """累加到当前请求，不在请求中时什么也不做"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds, count)
+
+
+@contextmanager
+def timed(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def bind_context(fn):
+    """让线程池中执行的 fn 看到当前的 contextvars（每次提交都要重新包装）"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def instrument_serializers():
+    """给 BaseSerializer.data 加上计时，只执行一次"""
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, "server_timing", False):
+        return
+
+    def data(self):
+        timings = _current.get()
+        if timings is None or _serializing.get():
+            return original.fget(self)
+        token = _serializing.set(True)
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            _serializing.reset(token)
+            timings.add("serialize", time.perf_counter() - started)
+
+    data.server_timing = True
+    BaseSerializer.data = property(data, doc=original.__doc__)
+
+
+def record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add("db", time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        config = get_config()
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config["LOG_SAMPLE_RATE"]
+        self.slow = config["LOG_SLOW_MS"] / 1000
+        instrument_serializers()
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+        response["Server-Timing"] = timings.header(total)
+        if (self.slow and total >= self.slow) or (self.sample_rate and random.random() < self.sample_rate):
+            self.log(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = _current.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add("render", time.perf_counter() - started)
+            )
+        return response
+
+    def log(self, request, response, timings, total):
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+        }
+        trace_id = tracing.current_trace_id()
+        if trace_id is not None:
+            record["trace_id"] = trace_id
+        for name, (count, seconds) in timings.snapshot().items():
+            record[f"{name}_ms"] = round(seconds * 1000, 1)
+            record[f"{name}_count"] = count
+        logger.info(json.dumps(record, ensure_ascii=False))
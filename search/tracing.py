@@ -0,0 +1,307 @@
+"""
+请求追踪
+
+TracingMiddleware 为抽中的请求建立一个 Trace，根 span 是整个请求；请求过程中用 span() 记录子过程，
+当前 span 放在 contextvar 中，用 timing.bind_context() 提交到线程池的任务自动成为提交时所在 span 的子 span，
+所以 AI 搜索的大模型调用、各歌名的并发搜索、缓存回源和上游请求能串成一棵树，看出关键路径。
+
+- 请求头带 W3C traceparent 时沿用其 trace id，并以其 span 为父 span。
+- 响应头 X-Trace-Id 和 Server-Timing 日志中的 trace_id 用于关联日志。
+- 请求结束后按 EXPORTER 导出：json 在 JSON_DIR 下每个 trace 写一个 Chrome trace 事件文件
+  （chrome://tracing 或 ui.perfetto.dev 打开），文件数超过 JSON_MAX_FILES 时删除最旧的；
+  otlp 在后台线程把 OTLP/HTTP JSON 发给 OTLP_ENDPOINT。
+没有进行中的 trace 时 span() 什么也不做。
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    # 追踪的请求比例；带 traceparent 且已抽中的请求总是追踪
+    "SAMPLE_RATE": 0.01,
+    # json 或 otlp
+    "EXPORTER": "json",
+    "JSON_DIR": "traces",
+    # JSON_DIR 下保留的 trace 文件数上限
+    "JSON_MAX_FILES": 1000,
+    "OTLP_ENDPOINT": "http://localhost:4318/v1/traces",
+    "OTLP_TIMEOUT": 2,
+    # 排队等待发送的 trace 上限，超出时丢弃
+    "OTLP_MAX_PENDING": 100,
+    "SERVICE_NAME": "music-recommendation",
+}
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "TRACING", {}))
+    return config
+
+
+def new_id(size):
+    return "%0*x" % (size * 2, random.getrandbits(size * 8))
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start", "end", "error", "thread")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+        self.thread = threading.get_ident()
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.end = time.time_ns()
+        self.trace.add(self)
+
+
+class Trace:
+    """一个请求的所有 span，线程池中的任务也会写入，所以加锁"""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or new_id(16)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def finished(self):
+        with self._lock:
+            return list(self.spans)
+
+
+def current_trace_id():
+    current = _current.get()
+    return current.trace.trace_id if current is not None else None
+
+
+@contextmanager
+def span(name, **attributes):
+    """在当前 span 下记录一个子 span，返回的 Span 可以用 set() 补充属性"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+
+def to_chrome(trace):
+    """Chrome trace 事件格式"""
+    events = []
+    for item in trace.finished():
+        args = dict(item.attributes, span_id=item.span_id, parent_id=item.parent_id)
+        if item.error:
+            args["error"] = item.error
+        events.append({
+            "name": item.name,
+            "cat": "span",
+            "ph": "X",
+            "ts": item.start // 1000,
+            "dur": (item.end - item.start) // 1000,
+            "pid": os.getpid(),
+            "tid": item.thread,
+            "args": args,
+        })
+    return {"traceEvents": events, "otherData": {"trace_id": trace.trace_id}}
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace, service_name):
+    """OTLP/HTTP JSON 格式"""
+    spans = []
+    for item in trace.finished():
+        data = {
+            "traceId": trace.trace_id,
+            "spanId": item.span_id,
+            "name": item.name,
+            # SPAN_KIND_SERVER / SPAN_KIND_INTERNAL
+            "kind": 2 if item.attributes.get("http.method") else 1,
+            "startTimeUnixNano": str(item.start),
+            "endTimeUnixNano": str(item.end),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in item.attributes.items()],
+            "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+        }
+        if item.parent_id:
+            data["parentSpanId"] = item.parent_id
+        spans.append(data)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "search.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class JSONExporter:
+    def __init__(self, config):
+        self.directory = config["JSON_DIR"]
+        self.max_files = config["JSON_MAX_FILES"]
+        # 目录中的文件数，第一次写入前扫描一次；多进程共用目录时只是估计值，超出上限时重新扫描
+        self._count = None
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{trace.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(to_chrome(trace), f, ensure_ascii=False)
+        with self._lock:
+            if self._count is None:
+                self._count = len(self.files())
+            else:
+                self._count += 1
+            if self._count > self.max_files:
+                self.prune(int(self.max_files * 0.9))
+
+    def files(self):
+        """[(修改时间, 路径)]"""
+        result = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    result.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        return result
+
+    def prune(self, target):
+        """从最旧的开始删除，直到文件数不超过 target（调用方持有 _lock）"""
+        files = sorted(self.files())
+        for _, path in files[: max(0, len(files) - target)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._count = min(len(files), target)
+
+
+class OTLPExporter:
+    def __init__(self, config):
+        self.endpoint = config["OTLP_ENDPOINT"]
+        self.timeout = config["OTLP_TIMEOUT"]
+        self.max_pending = config["OTLP_MAX_PENDING"]
+        self.service_name = config["SERVICE_NAME"]
+        self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="otlp-export")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                logger.debug("OTLP 导出队列已满，丢弃 trace %s", trace.trace_id)
+                return None
+            self._pending += 1
+        return self._executor.submit(self.send, trace)
+
+    def send(self, trace):
+        try:
+            self.session.post(self.endpoint, json=to_otlp(trace, self.service_name), timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.debug("OTLP 导出失败: %s", e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+EXPORTERS = {
+    "json": JSONExporter,
+    "otlp": OTLPExporter,
+}
+
+
+def parse_traceparent(value):
+    """返回 (trace id, 父 span id, 是否已抽中)，格式不对时返回 None"""
+    match = _TRACEPARENT.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+class TracingMiddleware:
+    def __init__(self, get_response):
+        config = get_config()
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config["SAMPLE_RATE"]
+        self.exporter = EXPORTERS[config["EXPORTER"]](config)
+
+    def __call__(self, request):
+        parent = parse_traceparent(request.headers.get("traceparent", ""))
+        if parent is not None and parent[2]:
+            trace, parent_id = Trace(parent[0]), parent[1]
+        elif parent is None and random.random() < self.sample_rate:
+            trace, parent_id = Trace(), None
+        else:
+            return self.get_response(request)
+
+        root = Span(trace, f"{request.method} {request.path}", parent_id, {
+            "http.method": request.method,
+            "http.target": request.get_full_path(),
+        })
+        token = _current.set(root)
+        try:
+            response = self.get_response(request)
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        else:
+            root.set("http.status_code", response.status_code)
+            response["X-Trace-Id"] = trace.trace_id
+            return response
+        finally:
+            _current.reset(token)
+            root.finish()
+            try:
+                self.exporter.export(trace)
+            except Exception:
+                logger.exception("导出 trace 失败")
@@ -0,0 +1,375 @@
+"""
+第三方音乐接口的统一调用入口
+
+上游主机及其镜像、请求头在 settings.UPSTREAMS 中配置。每个逻辑接口（APIS）属于一个上游主机，
+主机可以列出多个镜像地址：按 EWMA 延迟选择最快的健康镜像，偶尔探测其他镜像；
+镜像失败时本次请求切换到下一个镜像重试一次。
+
+每个上游主机有一个舱壁（Bulkhead）限制同时进行的请求数和排队长度，超出时立即拒绝
+（UpstreamOverloaded），避免上游变慢时请求无限堆积拖垮所有接口。
+播放相关的调用（歌曲 URL、歌词）是关键请求，舱壁为它们预留了一部分名额；后台预取的优先级最低。
+每个镜像连续失败达到阈值后熔断，冷却期内不再选择它；所有镜像都熔断时直接失败（CircuitOpen），
+由缓存层返回旧数据。
+成功的应答会交给 entities.ingest()，其中的歌曲写入实体存储；
+开启录制时还会写入录制文件（见 replay.py）。
+每次请求的耗时、状态码、应答字节数计入 metrics.py，由 /metrics 导出。
+"""
+
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import entities, metrics, replay, timing, tracing
+
+CRITICAL = "critical"
+DISCOVERY = "discovery"
+# 后台预取：最多占用普通名额的一半，不排队
+PREFETCH = "prefetch"
+
+# 逻辑接口 -> (上游主机, 路径, 优先级)，完整地址为 镜像地址 + 路径
+APIS = {
+    "cloudsearch": ("netstart", "/cloudsearch", DISCOVERY),
+    "newsong": ("netstart", "/personalized/newsong", DISCOVERY),
+    "artists": ("netstart", "/artists", DISCOVERY),
+    "artist_detail": ("netstart", "/artist/detail", DISCOVERY),
+    "artist_album": ("netstart", "/artist/album", DISCOVERY),
+    "album": ("netstart", "/album", DISCOVERY),
+    "lyric": ("netstart", "/lyric", CRITICAL),
+    "song_url": ("alger", "/music", CRITICAL),
+}
+
+DEFAULTS = {
+    "MIRRORS": [],
+    "HEADERS": {},
+    "TIMEOUT": (3, 10),  # (连接超时, 读取超时)
+    "MAX_IN_FLIGHT": 32,
+    "MAX_QUEUE": 64,
+    "QUEUE_TIMEOUT": 2,
+    "CRITICAL_RESERVE": 8,  # 只留给关键请求的名额
+    "FAILURE_THRESHOLD": 5,  # 镜像连续失败多少次后熔断
+    "RESET_TIMEOUT": 30,  # 熔断后多久放行一次试探请求（秒）
+    "EWMA_ALPHA": 0.3,  # 延迟均值中最新一次请求的权重
+    "EXPLORE_RATE": 0.05,  # 不选最快镜像、改为随机探测的概率
+    "MAX_ATTEMPTS": 2,  # 一次请求最多尝试几个镜像
+}
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_maxsize=DEFAULTS["MAX_IN_FLIGHT"]))
+session.mount("http://", HTTPAdapter(pool_maxsize=DEFAULTS["MAX_IN_FLIGHT"]))
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamOverloaded(UpstreamError):
+    """上游舱壁已满，请求被拒绝"""
+
+
+class CircuitOpen(UpstreamError):
+    """上游处于熔断状态"""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpen(f"上游服务暂不可用: {self.name}")
+            # 冷却结束：放行这一个试探请求，其余请求继续等待下一个冷却周期
+            self.opened_at = time.monotonic()
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+    def is_available(self):
+        """未熔断，或冷却期已过可以试探"""
+        with self._lock:
+            return self.opened_at is None or time.monotonic() - self.opened_at >= self.reset_timeout
+
+
+class Mirror:
+    """上游的一个镜像地址，记录 EWMA 延迟和熔断状态"""
+
+    def __init__(self, host, url, alpha, breaker):
+        self.host = host
+        self.url = url.rstrip("/")
+        self.alpha = alpha
+        self.breaker = breaker
+        self.latency = None  # EWMA 延迟（秒），None 表示还没有请求过
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.failures += 1
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.alpha * latency + (1 - self.alpha) * self.latency
+
+    def stats(self):
+        with self._lock:
+            return {
+                "url": self.url,
+                "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+                "calls": self.calls,
+                "failures": self.failures,
+                "open": self.breaker.is_open(),
+            }
+
+
+class Bulkhead:
+    def __init__(self, name, max_in_flight, max_queue, queue_timeout, critical_reserve):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.critical_reserve = min(critical_reserve, max_in_flight - 1)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def _limit(self, priority):
+        if priority == CRITICAL:
+            return self.max_in_flight
+        if priority == PREFETCH:
+            return max(1, (self.max_in_flight - self.critical_reserve) // 2)
+        return self.max_in_flight - self.critical_reserve
+
+    def acquire(self, priority):
+        with self._cond:
+            limit = self._limit(priority)
+            if self.in_flight < limit:
+                self.in_flight += 1
+                return
+            if priority == PREFETCH:
+                self.rejected += 1
+                raise UpstreamOverloaded(f"上游服务繁忙: {self.name}")
+            # 关键请求不受排队长度限制，只受等待时间限制
+            if priority != CRITICAL and self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise UpstreamOverloaded(f"上游服务繁忙: {self.name}")
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.in_flight >= limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise UpstreamOverloaded(f"上游服务繁忙: {self.name}")
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+            }
+
+
+_bulkheads = {}
+_mirrors = {}
+_state_lock = threading.Lock()
+
+
+def get_config(host):
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "UPSTREAMS", {}).get(host, {}))
+    return config
+
+
+def get_bulkhead(host):
+    bulkhead = _bulkheads.get(host)
+    if bulkhead is None:
+        with _state_lock:
+            bulkhead = _bulkheads.get(host)
+            if bulkhead is None:
+                config = get_config(host)
+                bulkhead = Bulkhead(
+                    host,
+                    config["MAX_IN_FLIGHT"],
+                    config["MAX_QUEUE"],
+                    config["QUEUE_TIMEOUT"],
+                    config["CRITICAL_RESERVE"],
+                )
+                _bulkheads[host] = bulkhead
+    return bulkhead
+
+
+def get_mirrors(host):
+    mirrors = _mirrors.get(host)
+    if mirrors is None:
+        with _state_lock:
+            mirrors = _mirrors.get(host)
+            if mirrors is None:
+                config = get_config(host)
+                if not config["MIRRORS"]:
+                    raise UpstreamError(f"未配置上游地址: {host}")
+                mirrors = [
+                    Mirror(
+                        host,
+                        url,
+                        config["EWMA_ALPHA"],
+                        CircuitBreaker(url, config["FAILURE_THRESHOLD"], config["RESET_TIMEOUT"]),
+                    )
+                    for url in config["MIRRORS"]
+                ]
+                _mirrors[host] = mirrors
+    return mirrors
+
+
+def rank_mirrors(mirrors, explore_rate):
+    """按健康状况和延迟排序：还没测过的优先，其次 EWMA 延迟低的；偶尔把一个随机镜像放到最前"""
+    candidates = [mirror for mirror in mirrors if mirror.breaker.is_available()]
+    candidates.sort(key=lambda mirror: (mirror.latency is not None, mirror.latency or 0))
+    if len(candidates) > 1 and random.random() < explore_rate:
+        candidates.insert(0, candidates.pop(random.randrange(1, len(candidates))))
+    return candidates
+
+
+def stats():
+    """各上游主机的舱壁和镜像状态"""
+    with _state_lock:
+        hosts = set(_bulkheads) | set(_mirrors)
+        bulkheads = dict(_bulkheads)
+        mirrors = dict(_mirrors)
+    return {
+        host: {
+            "bulkhead": bulkheads[host].stats() if host in bulkheads else None,
+            "mirrors": [mirror.stats() for mirror in mirrors.get(host, [])],
+        }
+        for host in hosts
+    }
+
+
+def reset():
+    """丢弃所有舱壁、镜像延迟和熔断状态（配置变更或测试时使用）"""
+    with _state_lock:
+        _bulkheads.clear()
+        _mirrors.clear()
+
+
+def error_status(exc):
+    """请求失败时的指标状态"""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        return "connection_error"
+    if isinstance(exc, ValueError):
+        return "invalid_response"
+    return "error"
+
+
+def request(api, mirror, path, params, config):
+    """向一个镜像发起请求，记录延迟、指标并更新熔断状态"""
+    mirror.breaker.before_call()
+    metrics.request_started(api)
+    started = time.monotonic()
+    size = 0
+    try:
+        response = session.get(
+            mirror.url + path, params=params, headers=config["HEADERS"], timeout=config["TIMEOUT"]
+        )
+        size = len(response.content)
+        # 5xx 和 429 即使带 JSON 也是镜像本身出错，按失败处理；其他 4xx 是请求参数的问题（如 id 不存在），
+        # 镜像正常应答，交给调用方按 code 处理
+        if response.status_code >= 500 or response.status_code == 429:
+            raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+        data = response.json()
+    except Exception as e:
+        elapsed = time.monotonic() - started
+        metrics.request_finished(api, error_status(e), elapsed, size)
+        # 失败按超时计入延迟，避免失败快的镜像反而显得最快
+        mirror.record(max(elapsed, sum(config["TIMEOUT"])), ok=False)
+        mirror.breaker.on_failure()
+        raise
+    elapsed = time.monotonic() - started
+    metrics.request_finished(api, response.status_code, elapsed, size)
+    mirror.record(elapsed, ok=True)
+    mirror.breaker.on_success()
+    return data
+
+
+def fetch(api, params=None, priority=None):
+    """调用逻辑接口 api，返回解析后的 JSON"""
+    with tracing.span("upstream.fetch", api=api):
+        return _fetch(api, params, priority)
+
+
+def _fetch(api, params, priority):
+    host, path, default_priority = APIS[api]
+    config = get_config(host)
+    candidates = rank_mirrors(get_mirrors(host), config["EXPLORE_RATE"])
+    if not candidates:
+        metrics.rejected(api, "circuit_open")
+        raise CircuitOpen(f"上游服务暂不可用: {host}")
+
+    bulkhead = get_bulkhead(host)
+    waited = time.perf_counter()
+    try:
+        bulkhead.acquire(priority or default_priority)
+    except UpstreamOverloaded:
+        metrics.rejected(api, "overloaded")
+        raise
+    try:
+        error = None
+        for mirror in candidates[: config["MAX_ATTEMPTS"]]:
+            started = time.monotonic()
+            try:
+                with tracing.span("upstream.request", mirror=mirror.url):
+                    data = request(api, mirror, path, params, config)
+                break
+            except CircuitOpen as e:
+                # 其他请求正在试探该镜像
+                error = e
+            except Exception as e:
+                error = UpstreamError(f"API调用失败: {str(e)}")
+        else:
+            raise error
+    finally:
+        bulkhead.release()
+        timing.add("upstream", time.perf_counter() - waited)
+    replay.record(api, params, data, time.monotonic() - started)
+    entities.ingest(api, params, data)
+    return data
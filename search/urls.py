@@ -5,12 +5,18 @@ urlpatterns = [
     path("bytitle/", views.SearchByTitleView.as_view(), name="search_by_title"),
     path("byartist/", views.SearchByArtistView.as_view(), name="search_by_artist"),
     path("byalbum/", views.SearchByAlbumView.as_view(), name="search_by_album"),
+    path("all/", views.SearchAllView.as_view(), name="search_all"),
     path("byartistsong/", views.SearchByArtistSongView.as_view(), name="search_by_artist_song"),
+    path("artistpage/", views.ArtistPageView.as_view(), name="artist_page"),
     path("byalbumsong/", views.SearchByAlbumSongView.as_view(), name="search_by_album_song"),
     path("bysong/", views.SearchBySongView.as_view(), name="search_by_song"),
+    path("warm/", views.WarmQueueView.as_view(), name="warm_queue"),
     path("bydesc/", views.SearchByDescView.as_view(), name="search_by_desc"),
     path("byspirit/", views.SearchBySpiritView.as_view(), name="search_by_spirit"),
     path("guess/", views.SearchGuess.as_view(), name="search_guess"),
     path("related/", views.SearchRelated.as_view(), name="search_related"),
     path("newsong/", views.SearchNewSongView.as_view(), name="search_new_song"),
+    path("profile/", views.ProfileView.as_view(), name="profile"),
+    path("memory/", views.MemoryView.as_view(), name="memory"),
+    path("cover/", views.CoverView.as_view(), name="cover"),
 ]
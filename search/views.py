@@ -1,50 +1,289 @@
 from django.shortcuts import render
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views import View
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-import requests
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.permissions import IsAdminUser
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import get_user_model
+import math
+import re
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from music.models import Favorite
 from music.serializers import FavoriteSerializer
+from . import cache as search_cache, covers, llm, memory, metrics, prefetch, profiling, timing, tracing, upstream
+from .cache import TwoTierCache
+from .throttling import AIUserThrottle, LLMBudgetThrottle
+from .models import GuessResult
 
+# 各类上游数据的缓存，TTL 见 settings.SEARCH_CACHE
+song_search_cache = TwoTierCache("search_song")
+artist_search_cache = TwoTierCache("search_artist")
+album_search_cache = TwoTierCache("search_album")
+artist_cache = TwoTierCache("artist")
+album_cache = TwoTierCache("album")
+song_url_cache = TwoTierCache("song_url")
+lyric_cache = TwoTierCache("lyric")
+newsong_cache = TwoTierCache("newsong")
+artist_detail_cache = TwoTierCache("artist_detail")
+artist_album_cache = TwoTierCache("artist_album")
+
+
+# 搜索页一次取的条数（前端分页），其他地方的小条数搜索可以复用这些缓存
+SEARCH_PAGE_LIMIT = 100
+# 前缀复用时最多检查多长的前缀
+PREFIX_MAX_LENGTH = 32
+# 前缀复用后在后台回源刷新精确结果
+prefix_refresher = prefetch.Prefetcher("prefix_refresh", max_workers=2, max_pending=32)
+# 歌手页之后预取专辑
+album_prefetcher = prefetch.Prefetcher("album")
+# 预热播放队列中后面几首歌的直链和歌词
+queue_prefetcher = prefetch.Prefetcher("queue")
+
+
+def song_text(song):
+	"""歌曲中可供关键词匹配的文字"""
+	parts = [song.get("name") or "", song.get("al", {}).get("name") or ""]
+	parts.extend(song.get("al", {}).get("tns") or [])
+	for ar in song.get("ar", []):
+		parts.append(ar.get("name") or "")
+		parts.extend(ar.get("tns") or [])
+		parts.extend(ar.get("alias") or [])
+	return " ".join(parts)
+
+
+def artist_text(artist):
+	return " ".join([artist.get("name") or ""] + list(artist.get("alias") or []))
+
+
+def album_text(album):
+	parts = [album.get("name") or ""] + list(album.get("alias") or [])
+	parts.extend(ar.get("name") or "" for ar in album.get("artists", []))
+	return " ".join(parts)
+
+
+def matches_keyword(text, keyword):
+	"""关键词按空白拆开后每一段都出现在 text 中（不区分大小写）"""
+	text = text.lower()
+	return all(token in text for token in keyword.lower().split())
+
+
+def overloaded_response():
+	"""上游繁忙时快速失败，提示客户端稍后重试"""
+	return Response(
+		{"code": 503, "message": "服务繁忙，请稍后再试"},
+		status=status.HTTP_503_SERVICE_UNAVAILABLE,
+		headers={"Retry-After": "1"},
+	)
+
+
+def format_song(song):
+	"""格式化搜索结果中的歌曲"""
+	return {
+		"name": song.get("name"),
+		"id": song.get("id"),
+		"ar": [
+			{
+				"id": ar.get("id"),
+				"name": ar.get("name"),
+				"tns": ar.get("tns", []),
+				"alias": ar.get("alias", []),
+			}
+			for ar in song.get("ar", [])
+		],
+		"al": {
+			"id": song.get("al", {}).get("id"),
+			"name": song.get("al", {}).get("name"),
+			"picUrl": song.get("al", {}).get("picUrl"),
+			"tns": song.get("al", {}).get("tns", []),
+		},
+		"publishTime": song.get("publishTime", 0),
+	}
+
+
+def format_artist(artist):
+	"""格式化搜索结果中的歌手"""
+	return {
+		"id": artist.get("id"),
+		"name": artist.get("name"),
+		"picUrl": artist.get("picUrl"),
+		"alias": artist.get("alias", []),
+		"albumSize": artist.get("albumSize", 0),
+		"mvSize": artist.get("mvSize", 0),
+	}
+
+
+def format_album(album):
+	"""格式化搜索结果中的专辑"""
+	return {
+		"name": album.get("name"),
+		"id": album.get("id"),
+		"size": album.get("size", 0),
+		"picUrl": album.get("picUrl"),
+		"publishTime": album.get("publishTime", 0),
+		"company": album.get("company", ""),
+		"alias": album.get("alias", []),
+		"artists": [
+			{
+				"name": ar.get("name"),
+				"id": ar.get("id"),
+				"picUrl": ar.get("picUrl"),
+			}
+			for ar in album.get("artists", [])
+		],
+	}
+
+
+def format_track(song):
+	"""格式化歌手热门歌曲、专辑曲目中的歌曲"""
+	return {
+		"ar": [
+			{"id": ar.get("id", 0), "name": ar.get("name", "")}
+			for ar in song.get("ar", [])
+		],
+		"al": {
+			"id": song.get("al", {}).get("id", 0),
+			"name": song.get("al", {}).get("name", ""),
+			"picUrl": song.get("al", {}).get("picUrl", ""),
+		},
+		"name": song.get("name", ""),
+		"id": song.get("id", 0),
+	}
+
+
+class UpstreamCacheMixin:
+	# 本次请求是否用到了过期的缓存数据
+	stale = False
+
+	def cached(self, cache, key, loader):
+		value, stale = cache.fetch(key, loader)
+		if stale:
+			self.stale = True
+		return value
+
+	def gather(self, tasks):
+		"""
+		并发执行 {名称: (函数, 参数...)}，返回 (结果, 失败时的响应)。
+		某一项失败时结果为 None；全部失败时返回对应的错误响应，否则错误响应为 None。
+		"""
+		with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+			futures = {
+				name: executor.submit(timing.bind_context(task[0]), *task[1:])
+				for name, task in tasks.items()
+			}
+
+		results = {}
+		overloaded = False
+		error = None
+		for name, future in futures.items():
+			try:
+				results[name] = future.result()
+			except upstream.UpstreamOverloaded:
+				overloaded = True
+				results[name] = None
+			except Exception as e:
+				error = e
+				results[name] = None
+
+		if any(result is not None for result in results.values()):
+			return results, None
+		if overloaded:
+			return results, overloaded_response()
+		if error is not None:
+			return results, Response(
+				{"code": 500, "message": f"搜索出错: {str(error)}"},
+				status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+			)
+		return results, Response(
+			{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
+		)
+
+	def success_response(self, data):
+		payload = {"code": 200, "message": "success", "data": data}
+		if self.stale:
+			payload["stale"] = True
+		return Response(payload)
+
+
+class BaseSearchView(UpstreamCacheMixin, APIView):
+	# AI 推荐的每个歌名取几条搜索结果
+	fetch_song_limit = 3
 
-class BaseSearchView(APIView):
 	def get_search_params(self, request):
 		keyword = request.GET.get("keyword", "")
 		return keyword
 
-	def keyword_api(self, params):
-		api_url = "https://apis.netstart.cn/music/cloudsearch"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, params=params, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
+	def keyword_api(self, params, priority=None):
+		return upstream.fetch("cloudsearch", params, priority)
 		
 	def newsong_api(self):
-		api_url = "https://apis.netstart.cn/music/personalized/newsong"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
+		return upstream.fetch("newsong")
+
+	def search_type(self, cache, search_type, result_key, formatter, text, keyword, limit):
+		"""按关键词搜索某一类型（1 歌曲、100 歌手、10 专辑），上游应答失败时返回 None"""
+		if limit < SEARCH_PAGE_LIMIT:
+			# 搜索页已经取过这个关键词时，直接截取前 limit 条
+			superset = cache.peek((keyword, SEARCH_PAGE_LIMIT))
+			if superset is not None:
+				return superset[:limit]
+
+		def load(priority=None):
+			data = self.keyword_api({"keywords": keyword, "type": search_type, "limit": limit}, priority)
+			if data.get("code") != 200:
+				return None
+			return [formatter(item) for item in data.get("result", {}).get(result_key, [])]
+
+		config = search_cache.get_config()
+		if config["PREFIX_REUSE"] and cache.peek((keyword, limit)) is None:
+			filtered = self.filter_prefix_results(cache, text, keyword, limit)
+			if filtered is not None:
+				if config["PREFIX_REFRESH"]:
+					# 后台刷新不与用户请求争抢上游名额
+					prefix_refresher.submit(cache, (keyword, limit), lambda: load(priority=upstream.PREFETCH))
+				return filtered
+
+		return self.cached(cache, (keyword, limit), load)
+
+	def filter_prefix_results(self, cache, text, keyword, limit):
+		"""
+		输入过程中的增量搜索：较短前缀的缓存结果是完整的（条数少于当时请求的 limit，没有被截断）时，
+		在本地按关键词过滤即可得到结果。没有可用的前缀时返回 None。
+		"""
+		keyword = keyword[:PREFIX_MAX_LENGTH]
+		for end in range(len(keyword) - 1, 0, -1):
+			prefix = keyword[:end]
+			if not prefix.strip():
+				continue
+			for prefix_limit in {limit, SEARCH_PAGE_LIMIT}:
+				results = cache.peek((prefix, prefix_limit))
+				if results is not None and len(results) < prefix_limit:
+					return [item for item in results if matches_keyword(text(item), keyword)][:limit]
+		return None
+
+	def search_songs(self, keyword, limit):
+		return self.search_type(song_search_cache, 1, "songs", format_song, song_text, keyword, limit)
+
+	def search_artists(self, keyword, limit):
+		return self.search_type(
+			artist_search_cache, 100, "artists", format_artist, artist_text, keyword, limit
+		)
+
+	def search_albums(self, keyword, limit):
+		return self.search_type(album_search_cache, 10, "albums", format_album, album_text, keyword, limit)
+
+	def fetch_song_info(self, name):
+		with tracing.span("fetch_song_info", song=name):
+			try:
+				return self.search_songs(name, self.fetch_song_limit) or []
+			except Exception:
+				return []
 
 class SearchByTitleView(BaseSearchView):
 	def get(self, request):
@@ -55,49 +294,17 @@ class SearchByTitleView(BaseSearchView):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		params = {
-			"keywords": keyword,
-			"type": 1,  # 歌曲
-			"limit": 100,  # 获取足够多的结果以便分页
-		}
-
 		try:
-			data = self.keyword_api(params)
-			if data.get("code") == 200:
-				result = data.get("result", {})
-				all_songs = result.get("songs", [])
-
-				formatted_results = []
-				for song in all_songs:
-					formatted_results.append(
-						{
-							"name": song.get("name"),
-							"id": song.get("id"),
-							"ar": [
-								{
-									"id": ar.get("id"),
-									"name": ar.get("name"),
-									"tns": ar.get("tns", []),
-									"alias": ar.get("alias", []),
-								}
-								for ar in song.get("ar", [])
-							],
-							"al": {
-								"id": song.get("al", {}).get("id"),
-								"name": song.get("al", {}).get("name"),
-								"picUrl": song.get("al", {}).get("picUrl"),
-								"tns": song.get("al", {}).get("tns", []),
-							},
-							"publishTime": song.get("publishTime", 0),
-						}
-					)
-				return Response(
-					{"code": 200, "message": "success", "data": formatted_results}
-				)
+			# 获取足够多的结果以便分页
+			formatted_results = self.search_songs(keyword, SEARCH_PAGE_LIMIT)
+			if formatted_results is not None:
+				return self.success_response(formatted_results)
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
 
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -114,35 +321,16 @@ class SearchByArtistView(BaseSearchView):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		params = {
-			"keywords": keyword,
-			"type": 100,  # 歌手
-			"limit": 100,  # 获取足够多的结果以便分页
-		}
-
 		try:
-			data = self.keyword_api(params)
-			if data.get("code") == 200:
-				result = data.get("result", {})
-				all_artists = result.get("artists", [])
-				formatted_results = []
-				for artist in all_artists:
-					formatted_results.append(
-						{
-							"id": artist.get("id"),
-							"name": artist.get("name"),
-							"picUrl": artist.get("picUrl"),
-							"alias": artist.get("alias", []),
-							"albumSize": artist.get("albumSize", 0),
-							"mvSize": artist.get("mvSize", 0),
-						}
-					)
-				return Response(
-					{"code": 200, "message": "success", "data": formatted_results}
-				)
+			# 获取足够多的结果以便分页
+			formatted_results = self.search_artists(keyword, SEARCH_PAGE_LIMIT)
+			if formatted_results is not None:
+				return self.success_response(formatted_results)
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -159,45 +347,16 @@ class SearchByAlbumView(BaseSearchView):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 
-		params = {
-			"keywords": keyword,
-			"type": 10,  # 专辑
-			"limit": 100,  # 获取足够多的结果以便分页
-		}
-
 		try:
-			data = self.keyword_api(params)
-			if data.get("code") == 200:
-				result = data.get("result", {})
-				all_albums = result.get("albums", [])
-				formatted_results = []
-				for album in all_albums:
-					formatted_results.append(
-						{
-							"name": album.get("name"),
-							"id": album.get("id"),
-							"size": album.get("size", 0),
-							"picUrl": album.get("picUrl"),
-							"publishTime": album.get("publishTime", 0),
-							"company": album.get("company", ""),
-							"alias": album.get("alias", []),
-							"artists": [
-								{
-									"name": ar.get("name"),
-									"id": ar.get("id"),
-									"picUrl": ar.get("picUrl"),
-								}
-								for ar in album.get("artists", [])
-							],
-						}
-					)
-
-				return Response(
-					{"code": 200, "message": "success", "data": formatted_results}
-				)
+			# 获取足够多的结果以便分页
+			formatted_results = self.search_albums(keyword, SEARCH_PAGE_LIMIT)
+			if formatted_results is not None:
+				return self.success_response(formatted_results)
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -205,77 +364,109 @@ class SearchByAlbumView(BaseSearchView):
 			)
 
 
-class AdvancedSearchView(APIView):
+class SearchAllView(BaseSearchView):
+	"""一次请求同时搜索歌曲、歌手、专辑"""
+
+	default_limit = 10
+	max_limit = 30
+
+	def get_limit(self, request):
+		try:
+			limit = int(request.GET.get("limit", self.default_limit))
+		except (TypeError, ValueError):
+			limit = self.default_limit
+		return max(1, min(limit, self.max_limit))
+
+	def get(self, request):
+		keyword = self.get_search_params(request)
+		if not keyword:
+			return Response(
+				{"code": 403, "message": "请输入搜索关键词"},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		limit = self.get_limit(request)
+
+		# 某一类型失败时该类型返回空列表，全部失败才报错
+		results, error_response = self.gather({
+			"songs": (self.search_songs, keyword, limit),
+			"artists": (self.search_artists, keyword, limit),
+			"albums": (self.search_albums, keyword, limit),
+		})
+		if error_response is not None:
+			return error_response
+		return self.success_response({name: result or [] for name, result in results.items()})
+
+
+class AdvancedSearchView(UpstreamCacheMixin, APIView):
 	def get_search_params(self, request):
 		id = request.GET.get("id", "")
 		return id
 
 	def artist_api(self, params):
-		api_url = "https://apis.netstart.cn/music/artists"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, params=params, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
-
-	def album_api(self, params):
-		api_url = "https://apis.netstart.cn/music/album"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, params=params, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
-
-	def song_api(self, params):
-		api_url = "http://music.alger.fun/music_proxy/music"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, params=params, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
-
-	def lyric_api(self, params):
-		api_url = "https://apis.netstart.cn/music/lyric"
-		headers = {
-			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-			"Accept": "application/json, text/plain, */*",
-			"Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-			"Origin": "https://music.163.com",
-			"Referer": "https://music.163.com/",
-		}
-		try:
-			response = requests.get(api_url, params=params, headers=headers)
-			# print(response.text)
-			return response.json()
-		except Exception as e:
-			raise Exception(f"API调用失败: {str(e)}")
+		return upstream.fetch("artists", params)
+
+	def artist_detail_api(self, params):
+		return upstream.fetch("artist_detail", params)
+
+	def artist_album_api(self, params):
+		return upstream.fetch("artist_album", params)
+
+	def album_api(self, params, priority=None):
+		return upstream.fetch("album", params, priority)
+
+	def song_api(self, params, priority=None):
+		return upstream.fetch("song_url", params, priority)
+
+	def lyric_api(self, params, priority=None):
+		return upstream.fetch("lyric", params, priority)
 
 
 class SearchByArtistSongView(AdvancedSearchView):
+	@staticmethod
+	def top_album_ids(songs):
+		"""热门歌曲中出现次数最多的专辑"""
+		counts = Counter(song["al"]["id"] for song in songs if song.get("al", {}).get("id"))
+		return [album_id for album_id, _ in counts.most_common()]
+
+	def prefetch_albums(self, album_ids):
+		"""用户接下来通常会打开该歌手的专辑，在后台以最低优先级预取前几张"""
+		config = prefetch.get_config()
+		if not config["ENABLED"]:
+			return
+		album_view = SearchByAlbumSongView()
+		for album_id in album_ids[:config["ARTIST_ALBUMS"]]:
+			# 与请求参数一致，缓存 key 用字符串 id
+			album_id = str(album_id)
+			album_prefetcher.submit(
+				album_cache,
+				album_id,
+				lambda album_id=album_id: album_view.load_album(album_id, priority=upstream.PREFETCH),
+			)
+
+	def load_artist(self, id):
+		data = self.artist_api({"id": id})
+		if data.get("code") != 200:
+			return None
+		artist_info = data.get("artist", {})
+		songs = data.get("hotSongs", [])
+
+		# 格式化歌手信息
+		return {
+			"artist": {
+				"briefDesc": artist_info.get("briefDesc", ""),
+				"musicSize": artist_info.get("musicSize", 0),
+				"albumSize": artist_info.get("albumSize", 0),
+				"picUrl": artist_info.get("picUrl", ""),
+				"alias": artist_info.get("alias", []),
+				"name": artist_info.get("name", ""),
+				"id": artist_info.get("id", 0),
+				"publishTime": artist_info.get("publishTime", 0),
+				"mvSize": artist_info.get("mvSize", 0),
+			},
+			# 格式化歌曲信息
+			"songs": [format_track(song) for song in songs],
+		}
+
 	def get(self, request):
 		id = self.get_search_params(request)
 		if not id:
@@ -283,51 +474,16 @@ class SearchByArtistSongView(AdvancedSearchView):
 				{"code": 403, "message": "请输入歌手id"},
 				status=status.HTTP_400_BAD_REQUEST,
 			)
-		params = {"id": id}
 		try:
-			data = self.artist_api(params)
-			if data.get("code") == 200:
-				artist_info = data.get("artist", {})
-				songs = data.get("hotSongs", [])
-
-				# 格式化歌手信息
-				formatted_artist = {
-					"artist": {
-						"briefDesc": artist_info.get("briefDesc", ""),
-						"musicSize": artist_info.get("musicSize", 0),
-						"albumSize": artist_info.get("albumSize", 0),
-						"picUrl": artist_info.get("picUrl", ""),
-						"alias": artist_info.get("alias", []),
-						"name": artist_info.get("name", ""),
-						"id": artist_info.get("id", 0),
-						"publishTime": artist_info.get("publishTime", 0),
-						"mvSize": artist_info.get("mvSize", 0),
-					},
-					"songs": [],
-				}
-
-				# 格式化歌曲信息
-				for song in songs:
-					formatted_song = {
-						"ar": [
-							{"id": ar.get("id", 0), "name": ar.get("name", "")}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id", 0),
-							"name": song.get("al", {}).get("name", ""),
-							"picUrl": song.get("al", {}).get("picUrl", ""),
-						},
-						"name": song.get("name", ""),
-						"id": song.get("id", 0),
-					}
-					formatted_artist["songs"].append(formatted_song)
-				return Response(
-					{"code": 200, "message": "success", "data": [formatted_artist]}
-				)
+			formatted_artist = self.cached(artist_cache, id, lambda: self.load_artist(id))
+			if formatted_artist is not None:
+				self.prefetch_albums(self.top_album_ids(formatted_artist["songs"]))
+				return self.success_response([formatted_artist])
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -335,7 +491,118 @@ class SearchByArtistSongView(AdvancedSearchView):
 			)
 
 
+class ArtistPageView(SearchByArtistSongView):
+	"""歌手页：歌手详情、热门歌曲、专辑列表一次返回，三部分并发回源、分别缓存"""
+
+	default_album_limit = 30
+	max_album_limit = 100
+
+	def load_detail(self, id):
+		data = self.artist_detail_api({"id": id})
+		if data.get("code") != 200:
+			return None
+		artist_info = data.get("data", {}).get("artist", {})
+		return {
+			"id": artist_info.get("id", 0),
+			"name": artist_info.get("name", ""),
+			"cover": artist_info.get("cover", ""),
+			"avatar": artist_info.get("avatar", ""),
+			"briefDesc": artist_info.get("briefDesc", ""),
+			"alias": artist_info.get("alias", []),
+			"transNames": artist_info.get("transNames", []),
+			"albumSize": artist_info.get("albumSize", 0),
+			"musicSize": artist_info.get("musicSize", 0),
+			"mvSize": artist_info.get("mvSize", 0),
+			"identity": data.get("data", {}).get("identify", {}).get("imageDesc", ""),
+		}
+
+	def load_albums(self, id, limit):
+		data = self.artist_album_api({"id": id, "limit": limit})
+		if data.get("code") != 200:
+			return None
+		return {
+			"albums": [format_album(album) for album in data.get("hotAlbums", [])],
+			"more": data.get("more", False),
+		}
+
+	def get_album_limit(self, request):
+		try:
+			limit = int(request.GET.get("album_limit", self.default_album_limit))
+		except (TypeError, ValueError):
+			limit = self.default_album_limit
+		return max(1, min(limit, self.max_album_limit))
+
+	def get(self, request):
+		id = self.get_search_params(request)
+		if not id:
+			return Response(
+				{"code": 403, "message": "请输入歌手id"},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		album_limit = self.get_album_limit(request)
+
+		# 某一部分失败时该部分为空，全部失败才报错
+		results, error_response = self.gather({
+			"hot": (self.cached, artist_cache, id, lambda: self.load_artist(id)),
+			"detail": (self.cached, artist_detail_cache, id, lambda: self.load_detail(id)),
+			"albums": (
+				self.cached, artist_album_cache, (id, album_limit),
+				lambda: self.load_albums(id, album_limit),
+			),
+		})
+		if error_response is not None:
+			return error_response
+
+		hot, detail, albums = results["hot"], results["detail"], results["albums"]
+		if albums:
+			self.prefetch_albums([album["id"] for album in albums["albums"]])
+		elif hot:
+			self.prefetch_albums(self.top_album_ids(hot["songs"]))
+
+		artist = dict(hot["artist"]) if hot else {}
+		artist.update(detail or {})
+		return self.success_response({
+			"artist": artist,
+			"songs": hot["songs"] if hot else [],
+			"albums": albums["albums"] if albums else [],
+			"moreAlbums": albums["more"] if albums else False,
+		})
+
+
 class SearchByAlbumSongView(AdvancedSearchView):
+	def load_album(self, id, priority=None):
+		data = self.album_api({"id": id}, priority)
+		if data.get("code") != 200:
+			return None
+		album_info = data.get("album", {})
+		songs = data.get("songs", [])
+
+		# 格式化专辑信息
+		return {
+			"album": {
+				"artist": {
+					"musicSize": album_info.get("artist", {}).get(
+						"musicSize", 0
+					),
+					"albumSize": album_info.get("artist", {}).get(
+						"albumSize", 0
+					),
+					"picUrl": album_info.get("artist", {}).get("picUrl", ""),
+					"alias": album_info.get("artist", {}).get("alias", []),
+					"name": album_info.get("artist", {}).get("name", ""),
+					"id": album_info.get("artist", {}).get("id", 0),
+				},
+				"company": album_info.get("company", ""),
+				"picUrl": album_info.get("picUrl", ""),
+				"alias": album_info.get("alias", []),
+				"description": album_info.get("description", ""),
+				"name": album_info.get("name", ""),
+				"id": album_info.get("id", 0),
+			},
+			# 格式化歌曲信息
+			"songs": [format_track(song) for song in songs],
+		}
+
 	def get(self, request):
 		id = self.get_search_params(request)
 		if not id:
@@ -343,60 +610,16 @@ class SearchByAlbumSongView(AdvancedSearchView):
 				{"code": 403, "message": "请输入专辑id"},
 				status=status.HTTP_400_BAD_REQUEST,
 			)
-		params = {"id": id}
+		album_prefetcher.record_use(album_cache, id)
 		try:
-			data = self.album_api(params)
-			if data.get("code") == 200:
-				album_info = data.get("album", {})
-				songs = data.get("songs", [])
-
-				# 格式化专辑信息
-				formatted_album = {
-					"album": {
-						"artist": {
-							"musicSize": album_info.get("artist", {}).get(
-								"musicSize", 0
-							),
-							"albumSize": album_info.get("artist", {}).get(
-								"albumSize", 0
-							),
-							"picUrl": album_info.get("artist", {}).get("picUrl", ""),
-							"alias": album_info.get("artist", {}).get("alias", []),
-							"name": album_info.get("artist", {}).get("name", ""),
-							"id": album_info.get("artist", {}).get("id", 0),
-						},
-						"company": album_info.get("company", ""),
-						"picUrl": album_info.get("picUrl", ""),
-						"alias": album_info.get("alias", []),
-						"description": album_info.get("description", ""),
-						"name": album_info.get("name", ""),
-						"id": album_info.get("id", 0),
-					},
-					"songs": [],
-				}
-
-				# 格式化歌曲信息
-				for song in songs:
-					formatted_song = {
-						"ar": [
-							{"id": ar.get("id", 0), "name": ar.get("name", "")}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id", 0),
-							"name": song.get("al", {}).get("name", ""),
-							"picUrl": song.get("al", {}).get("picUrl", ""),
-						},
-						"name": song.get("name", ""),
-						"id": song.get("id", 0),
-					}
-					formatted_album["songs"].append(formatted_song)
-				return Response(
-					{"code": 200, "message": "success", "data": [formatted_album]}
-				)
+			formatted_album = self.cached(album_cache, id, lambda: self.load_album(id))
+			if formatted_album is not None:
+				return self.success_response([formatted_album])
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -405,6 +628,22 @@ class SearchByAlbumSongView(AdvancedSearchView):
 
 
 class SearchBySongView(AdvancedSearchView):
+	def load_url(self, id, priority=None):
+		data = self.song_api({"id": id}, priority)
+		return data.get("data", {}).get("url", "") or ""
+
+	def load_lyric(self, id, priority=None):
+		data = self.lyric_api({"id": id}, priority)
+		return data.get("lrc", {}).get("lyric", "") or ""
+
+	def get_url(self, id):
+		queue_prefetcher.record_use(song_url_cache, id)
+		return self.cached(song_url_cache, id, lambda: self.load_url(id))
+
+	def get_lyric(self, id):
+		queue_prefetcher.record_use(lyric_cache, id)
+		return self.cached(lyric_cache, id, lambda: self.load_lyric(id))
+
 	def get(self, request):
 		id = self.get_search_params(request)
 		if not id:
@@ -412,23 +651,16 @@ class SearchBySongView(AdvancedSearchView):
 				{"code": 403, "message": "请输入歌曲id"},
 				status=status.HTTP_400_BAD_REQUEST,
 			)
-		params = {"id": id}
 		try:
-			data = self.song_api(params)
-			url = data.get("data", {}).get("url", "")
-			data = self.lyric_api(params)
-			lyric = data.get("lrc", {}).get("lyric", "")
+			url = self.get_url(id)
+			lyric = self.get_lyric(id)
 			if url and lyric:
-				return Response(
-					{
-						"code": 200,
-						"message": "success",
-						"data": {"url": url, "lyric": lyric},
-					}
-				)
+				return self.success_response({"url": url, "lyric": lyric})
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"搜索出错: {str(e)}"},
@@ -436,45 +668,61 @@ class SearchBySongView(AdvancedSearchView):
 			)
 
 
-class SearchByDescView(BaseSearchView):
-	def fetch_song_info(self, name):
-		params = {
-			"keywords": name,
-			"type": 1,
-			"limit": 3,
-		}
-		try:
-			data = self.keyword_api(params)
-			result = data.get("result", {})
-			songs = result.get("songs", [])
-			song_infos = []
-			for song in songs:
-				song_infos.append(
-					{
-						"name": song.get("name"),
-						"id": song.get("id"),
-						"ar": [
-							{
-								"id": ar.get("id"),
-								"name": ar.get("name"),
-								"tns": ar.get("tns", []),
-								"alias": ar.get("alias", []),
-							}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id"),
-							"name": song.get("al", {}).get("name"),
-							"picUrl": song.get("al", {}).get("picUrl"),
-							"tns": song.get("al", {}).get("tns", []),
-						},
-						"publishTime": song.get("publishTime", 0),
-					}
+class WarmQueueView(SearchBySongView):
+	"""
+	客户端开始播放一首歌时上报播放队列中接下来的歌曲 id，
+	服务端在后台预热前 QUEUE_AHEAD 首的直链和歌词，切歌时直接命中缓存。
+	settings.PREFETCH["ENABLED"] 为假时返回 404；按用户（未登录按 IP）限流。
+	"""
+
+	http_method_names = ["post", "options"]
+	throttle_classes = [ScopedRateThrottle]
+	throttle_scope = "warm_queue"
+
+	def initial(self, request, *args, **kwargs):
+		if not prefetch.get_config()["ENABLED"]:
+			raise Http404
+		super().initial(request, *args, **kwargs)
+
+	def throttled(self, request, wait):
+		raise Throttled(wait, detail="请求过于频繁，请稍后再试")
+
+	def post(self, request):
+		ids = request.data.get("ids") if hasattr(request.data, "get") else None
+		if not isinstance(ids, list) or not ids:
+			return Response(
+				{"code": 403, "message": "请提供歌曲id列表"},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		# 与 bysong/ 的请求参数一致，缓存 key 用字符串 id
+		ids = [str(id) for id in ids if str(id).isdigit()][: prefetch.get_config()["QUEUE_AHEAD"]]
+		queued = 0
+		for id in ids:
+			for cache, load in (
+				(song_url_cache, self.load_url),
+				(lyric_cache, self.load_lyric),
+			):
+				future = queue_prefetcher.submit(
+					cache, id, lambda id=id, load=load: load(id, priority=upstream.PREFETCH)
 				)
-			return song_infos
-		except Exception:
-			return []
+				if future is not None:
+					queued += 1
+		return Response(
+			{"code": 202, "message": "accepted", "data": {"ids": ids, "queued": queued}},
+			status=status.HTTP_202_ACCEPTED,
+		)
+
+
+class AIThrottleMixin:
+	"""AI 接口：按用户限流，并占用全局大模型预算"""
+	throttle_classes = [AIUserThrottle, LLMBudgetThrottle]
 
+	def throttled(self, request, wait):
+		raise Throttled(wait, detail="请求过于频繁，请稍后再试")
+
+
+class SearchByDescView(AIThrottleMixin, BaseSearchView):
 	def get(self, request):
 		describe = request.GET.get("describe", "")
 
@@ -485,8 +733,7 @@ class SearchByDescView(BaseSearchView):
 			)
 
 		try:
-			api_key = "sk-uvxthytexestpleawhxcjtqdjwrzsszrwbcebbhlbxhbnlud"
-			song_infos = get_song_names_from_deepseek(describe, api_key)
+			song_infos = get_song_names_from_deepseek(describe)
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"AI分析出错: {str(e)}"},
@@ -495,92 +742,38 @@ class SearchByDescView(BaseSearchView):
 		full_song_infos = []
 		with ThreadPoolExecutor(max_workers=8) as executor:  # 8线程，可根据实际情况调整
 			future_to_name = {
-				executor.submit(self.fetch_song_info, name): name for name in song_infos
+				executor.submit(timing.bind_context(self.fetch_song_info), name): name
+				for name in song_infos
 			}
 			for future in as_completed(future_to_name):
 				result = future.result()
 				if result:
 					full_song_infos.extend(result)
-		return Response(
-			{
-				"code": 200,
-				"message": "success",
-				"data": full_song_infos,
-			}
-		)
+		return self.success_response(full_song_infos)
 
 
-def get_song_names_from_deepseek(description, api_key):
-	url = "https://api.siliconflow.cn/v1/chat/completions"  # 假设的 DeepSeek endpoint
-	prompt = (
-		f"请根据以下描述，推荐20首不同的歌曲名称，只返回歌名列表，不要有其他内容，歌曲有名一点，中文歌曲和英文歌曲最好都有\n描述：{description}\n"
-		"严格按照如下格式返回：\n歌名1\n歌名2\n...\n歌名20"
-	)
-	payload = {
-		"model": "deepseek-ai/DeepSeek-V3",  # 具体模型名按实际填写
-		"messages": [{"role": "user", "content": prompt}],
-		"max_tokens": 512,
-		"temperature": 0.7,
-		"n": 1,
-		"stop": None,
-	}
-	headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-	response = requests.post(url, json=payload, headers=headers)
-	response.raise_for_status()
-	result = response.json()
-	# 假设返回格式和OpenAI一致
-	text = result["choices"][0]["message"]["content"]
-	# 解析歌名
+def recommend_song_names(prompt, limit):
+	"""调用大模型并解析返回的歌名列表（去重，最多 limit 个）"""
+	text = llm.get_client().complete(prompt)
 	song_names = [line.strip() for line in text.split("\n") if line.strip()]
-	# 去重，只取前20个
 	unique_song_names = []
 	for name in song_names:
 		if name not in unique_song_names:
 			unique_song_names.append(name)
-		if len(unique_song_names) == 20:
+		if len(unique_song_names) == limit:
 			break
 	return unique_song_names
 
 
-class SearchBySpiritView(BaseSearchView):
-	def fetch_song_info(self, name):
-		params = {
-			"keywords": name,
-			"type": 1,
-			"limit": 3,
-		}
-		try:
-			data = self.keyword_api(params)
-			result = data.get("result", {})
-			songs = result.get("songs", [])
-			song_infos = []
-			for song in songs:
-				song_infos.append(
-					{
-						"name": song.get("name"),
-						"id": song.get("id"),
-						"ar": [
-							{
-								"id": ar.get("id"),
-								"name": ar.get("name"),
-								"tns": ar.get("tns", []),
-								"alias": ar.get("alias", []),
-							}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id"),
-							"name": song.get("al", {}).get("name"),
-							"picUrl": song.get("al", {}).get("picUrl"),
-							"tns": song.get("al", {}).get("tns", []),
-						},
-						"publishTime": song.get("publishTime", 0),
-					}
-				)
-			return song_infos
-		except Exception:
-			return []
+def get_song_names_from_deepseek(description):
+	prompt = (
+		f"请根据以下描述，推荐20首不同的歌曲名称，只返回歌名列表，不要有其他内容，歌曲有名一点，中文歌曲和英文歌曲最好都有\n描述：{description}\n"
+		"严格按照如下格式返回：\n歌名1\n歌名2\n...\n歌名20"
+	)
+	return recommend_song_names(prompt, 20)
 
+
+class SearchBySpiritView(AIThrottleMixin, BaseSearchView):
 	def get(self, request):
 		describe = request.GET.get("spirit", "")
 
@@ -591,8 +784,7 @@ class SearchBySpiritView(BaseSearchView):
 			)
 
 		try:
-			api_key = "sk-uvxthytexestpleawhxcjtqdjwrzsszrwbcebbhlbxhbnlud"
-			song_infos = get_song_names_by_emotion(describe, api_key)
+			song_infos = get_song_names_by_emotion(describe)
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"AI分析出错: {str(e)}"},
@@ -601,193 +793,89 @@ class SearchBySpiritView(BaseSearchView):
 		full_song_infos = []
 		with ThreadPoolExecutor(max_workers=8) as executor:  # 8线程，可根据实际情况调整
 			future_to_name = {
-				executor.submit(self.fetch_song_info, name): name for name in song_infos
+				executor.submit(timing.bind_context(self.fetch_song_info), name): name
+				for name in song_infos
 			}
 			for future in as_completed(future_to_name):
 				result = future.result()
 				if result:
 					full_song_infos.extend(result)
-		return Response(
-			{
-				"code": 200,
-				"message": "success",
-				"data": full_song_infos,
-			}
-		)
+		return self.success_response(full_song_infos)
 
 
-def get_song_names_by_emotion(description, api_key):
-	url = "https://api.siliconflow.cn/v1/chat/completions"  # 假设的 DeepSeek endpoint
+def get_song_names_by_emotion(description):
 	prompt = (
 		f"请根据以下情绪，推荐20首不同的歌曲名称，只返回歌名列表，不要有其他内容，歌曲有名一点，中文歌曲和英文歌曲最好都有\n描述：{description}\n"
 		"严格按照如下格式返回：\n歌名1\n歌名2\n...\n歌名20"
 	)
-	payload = {
-		"model": "deepseek-ai/DeepSeek-V3",  # 具体模型名按实际填写
-		"messages": [{"role": "user", "content": prompt}],
-		"max_tokens": 512,
-		"temperature": 0.7,
-		"n": 1,
-		"stop": None,
-	}
-	headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-	response = requests.post(url, json=payload, headers=headers)
-	response.raise_for_status()
-	result = response.json()
-	# 假设返回格式和OpenAI一致
-	text = result["choices"][0]["message"]["content"]
-	# 解析歌名
-	song_names = [line.strip() for line in text.split("\n") if line.strip()]
-	# 去重，只取前20个
-	unique_song_names = []
-	for name in song_names:
-		if name not in unique_song_names:
-			unique_song_names.append(name)
-		if len(unique_song_names) == 20:
-			break
-	return unique_song_names
+	return recommend_song_names(prompt, 20)
 
 
-class SearchGuess(BaseSearchView):
-	def fetch_song_info(self, name):
-		params = {
-			"keywords": name,
-			"type": 1,
-			"limit": 1,
-		}
-		try:
-			data = self.keyword_api(params)
-			result = data.get("result", {})
-			songs = result.get("songs", [])
-			song_infos = []
-			for song in songs:
-				song_infos.append(
-					{
-						"name": song.get("name"),
-						"id": song.get("id"),
-						"ar": [
-							{
-								"id": ar.get("id"),
-								"name": ar.get("name"),
-								"tns": ar.get("tns", []),
-								"alias": ar.get("alias", []),
-							}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id"),
-							"name": song.get("al", {}).get("name"),
-							"picUrl": song.get("al", {}).get("picUrl"),
-							"tns": song.get("al", {}).get("tns", []),
-						},
-						"publishTime": song.get("publishTime", 0),
-					}
-				)
-			return song_infos
-		except Exception:
-			return []
+class SearchGuess(AIThrottleMixin, BaseSearchView):
+	# 预计算结果只是一次数据库读取，不占用全局大模型预算；回退到实时计算时再占用
+	throttle_classes = [AIUserThrottle]
+	fetch_song_limit = 1
 
-	def get(self, request):
-		favorites = Favorite.objects.filter(user=request.user)
+	def compute(self, user):
+		"""实时计算用户的猜你喜欢结果，非空时写入预计算表供后续请求直接读取"""
+		favorites = Favorite.objects.filter(user=user)
 		song_names = [fav.song_name for fav in favorites]
 		song_names_str = "、".join(song_names)
-		try:
-			api_key = "sk-uvxthytexestpleawhxcjtqdjwrzsszrwbcebbhlbxhbnlud"
-			song_infos = get_song_by_guess(song_names_str, api_key)
-			print(song_infos)
-		except Exception as e:
-			return Response(
-				{"code": 500, "message": f"AI分析出错: {str(e)}"},
-				status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-			)
+		song_infos = get_song_by_guess(song_names_str)
 		full_song_infos = []
 		with ThreadPoolExecutor(max_workers=8) as executor:  # 8线程，可根据实际情况调整
 			future_to_name = {
-				executor.submit(self.fetch_song_info, name): name for name in song_infos
+				executor.submit(timing.bind_context(self.fetch_song_info), name): name
+				for name in song_infos
 			}
 			for future in as_completed(future_to_name):
 				result = future.result()
 				if result:
 					full_song_infos.extend(result)
-		return Response(
-			{
-				"code": 200,
-				"message": "success",
-				"data": full_song_infos,
-			}
-		)
+		# 上游故障或大模型没有返回歌名时结果为空，保留原有结果，不写入空列表
+		if full_song_infos:
+			GuessResult.objects.update_or_create(
+				user=user,
+				defaults={"songs": full_song_infos, "computed_at": timezone.now()},
+			)
+		return full_song_infos
 
+	def get_precomputed(self, user):
+		"""读取未过期的预计算结果，没有则返回 None"""
+		fresh_after = timezone.now() - settings.GUESS_RESULT_MAX_AGE
+		result = GuessResult.objects.filter(
+			user=user, computed_at__gte=fresh_after
+		).values_list("songs", flat=True).first()
+		return result
 
-def get_song_by_guess(song_names_str, api_key):
-	url = "https://api.siliconflow.cn/v1/chat/completions"  # 假设的 DeepSeek endpoint
+	def get(self, request):
+		full_song_infos = None
+		if request.user.is_authenticated:
+			full_song_infos = self.get_precomputed(request.user)
+		if full_song_infos is None:
+			budget = LLMBudgetThrottle()
+			if not budget.allow_request(request, self):
+				self.throttled(request, budget.wait())
+			try:
+				full_song_infos = self.compute(request.user)
+			except Exception as e:
+				return Response(
+					{"code": 500, "message": f"AI分析出错: {str(e)}"},
+					status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+				)
+		return self.success_response(full_song_infos)
+
+
+def get_song_by_guess(song_names_str):
 	prompt = (
 		f"请根据以下歌曲名称，推荐10首类似相关但是不同的歌曲名称，只返回歌名列表，不要有其他内容，歌曲有名一点，中文歌曲和英文歌曲最好都有\n歌名：{song_names_str}\n"
 		"严格按照如下格式返回：\n歌名1\n歌名2\n...\n歌名10"
 	)
-	payload = {
-		"model": "deepseek-ai/DeepSeek-V3",  # 具体模型名按实际填写
-		"messages": [{"role": "user", "content": prompt}],
-		"max_tokens": 512,
-		"temperature": 0.7,
-		"n": 1,
-		"stop": None,
-	}
-	headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-	response = requests.post(url, json=payload, headers=headers)
-	response.raise_for_status()
-	result = response.json()
-	# 假设返回格式和OpenAI一致
-	text = result["choices"][0]["message"]["content"]
-	# 解析歌名
-	song_names = [line.strip() for line in text.split("\n") if line.strip()]
-	# 去重，只取前10个
-	unique_song_names = []
-	for name in song_names:
-		if name not in unique_song_names:
-			unique_song_names.append(name)
-		if len(unique_song_names) == 10:
-			break
-	return unique_song_names
+	return recommend_song_names(prompt, 10)
 
 
-class SearchRelated(BaseSearchView):
-	def fetch_song_info(self, name):
-		params = {
-			"keywords": name,
-			"type": 1,
-			"limit": 2,
-		}
-		try:
-			data = self.keyword_api(params)
-			result = data.get("result", {})
-			songs = result.get("songs", [])
-			song_infos = []
-			for song in songs:
-				song_infos.append(
-					{
-						"name": song.get("name"),
-						"id": song.get("id"),
-						"ar": [
-							{
-								"id": ar.get("id"),
-								"name": ar.get("name"),
-								"tns": ar.get("tns", []),
-								"alias": ar.get("alias", []),
-							}
-							for ar in song.get("ar", [])
-						],
-						"al": {
-							"id": song.get("al", {}).get("id"),
-							"name": song.get("al", {}).get("name"),
-							"picUrl": song.get("al", {}).get("picUrl"),
-							"tns": song.get("al", {}).get("tns", []),
-						},
-						"publishTime": song.get("publishTime", 0),
-					}
-				)
-			return song_infos
-		except Exception:
-			return []
+class SearchRelated(AIThrottleMixin, BaseSearchView):
+	fetch_song_limit = 2
 
 	def get(self, request):
 		search_song = request.GET.get("title", "")
@@ -798,8 +886,7 @@ class SearchRelated(BaseSearchView):
 				status=status.HTTP_400_BAD_REQUEST,
 			)
 		try:
-			api_key = "sk-uvxthytexestpleawhxcjtqdjwrzsszrwbcebbhlbxhbnlud"
-			song_infos = get_song_by_title(search_song, api_key)
+			song_infos = get_song_by_title(search_song)
 		except Exception as e:
 			return Response(
 				{"code": 500, "message": f"AI分析出错: {str(e)}"},
@@ -808,88 +895,63 @@ class SearchRelated(BaseSearchView):
 		full_song_infos = []
 		with ThreadPoolExecutor(max_workers=8) as executor:  # 8线程，可根据实际情况调整
 			future_to_name = {
-				executor.submit(self.fetch_song_info, name): name for name in song_infos
+				executor.submit(timing.bind_context(self.fetch_song_info), name): name
+				for name in song_infos
 			}
 			for future in as_completed(future_to_name):
 				result = future.result()
 				if result:
 					full_song_infos.extend(result)
-		return Response(
-			{
-				"code": 200,
-				"message": "success",
-				"data": full_song_infos,
-			}
-		)
+		return self.success_response(full_song_infos)
 
 
-def get_song_by_title(song_names_str, api_key):
-	url = "https://api.siliconflow.cn/v1/chat/completions"  # 假设的 DeepSeek endpoint
+def get_song_by_title(song_names_str):
 	prompt = (
 		f"请根据歌曲名称，推荐10首类似相关但是不同的歌曲名称，只返回歌名列表，不要有其他内容，歌曲有名一点，中文歌曲和英文歌曲最好都有\n歌名：{song_names_str}\n"
 		"严格按照如下格式返回：\n歌名1\n歌名2\n...\n歌名10"
 	)
-	payload = {
-		"model": "deepseek-ai/DeepSeek-V3",  # 具体模型名按实际填写
-		"messages": [{"role": "user", "content": prompt}],
-		"max_tokens": 512,
-		"temperature": 0.7,
-		"n": 1,
-		"stop": None,
-	}
-	headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-	response = requests.post(url, json=payload, headers=headers)
-	response.raise_for_status()
-	result = response.json()
-	# 假设返回格式和OpenAI一致
-	text = result["choices"][0]["message"]["content"]
-	# 解析歌名
-	song_names = [line.strip() for line in text.split("\n") if line.strip()]
-	# 去重，只取前10个
-	unique_song_names = []
-	for name in song_names:
-		if name not in unique_song_names:
-			unique_song_names.append(name)
-		if len(unique_song_names) == 10:
-			break
-	return unique_song_names
+	return recommend_song_names(prompt, 10)
 
 class SearchNewSongView(BaseSearchView):
-	def get(self, request):
-		try:
-			data = self.newsong_api()
-			if data.get("code") == 200:
-				results = data.get("result", [])
-
-				formatted_results = []
-				for result in results:
-					song = result.get("song", [])
-					formatted_results.append(
+	def load_newsongs(self):
+		data = self.newsong_api()
+		if data.get("code") != 200:
+			return None
+		formatted_results = []
+		for result in data.get("result", []):
+			song = result.get("song", [])
+			formatted_results.append(
+				{
+					"name": song.get("name"),
+					"id": song.get("id"),
+					"ar": [
 						{
-							"name": song.get("name"),
-							"id": song.get("id"),
-							"ar": [
-								{
-									"id": ar.get("id"),
-									"name": ar.get("name"),
-									"picUrl": ar.get("picUrl")
-								}
-								for ar in song.get("artists", [])
-							],
-							"al": {
-								"id": song.get("album", {}).get("id"),
-								"name": song.get("album", {}).get("name"),
-								"picUrl": song.get("album", {}).get("picUrl"),
-							},
-							"publishTime": song.get("album", {}).get("publishTime", 0),
+							"id": ar.get("id"),
+							"name": ar.get("name"),
+							"picUrl": ar.get("picUrl")
 						}
-					)
-				return Response(
-					{"code": 200, "message": "success", "data": formatted_results}
-				)
+						for ar in song.get("artists", [])
+					],
+					"al": {
+						"id": song.get("album", {}).get("id"),
+						"name": song.get("album", {}).get("name"),
+						"picUrl": song.get("album", {}).get("picUrl"),
+					},
+					"publishTime": song.get("album", {}).get("publishTime", 0),
+				}
+			)
+		return formatted_results
+
+	def get(self, request):
+		try:
+			formatted_results = self.cached(newsong_cache, "", self.load_newsongs)
+			if formatted_results is not None:
+				return self.success_response(formatted_results)
 			return Response(
 				{"code": 403, "message": "failed"}, status=status.HTTP_400_BAD_REQUEST
 			)
+		except upstream.UpstreamOverloaded:
+			return overloaded_response()
 		except Exception as e:
 			return Response(
 				{
@@ -898,3 +960,167 @@ class SearchNewSongView(BaseSearchView):
 				},
 				status=status.HTTP_500_INTERNAL_SERVER_ERROR,
 			)
+
+
+class MetricsView(View):
+	"""Prometheus 抓取入口，配置了 METRICS["TOKEN"] 时需要带上对应的 Bearer token"""
+
+	def get(self, request):
+		token = metrics.get_config()["TOKEN"]
+		if token and request.headers.get("Authorization") != f"Bearer {token}":
+			return HttpResponse(status=401)
+		return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class ProfileView(APIView):
+	"""
+	采样分析（仅管理员，settings.PROFILING["ENABLED"] 为真时可用），只作用于处理本请求的 worker 进程。
+	POST 开始：seconds 持续秒数，可选 interval_ms 采样间隔、route 只采样路径匹配该正则的请求、rate 抽样比例；
+	GET 查看进行中或最近一次的结果，?output=collapsed 返回折叠栈文本；DELETE 提前结束。
+	"""
+	permission_classes = [IsAdminUser]
+
+	def initial(self, request, *args, **kwargs):
+		if not profiling.get_config()["ENABLED"]:
+			raise Http404
+		super().initial(request, *args, **kwargs)
+
+	def get(self, request):
+		session = profiling.current()
+		if session is None:
+			return Response({"code": 404, "message": "没有采样记录"}, status=status.HTTP_404_NOT_FOUND)
+		if request.GET.get("output") == "collapsed":
+			return HttpResponse(session.collapsed(), content_type="text/plain; charset=utf-8")
+		return Response({"code": 200, "message": "success", "data": session.summary()})
+
+	def post(self, request):
+		try:
+			seconds = float(request.data.get("seconds", 0))
+			interval = float(request.data.get("interval_ms") or 0) / 1000
+			rate = float(request.data.get("rate", 1))
+			route = request.data.get("route") or None
+			if route is not None:
+				re.compile(route)
+		except (TypeError, ValueError, re.error):
+			seconds = 0
+		if seconds <= 0 or interval < 0 or not 0 < rate <= 1:
+			return Response(
+				{"code": 403, "message": "参数错误：seconds 必须大于 0，rate 在 (0, 1] 之间，route 为正则"},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+		try:
+			session = profiling.start(seconds, interval or None, route, rate)
+		except profiling.ProfilerBusy as e:
+			return Response({"code": 409, "message": str(e)}, status=status.HTTP_409_CONFLICT)
+		return Response(
+			{"code": 202, "message": "accepted", "data": session.summary()},
+			status=status.HTTP_202_ACCEPTED,
+		)
+
+	def delete(self, request):
+		session = profiling.stop()
+		if session is None:
+			return Response({"code": 404, "message": "没有进行中的采样"}, status=status.HTTP_404_NOT_FOUND)
+		session.join(5)
+		return Response({"code": 200, "message": "success", "data": session.summary()})
+
+
+class MemoryView(APIView):
+	"""
+	内存检查（仅管理员，settings.MEMORY["ENABLED"] 为真时可用），只作用于处理本请求的 worker 进程。
+	GET 返回 RSS、缓存等结构的大小，?objects=1 附带按类型的对象数，?diff=1 比较两个快照（base、target 为快照 id，默认最早和最新）；
+	POST 保存一个 tracemalloc 快照（label 可选）；DELETE 停止 tracemalloc 并丢弃快照。
+	"""
+	permission_classes = [IsAdminUser]
+
+	def initial(self, request, *args, **kwargs):
+		if not memory.get_config()["ENABLED"]:
+			raise Http404
+		super().initial(request, *args, **kwargs)
+
+	def get(self, request):
+		if request.GET.get("diff") != "1":
+			data = memory.report(objects=request.GET.get("objects") == "1")
+			return Response({"code": 200, "message": "success", "data": data})
+		try:
+			base = int(request.GET["base"]) if request.GET.get("base") else None
+			target = int(request.GET["target"]) if request.GET.get("target") else None
+		except ValueError:
+			return Response({"code": 403, "message": "快照 id 必须是整数"}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			data = memory.diff(base, target)
+		except memory.SnapshotNotFound as e:
+			return Response({"code": 404, "message": str(e)}, status=status.HTTP_404_NOT_FOUND)
+		return Response({"code": 200, "message": "success", "data": data})
+
+	def post(self, request):
+		label = request.data.get("label", "") if hasattr(request.data, "get") else ""
+		return Response({"code": 200, "message": "success", "data": memory.take_snapshot(str(label))})
+
+	def delete(self, request):
+		memory.stop()
+		return Response({"code": 200, "message": "success"})
+
+
+class CoverView(View):
+	"""
+	封面缩略图代理，见 search/covers.py。
+	参数：url 原图地址（须在白名单域名内）；size 需要的像素，取不小于它的一档，默认 128；
+	format 为 webp 或 jpeg，不指定时按 Accept 头选择。
+	需要下载生成的请求按用户（未登录按 IP）限流，命中缓存的不受限制。
+	不是 DRF 视图（图片应答不走内容协商），限流前自行按 JWT 认证用户，令牌无效时按匿名处理。
+	"""
+	throttle_scope = "cover"
+
+	def authenticate(self, request):
+		try:
+			result = JWTAuthentication().authenticate(request)
+		except AuthenticationFailed:
+			result = None
+		if result is not None:
+			request.user = result[0]
+
+	def get(self, request):
+		config = covers.get_config()
+		url = request.GET.get("url", "")
+		requested_format = request.GET.get("format", "").lower()
+		try:
+			size = covers.choose_size(int(request.GET.get("size", 128)), config)
+		except ValueError:
+			size = None
+		fmt = covers.choose_format(requested_format, request.headers.get("Accept", ""), config)
+		if not url or size is None or fmt is None:
+			return JsonResponse({"code": 403, "message": "参数错误"}, status=status.HTTP_400_BAD_REQUEST)
+		if not covers.host_allowed(url, config["ALLOWED_HOSTS"]):
+			return JsonResponse({"code": 403, "message": "不允许代理该地址"}, status=status.HTTP_403_FORBIDDEN)
+
+		tag = covers.etag(url, size, fmt)
+		if request.headers.get("If-None-Match") == tag:
+			response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+		else:
+			data = covers.cache.cached(url, size, fmt)
+			if data is None:
+				self.authenticate(request)
+				throttle = ScopedRateThrottle()
+				if not throttle.allow_request(request, self):
+					response = JsonResponse(
+						{"code": 429, "message": "请求过于频繁，请稍后再试"}, status=status.HTTP_429_TOO_MANY_REQUESTS
+					)
+					response["Retry-After"] = str(math.ceil(throttle.wait() or 1))
+					return response
+			try:
+				if data is None:
+					data = covers.cache.get(url, size, fmt)
+			except covers.HostNotAllowed as e:
+				return JsonResponse({"code": 403, "message": str(e)}, status=status.HTTP_403_FORBIDDEN)
+			except covers.CoverBusy as e:
+				return JsonResponse({"code": 503, "message": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+			except covers.CoverError as e:
+				return JsonResponse({"code": 502, "message": str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+			response = HttpResponse(data, content_type=covers.CONTENT_TYPES[fmt])
+		# 同一 url 的缩略图不会变化
+		response["Cache-Control"] = f"public, max-age={config['MAX_AGE']}, immutable"
+		response["ETag"] = tag
+		if not requested_format:
+			patch_vary_headers(response, ["Accept"])
+		return response